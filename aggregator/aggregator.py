@@ -1,26 +1,104 @@
-import copy
+import heapq
 import time
+from concurrent.futures.process import BrokenProcessPool
 from queue import Empty, Queue
 from threading import Thread
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import logger
-from qiskit import QuantumCircuit
+import numpy as np
+from execution_handler.execution_handler import BackendLookUp, TranspilePool
+from metrics.pipeline import enter_stage, leave_stage, merge_timestamps
+from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
 from qiskit.circuit.random import random_circuit
 from qiskit.result import Result
+from qiskit.transpiler.exceptions import TranspilerError
 from quantum_execution_job import Execution_Type, QuantumExecutionJob
+from resource_mapping.backend_chooser import Backend_Data
+
+from aggregator.noise import BackendPropertiesCache
+from aggregator.packing import (cluster_by_shots, first_fit_decreasing,
+                                total_width)
+from aggregator.regions import allocate_regions
+from aggregator.stitching import RegionTranspiler, stitch
+
+log = logger.get_logger(__name__)
+
+
+class AggregationRecord():
+    """Compact bookkeeping of an aggregated job. It holds everything needed to split the aggregated result, while the initial jobs are kept by reference in the job table.
+    """
+
+    __slots__ = ("job_ids", "names", "qubit_counts", "clbit_ranges", "reg_mappings", "shots", "total_clbits")
+
+    def __init__(self, job_ids:List[str], names:List[str], qubit_counts:List[int], clbit_ranges:List[Tuple[int, int]], reg_mappings:List[Dict[str, str]], shots:List[int], total_clbits:int) -> None:
+        self.job_ids = job_ids
+        self.names = names
+        self.qubit_counts = qubit_counts
+        self.clbit_ranges = clbit_ranges
+        self.reg_mappings = reg_mappings
+        self.shots = shots
+        self.total_clbits = total_clbits
+
+    @classmethod
+    def from_agg_info(cls, jobs:List[QuantumExecutionJob], agg_info:Dict[Any, Any]) -> 'AggregationRecord':
+        """Create the record for the aggregated jobs
+
+        Args:
+            jobs (List[QuantumExecutionJob]): the initial jobs in the order of their aggregation
+            agg_info (Dict[Any, Any]): aggregation information as Dict
+
+        Returns:
+            AggregationRecord
+        """
+        circ_infos = list(agg_info["circuits"].values())
+        return cls(job_ids=[job.id for job in jobs],
+                   names=[circ["name"] for circ in circ_infos],
+                   qubit_counts=[circ["qubits"]["stop"] - circ["qubits"]["start"] for circ in circ_infos],
+                   clbit_ranges=[(circ["clbits"]["start"], circ["clbits"]["stop"]) for circ in circ_infos],
+                   reg_mappings=[circ["reg_mapping"] for circ in circ_infos],
+                   shots=[job.shots for job in jobs],
+                   total_clbits=agg_info["total_clbits"])
 
 
 class Aggregator(Thread):
 
-    def __init__(self, input:Queue, output:Queue, job_dict:Dict, timeout: float) -> None:
+    def __init__(self, input:Queue, output:Queue, job_dict:Dict, job_table:Dict, timeout: float, backend_look_up:Optional[BackendLookUp]=None, pre_transpile:bool=True, transpile_cache_size:int=1000, shot_ratio:float=2, noise_aware:bool=True, properties_refresh_interval:float=3600, fill_ratio:float=0.8,
+                 transpile_pool:Optional[TranspilePool]=None) -> None:
+        """
+        Args:
+            input (Queue): jobs to aggregate
+            output (Queue): aggregated jobs
+            job_dict (Dict): maps the id of an aggregated job to its AggregationRecord
+            job_table (Dict): maps the ids of the initial jobs to the jobs
+            timeout (float): maximal waiting time for further jobs
+            backend_look_up (Optional[BackendLookUp], optional): If given and pre_transpile is True, the initial circuits are transpiled for their region and stitched together. Defaults to None.
+            pre_transpile (bool, optional): Defaults to True.
+            transpile_cache_size (int, optional): maximal number of cached transpiled circuits. Defaults to 1000.
+            shot_ratio (float, optional): maximal ratio between the largest and smallest number of shots of jobs that are aggregated together. Defaults to 2.
+            noise_aware (bool, optional): If True and backend_look_up is given, the regions are selected based on the cached calibration data of the backend. Defaults to True.
+            properties_refresh_interval (float, optional): refresh interval of the cached calibration data in seconds. Defaults to 3600.
+            fill_ratio (float, optional): packed jobs are forwarded before the timeout, if they fill at least this fraction of the qubits of the backend. Defaults to 0.8.
+            transpile_pool (Optional[TranspilePool], optional): shared process pool of the ExecutionHandler for the transpilation of the circuits for their regions. Defaults to None.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._job_dict = job_dict
+        self._job_table = job_table
         self._timeout = timeout
+        self._shot_ratio = shot_ratio
+        self._fill_ratio = fill_ratio
+        self._region_transpiler = None
+        if backend_look_up is not None and pre_transpile:
+            self._region_transpiler = RegionTranspiler(backend_look_up, transpile_cache_size, transpile_pool)
+        self._properties_cache = None
+        if backend_look_up is not None and noise_aware:
+            self._properties_cache = BackendPropertiesCache(backend_look_up, properties_refresh_interval)
         self._jobs_to_aggregate = {}
-        self._timers = {}
+        self._arrival_times = {}
+        self._deadlines = {}
+        self._deadline_heap = []
         Thread.__init__(self)
         self._log.info("Init Aggregator")
 
@@ -29,45 +107,200 @@ class Aggregator(Thread):
         self._log.info("Started Aggregator")
         while True:
             try:
-                q_job = self._input.get(timeout=self._timeout)
+                q_job = self._input.get(timeout=self._time_to_next_deadline())
             except Empty:
                 q_job = None
             if q_job:
-                # append job
-                backend_name = q_job.backend_data.name
-                try:
-                    self._jobs_to_aggregate[backend_name].append(q_job)
-                except KeyError: 
-                    self._jobs_to_aggregate[backend_name] = [q_job]
-                    self._timers[backend_name] = time.time()
-            
-            # check timers and the number of waiting jobs
-            clear = []
-            for backend_name, jobs_to_aggregate in self._jobs_to_aggregate.items():
-                if len(jobs_to_aggregate) < 2 and time.time() - self._timers[backend_name] < self._timeout:
+                self._add_job(q_job)
+            self._flush_expired()
+
+    def _time_to_next_deadline(self) -> Optional[float]:
+        """
+        Returns:
+            Optional[float]: time until the next flush deadline. None, if there are no waiting jobs.
+        """
+        while len(self._deadline_heap) > 0:
+            deadline, backend_name = self._deadline_heap[0]
+            if self._deadlines.get(backend_name) == deadline:
+                return max(deadline - time.time(), 0)
+            # outdated deadline
+            heapq.heappop(self._deadline_heap)
+        return None
+
+    def _set_deadline(self, backend_name:str):
+        """Set the flush deadline of the backend to the end of the waiting window of its oldest waiting job
+
+        Args:
+            backend_name (str)
+        """
+        jobs_to_aggregate = self._jobs_to_aggregate[backend_name]
+        if len(jobs_to_aggregate) == 0:
+            self._jobs_to_aggregate.pop(backend_name)
+            self._deadlines.pop(backend_name, None)
+            return
+        deadline = min(self._arrival_times[job.id] for job in jobs_to_aggregate) + self._timeout
+        if self._deadlines.get(backend_name) != deadline:
+            self._deadlines[backend_name] = deadline
+            heapq.heappush(self._deadline_heap, (deadline, backend_name))
+
+    def _add_job(self, q_job:QuantumExecutionJob):
+        """Add the job to the waiting jobs of its backend. If the waiting jobs can fill the backend up to the fill ratio, aggregate them right away.
+
+        Args:
+            q_job (QuantumExecutionJob)
+        """
+        backend_name = q_job.backend_data.name
+        enter_stage(q_job, "aggregator")
+        self._arrival_times[q_job.id] = time.time()
+        try:
+            self._jobs_to_aggregate[backend_name].append(q_job)
+        except KeyError:
+            self._jobs_to_aggregate[backend_name] = [q_job]
+        if total_width(self._jobs_to_aggregate[backend_name]) >= self._fill_ratio*q_job.backend_data.n_qubits:
+            self._flush(backend_name, expired=False)
+        else:
+            self._set_deadline(backend_name)
+
+    def _flush_expired(self):
+        """Flush all backends whose deadline has expired
+        """
+        now = time.time()
+        while len(self._deadline_heap) > 0 and self._deadline_heap[0][0] <= now:
+            deadline, backend_name = heapq.heappop(self._deadline_heap)
+            if self._deadlines.get(backend_name) == deadline:
+                self._flush(backend_name, expired=True)
+
+    def _flush(self, backend_name:str, expired:bool):
+        """Pack the waiting jobs of the backend and forward them.
+        If the deadline has not expired, only the packed jobs that fill the backend up to the fill ratio are forwarded and the others keep waiting.
+
+        Args:
+            backend_name (str)
+            expired (bool): True, if the deadline of the backend has expired
+        """
+        jobs_to_aggregate = self._jobs_to_aggregate[backend_name]
+        capacity = jobs_to_aggregate[0].backend_data.n_qubits
+        waiting_jobs = []
+        for shot_cluster in cluster_by_shots(jobs_to_aggregate, self._shot_ratio):
+            for packed_jobs in first_fit_decreasing(shot_cluster, capacity):
+                if not expired and total_width(packed_jobs) < self._fill_ratio*capacity:
+                    waiting_jobs.extend(packed_jobs)
                     continue
-                clear.append(backend_name)
-                if len(jobs_to_aggregate) > 1:
-                    agg_circ, agg_info = aggregate([job.circuit for job in jobs_to_aggregate])
-                    agg_shots = max([job.shots for job in jobs_to_aggregate])
-                    agg_job = QuantumExecutionJob(agg_circ, shots = agg_shots, type=Execution_Type.aggregation, backend_data = jobs_to_aggregate[0].backend_data)
-                    self._job_dict[agg_job.id] = {"jobs":copy.deepcopy(jobs_to_aggregate), "agg_info":agg_info}
-                    self._output.put(agg_job)
-                else:
-                    self._output.put(jobs_to_aggregate.pop())
-            for backend_name in clear:
-                self._jobs_to_aggregate.pop(backend_name)
-                self._timers.pop(backend_name)
+                for job in packed_jobs:
+                    self._arrival_times.pop(job.id)
+                self._forward(packed_jobs)
+        self._jobs_to_aggregate[backend_name] = waiting_jobs
+        self._set_deadline(backend_name)
+
+    def _forward(self, jobs_to_aggregate:List[QuantumExecutionJob]):
+        """Aggregate the jobs and forward the aggregated job. A single job is forwarded unchanged.
+
+        Args:
+            jobs_to_aggregate (List[QuantumExecutionJob]): jobs that fit together on the backend
+        """
+        if len(jobs_to_aggregate) > 1:
+            circuits = [job.bound_circuit() for job in jobs_to_aggregate]
+            agg_circ, agg_info = aggregate(circuits)
+            agg_shots = max([job.shots for job in jobs_to_aggregate])
+            backend_data = jobs_to_aggregate[0].backend_data
+            agg_job = QuantumExecutionJob(agg_circ, shots = agg_shots, type=Execution_Type.aggregation, backend_data = backend_data)
+            if any(job.shots < agg_shots or getattr(job, "memory", False) for job in jobs_to_aggregate):
+                # the per-shot memory is requested or needed to cut the results to the requested number of shots
+                agg_job.memory = True
+            initial_layout = self._initial_layout(circuits, agg_info, backend_data)
+            if initial_layout:
+                if self._region_transpiler is not None:
+                    self._stitch(agg_job, circuits, agg_info)
+                if not getattr(agg_job, "transpiled", False):
+                    agg_job.initial_layout = initial_layout
+            for job in jobs_to_aggregate:
+                self._job_table[job.id] = job
+                leave_stage(job, "aggregator")
+            self._job_dict[agg_job.id] = AggregationRecord.from_agg_info(jobs_to_aggregate, agg_info)
+            self._log.debug(f"Aggregated {len(jobs_to_aggregate)} jobs with {agg_info['total_qubits']} qubits for backend {agg_job.backend_data.name}")
+            self._output.put(agg_job)
+        else:
+            job = jobs_to_aggregate.pop()
+            leave_stage(job, "aggregator")
+            self._output.put(job)
+
+    def _stitch(self, agg_job:QuantumExecutionJob, circuits:List[QuantumCircuit], agg_info:Dict[Any, Any]):
+        """Replace the circuit of the aggregated job by the stitched circuit of the initial circuits transpiled for their regions.
+        If the transpilation fails, the aggregated job is left unchanged.
+
+        Args:
+            agg_job (QuantumExecutionJob): the aggregated job
+            circuits (List[QuantumCircuit]): the initial circuits
+            agg_info (Dict[Any, Any]): aggregation information containing the regions
+        """
+        backend_data = agg_job.backend_data
+        circ_infos = list(agg_info["circuits"].values())
+        regions = [circ["physical_qubits"] for circ in circ_infos]
+        clbit_ranges = [(circ["clbits"]["start"], circ["clbits"]["stop"]) for circ in circ_infos]
+        try:
+            transpiled_circuits = self._region_transpiler.transpile(circuits, backend_data.name, regions)
+        except (TranspilerError, BrokenProcessPool) as e:
+            self._log.exception(e)
+            return
+        agg_job.circuit = stitch(agg_job.circuit, transpiled_circuits, regions, clbit_ranges, backend_data.n_qubits)
+        agg_job.transpiled = True
+        self._log.debug(f"Stitched {len(transpiled_circuits)} transpiled circuits for backend {backend_data.name}, cache hits: {self._region_transpiler.hits}, misses: {self._region_transpiler.misses}")
+
+    def _initial_layout(self, circuits:List[QuantumCircuit], agg_info:Dict[Any, Any], backend_data:Backend_Data) -> Optional[List[int]]:
+        """Pin every initial circuit to a disjoint connected region of the coupling map of the backend.
+        If calibration data is available, the regions with the lowest estimated errors are assigned to the largest and most error-sensitive circuits.
+        The regions are stored in the aggregation information.
+
+        Args:
+            circuits (List[QuantumCircuit]): the initial circuits
+            agg_info (Dict[Any, Any]): aggregation information of the aggregated circuit
+            backend_data (Backend_Data): the backend the aggregated circuit is executed on
+
+        Returns:
+            Optional[List[int]]: physical qubit for every qubit of the aggregated circuit. None, if the backend has no coupling map or no allocation was found.
+        """
+        coupling_map = getattr(backend_data, "coupling_map", None)
+        if not coupling_map:
+            return None
+        circ_infos = list(agg_info["circuits"].values())
+        sizes = [circ["qubits"]["stop"] - circ["qubits"]["start"] for circ in circ_infos]
+        region_cost = None
+        priorities = None
+        if self._properties_cache is not None:
+            snapshot = self._properties_cache.get(backend_data.name)
+            if snapshot is not None:
+                # circuits with more gates are more sensitive to errors and get the better regions
+                region_cost = snapshot.region_error
+                priorities = [circ.size() for circ in circuits]
+        regions = allocate_regions(coupling_map, backend_data.n_qubits, sizes, region_cost=region_cost, priorities=priorities)
+        if regions is None:
+            self._log.debug(f"No region allocation for {sizes} qubits on backend {backend_data.name}")
+            return None
+        initial_layout = []
+        for circ, region in zip(circ_infos, regions):
+            circ["physical_qubits"] = region
+            initial_layout.extend(region)
+        return initial_layout
 
 
 
 class AggregatorResults(Thread):
     
-    def __init__(self, input:Queue, output:Queue, job_dict:Dict):
+    def __init__(self, input:Queue, output:Queue, job_dict:Dict, job_table:Dict, error_queue:Optional[Queue]=None):
+        """
+        Args:
+            input (Queue): executed aggregated jobs and failed aggregated jobs with an error
+            output (Queue): initial jobs with their results
+            job_dict (Dict): maps the id of an aggregated job to its AggregationRecord
+            job_table (Dict): maps the ids of the initial jobs to the jobs
+            error_queue (Optional[Queue], optional): receives the initial jobs of failed aggregated jobs. Defaults to None.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._job_dict = job_dict
+        self._job_table = job_table
+        self._error_queue = error_queue
         Thread.__init__(self)
         self._log.info("Init AggregatorResults")
 
@@ -76,149 +309,289 @@ class AggregatorResults(Thread):
         while True:
             agg_job = self._input.get()
             try:
-                job_info = self._job_dict.pop(agg_job.id)
+                record = self._job_dict.pop(agg_job.id)
             except KeyError as k_e:
                 # TODO exception handling
                 raise k_e
-            results = split_results(agg_job.result, job_info["agg_info"])
-            initial_jobs = job_info["jobs"]
-            assert(len(results)==len(initial_jobs))
-            for i, job in enumerate(initial_jobs):
+            if getattr(agg_job, "error", None) is not None:
+                self._fail(agg_job, record)
+                continue
+            enter_stage(agg_job, "aggregation_results")
+            results = split_results(agg_job.result, record)
+            assert(len(results)==len(record.job_ids))
+            leave_stage(agg_job, "aggregation_results")
+            for i, job_id in enumerate(record.job_ids):
+                job = self._job_table.pop(job_id)
                 job.result = results[i]
                 job.type = Execution_Type.aggregation
+                # the aggregated job passed the execution handler on behalf of the job
+                job.timestamps = merge_timestamps(job.timestamps, [agg_job.timestamps])
                 self._output.put(job)
+
+    def _fail(self, agg_job:QuantumExecutionJob, record:AggregationRecord):
+        """Fail the initial jobs of a failed aggregated job
+
+        Args:
+            agg_job (QuantumExecutionJob): the aggregated job with the error
+            record (AggregationRecord)
+        """
+        self._log.error(f"Aggregated job {agg_job.id} failed: {agg_job.error}")
+        for job_id in record.job_ids:
+            job = self._job_table.pop(job_id)
+            if self._error_queue is not None:
+                job.error = agg_job.error
+                self._error_queue.put(job)
             
 
 
 
 def aggregate(list_of_circuits: List[QuantumCircuit]) -> Tuple[QuantumCircuit, Dict[Any, Any]]:
-    """Generate a aggregated QuantumCircuit
+    """Generate a aggregated QuantumCircuit.
+    All register offsets are computed up front and the instructions of the circuits are appended with remapped bits to the aggregated circuit.
 
     Args:
         list_of_circuits (List[QuantumCircuit]): List of QuantumCircuit to aggregate
     Returns:
         Tuple[QuantumCircuit, Dict[Any, Any]]: Returns aggregated QuantumCircuit and aggregation information as Dict
     """
-    agg_circuit = QuantumCircuit()
     agg_info = {}
-    qreg_count = 0
-    creg_count = 0
     qreg_order = {}
     creg_order = {}
     circ_info = {}
+    registers = []
+    register_maps = []
+    qubit_count = 0
+    clbit_count = 0
     for index, circ in enumerate(list_of_circuits):
-        circ_info[index] = {}
-        registers = []
+        prefix = "circ" + str(index) + "reg"
+        register_mapping = {}
+        register_map = {}
         for qreg in circ.qregs:
-            registers.append(qreg)
-            qreg_order[f"circ{index}reg{qreg.name}"] = qreg_count
-            qreg_count += 1
+            agg_qreg = QuantumRegister(qreg.size, prefix + qreg.name)
+            qreg_order[agg_qreg.name] = len(qreg_order)
+            register_mapping[agg_qreg.name] = qreg.name
+            registers.append(agg_qreg)
         for creg in circ.cregs:
-            registers.append(creg)
-            creg_order[f"circ{index}reg{creg.name}"] = creg_count
-            creg_count += 1
-        register_mapping = {}
-        for reg in registers:
-            reg_copy = copy.deepcopy(reg)
-            reg_copy.name =  f"circ{index}reg{reg.name}"
-            agg_circuit.add_register(reg_copy)
-            register_mapping[reg_copy.name] = reg.name
-        circ_info[index]["reg_mapping"] = register_mapping
+            agg_creg = ClassicalRegister(creg.size, prefix + creg.name)
+            creg_order[agg_creg.name] = len(creg_order)
+            register_mapping[agg_creg.name] = creg.name
+            register_map[creg] = agg_creg
+            registers.append(agg_creg)
+        register_maps.append(register_map)
+        n_qubits = len(circ.qubits)
+        n_clbits = len(circ.clbits)
+        circ_info[index] = {
+            "reg_mapping":register_mapping,
+            "qubits":{"start":qubit_count, "stop":qubit_count + n_qubits},
+            "clbits":{"start":clbit_count, "stop":clbit_count + n_clbits},
+            "name":circ.name
+        }
+        qubit_count += n_qubits
+        clbit_count += n_clbits
     agg_info["reg_order"] = {"qreg":qreg_order, "creg":creg_order}
-    
-    qubit_count = 0
-    clbit_count = 0
 
+    agg_circuit = QuantumCircuit(*registers)
+    agg_qubits = agg_circuit.qubits
+    agg_clbits = agg_circuit.clbits
+    global_phase = 0
     for index, circ in enumerate(list_of_circuits):
-        qubits = range(qubit_count, qubit_count + len(circ.qubits))
-        clbits = range(clbit_count, clbit_count + len(circ.clbits))
-        agg_circuit.compose(circ, qubits=qubits, clbits=clbits, inplace=True)
-        qubit_count += len(circ.qubits)
-        clbit_count += len(circ.clbits)
-        circ_info[index]["qubits"] = {"start":qubits.start, "stop":qubits.stop}
-        circ_info[index]["clbits"] = {"start":clbits.start, "stop":clbits.stop}
-        circ_info[index]["name"] = circ.name
+        qubits = circ_info[index]["qubits"]
+        clbits = circ_info[index]["clbits"]
+        qubit_map = dict(zip(circ.qubits, agg_qubits[qubits["start"]:qubits["stop"]]))
+        clbit_map = dict(zip(circ.clbits, agg_clbits[clbits["start"]:clbits["stop"]]))
+        for instruction, qargs, cargs in circ.data:
+            if instruction.condition is not None:
+                instruction = instruction.copy()
+                condition_bits, value = instruction.condition
+                instruction.condition = (register_maps[index].get(condition_bits, clbit_map.get(condition_bits)), value)
+            agg_circuit._append(instruction, [qubit_map[qubit] for qubit in qargs], [clbit_map[clbit] for clbit in cargs])
+        global_phase += circ.global_phase
+    agg_circuit.global_phase = global_phase
     agg_info["circuits"] = circ_info
     agg_info["total_qubits"] = qubit_count
     agg_info["total_clbits"] = clbit_count
     return agg_circuit, agg_info
 
-def split_results(result: Result, agg_info:Dict[Any, Any]) -> List[Result]:
-    """Retrieve the results of the initial quantum circuits from the aggregated result
+def split_results(result: Result, record:AggregationRecord) -> List[Result]:
+    """Retrieve the results of the initial quantum circuits from the aggregated result.
+    The states are decoded only once and the marginal counts of all initial circuits are computed in one vectorized pass.
 
     Args:
         result (Result): Result of the aggregated QuantumCircuit
-        agg_info (Dict[Any, Any]): aggregation information as Dict
+        record (AggregationRecord): bookkeeping of the aggregated job
+
+    Raises:
+        Exception: Multiple results are stored in one Result objext
 
     Returns:
         List[Result]: Returns the Results of the initial QuantumCircuits
     """
+    result_dict = result.to_dict()
+    if len(result_dict["results"]) != 1:
+        raise Exception("Result length not 1")
+    # the experiment without header and data serves as template for all results
+    exp_template = result_dict.pop("results")[0]
+    header = exp_template.pop("header")
+    exp_template.pop("data")
+
+    starts = [start for start, _ in record.clbit_ranges]
+    stops = [stop for _, stop in record.clbit_ranges]
+    states, state_counts = _decode_counts(result.data()["counts"], record.total_clbits)
+    marginal_states = _marginal_states(states, starts, stops)
+
+    executed_shots = int(state_counts.sum())
+    shots = record.shots
+    marginal_memory = None
+    if "memory" in result.data():
+        memory = _decode_memory(result.data()["memory"], record.total_clbits)
+        marginal_memory = _marginal_states(memory, starts, stops)
+
     results = []
-    for index in agg_info["circuits"]:
-        job_result = __calc_result(index, agg_info, result)
-        results.append(job_result)
+    for i in range(len(record.job_ids)):
+        if marginal_memory is not None:
+            # only use the first shots of the memory to get exactly the requested number of shots
+            exp_shots = min(shots[i], executed_shots)
+            counts, job_memory = _split_memory(marginal_memory[i, :exp_shots])
+            data = {"counts":counts, "memory":job_memory}
+        else:
+            exp_shots = executed_shots
+            counts = _count_states(marginal_states[i], state_counts)
+            if shots[i] < executed_shots:
+                # the memory is missing, e.g. the result was not requested with memory
+                log.warning(f"No memory to cut the result of job {record.job_ids[i]} to {shots[i]} shots, the counts of {executed_shots} shots are rescaled")
+                counts = _rescale_counts(counts, shots[i])
+                exp_shots = shots[i]
+            data = {"counts":counts}
+        exp_dict = dict(exp_template)
+        exp_dict["header"] = __split_header(header, record, i)
+        exp_dict["data"] = data
+        exp_dict["shots"] = exp_shots
+        job_result_dict = dict(result_dict)
+        job_result_dict["results"] = [exp_dict]
+        results.append(Result.from_dict(job_result_dict))
     return results
 
-def __calc_result(index:int, agg_info:Dict[Any, Any], result:Result) -> Result:
-    """Get one result of the aggregated result
+def _decode_counts(counts:Dict[str, int], n_bits:int) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode the hex-encoded states of the counts into an integer array
 
     Args:
-        index (int): the index of the result
-        agg_info (Dict[Any, Any]): aggregation information as Dict
-        result (Result): Result of the aggregated QuantumCircuit
+        counts (Dict[str, int]): hex-encoded states and their counts
+        n_bits (int): number of classical bits of the states
 
-    Raises:
-        Exception: Multiple results are stored in one Result objext
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Returns the states and the corresponding counts as arrays
+    """
+    # numpy integers only hold up to 64 bits, wider states are stored as python integers
+    dtype = np.uint64 if n_bits <= 64 else object
+    states = np.fromiter((int(state, 16) for state in counts.keys()), dtype=dtype, count=len(counts))
+    state_counts = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    return states, state_counts
+
+def _decode_memory(memory:List[str], n_bits:int) -> np.ndarray:
+    """Decode the hex-encoded per-shot memory into an integer array
+
+    Args:
+        memory (List[str]): hex-encoded state of every shot
+        n_bits (int): number of classical bits of the states
 
     Returns:
-        Result: the inital result for the given index
+        np.ndarray: the state of every shot
     """
-    result_dict = result.to_dict()
-    result_dict_copy = copy.deepcopy(result_dict)
-    qubits_start = agg_info["circuits"][index]["qubits"]["start"]
-    qubits_stop = agg_info["circuits"][index]["qubits"]["stop"]
-    n_qubits = qubits_stop - qubits_start
-    circ_size = agg_info["total_qubits"]
-    reg_mapping = agg_info["circuits"][index]["reg_mapping"]
-    data = result.data()["counts"]
-    counts = {}
-    bit_mask = sum([2**i for i in range(n_qubits)])
-    for state in data:
-        state_int = int(state, 16)
-        state_int = state_int >> qubits_start
-        state_int = state_int & bit_mask
-        state_hex = hex(state_int)
-        count = data[state]
-        if state_hex in counts:
-            counts[state_hex] += count
-        else:
-            counts[state_hex] = count
+    dtype = np.uint64 if n_bits <= 64 else object
+    return np.fromiter((int(state, 16) for state in memory), dtype=dtype, count=len(memory))
 
-    if len(result_dict["results"]) == 1:
-        result_dict_copy["results"][0]["data"]["counts"] = counts
-        header = result_dict["results"][0]["header"]
-    else:
-        raise Exception("Result length not 1")
+def _marginal_states(states:np.ndarray, starts:List[int], stops:List[int]) -> np.ndarray:
+    """Extract the bits [start, stop) of the states for every pair of start and stop
 
-    clbit_labels = __relabel(reg_mapping, header, "clbit_labels")
-    qubit_labels = __relabel(reg_mapping, header, "qubit_labels")
+    Args:
+        states (np.ndarray): integer encoded states
+        starts (List[int]): first bit of each initial circuit
+        stops (List[int]): stop bit of each initial circuit
+
+    Returns:
+        np.ndarray: one row of marginal states per initial circuit
+    """
+    shifts = np.array(starts, dtype=states.dtype).reshape(-1, 1)
+    masks = np.array([(1 << (stop - start)) - 1 for start, stop in zip(starts, stops)], dtype=states.dtype).reshape(-1, 1)
+    return (states[np.newaxis, :] >> shifts) & masks
+
+def _count_states(states:np.ndarray, state_counts:np.ndarray) -> Dict[str, int]:
+    """Sum up the counts of equal states
+
+    Args:
+        states (np.ndarray): integer encoded states
+        state_counts (np.ndarray): counts of the states
+
+    Returns:
+        Dict[str, int]: hex-encoded states and their counts
+    """
+    unique_states, inverse = np.unique(states, return_inverse=True)
+    summed_counts = np.bincount(inverse.ravel(), weights=state_counts, minlength=len(unique_states)).astype(np.int64)
+    return {hex(int(state)):int(count) for state, count in zip(unique_states, summed_counts)}
+
+def _rescale_counts(counts:Dict[str, int], shots:int) -> Dict[str, int]:
+    """Scale the counts to the number of shots. The rounding distributes the remaining shots by the largest remainders, so the counts sum up to shots.
+
+    Args:
+        counts (Dict[str, int]): hex-encoded states and their counts
+        shots (int): number of shots of the scaled counts
 
-    creg_sizes = __relabel(reg_mapping, header, "creg_sizes")
+    Returns:
+        Dict[str, int]: hex-encoded states and their scaled counts
+    """
+    state_counts = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    scaled_counts = state_counts*shots/state_counts.sum()
+    rounded_counts = np.floor(scaled_counts).astype(np.int64)
+    remaining_shots = shots - int(rounded_counts.sum())
+    rounded_counts[np.argsort(rounded_counts - scaled_counts, kind="stable")[:remaining_shots]] += 1
+    return {state:int(count) for state, count in zip(counts.keys(), rounded_counts) if count > 0}
+
+def _split_memory(memory:np.ndarray) -> Tuple[Dict[str, int], List[str]]:
+    """Count the states of the per-shot memory and encode it as hex strings
+
+    Args:
+        memory (np.ndarray): integer encoded state of every shot
+
+    Returns:
+        Tuple[Dict[str, int], List[str]]: Returns the hex-encoded counts and the hex-encoded memory
+    """
+    unique_states, inverse = np.unique(memory, return_inverse=True)
+    hex_states = np.array([hex(int(state)) for state in unique_states], dtype=object)
+    summed_counts = np.bincount(inverse.ravel(), minlength=len(unique_states))
+    counts = {hex_state:int(count) for hex_state, count in zip(hex_states, summed_counts)}
+    return counts, hex_states[inverse.ravel()].tolist()
+
+def __split_header(header:Dict[str, Any], record:AggregationRecord, index:int) -> Dict[str, Any]:
+    """Derive the header of an initial circuit from the header of the aggregated circuit
+
+    Args:
+        header (Dict[str, Any]): header of the aggregated experiment
+        record (AggregationRecord): bookkeeping of the aggregated job
+        index (int): the index of the initial circuit
+
+    Returns:
+        Dict[str, Any]: the header of the initial circuit
+    """
+    reg_mapping = record.reg_mappings[index]
+    clbit_start, clbit_stop = record.clbit_ranges[index]
+    job_header = dict(header)
+
+    qubit_labels = __relabel(reg_mapping, header, "qubit_labels")
     qreg_sizes = __relabel(reg_mapping, header, "qreg_sizes")
 
-    result_dict_copy["results"][0]["header"]["clbit_labels"] = clbit_labels
-    result_dict_copy["results"][0]["header"]["creg_sizes"] = creg_sizes
-    result_dict_copy["results"][0]["header"]["memory_slots"] = n_qubits
-    result_dict_copy["results"][0]["header"]["name"] = agg_info["circuits"][index]["name"]
+    job_header["clbit_labels"] = __relabel(reg_mapping, header, "clbit_labels")
+    job_header["creg_sizes"] = __relabel(reg_mapping, header, "creg_sizes")
+    job_header["memory_slots"] = clbit_stop - clbit_start
+    job_header["name"] = record.names[index]
 
     if len(qubit_labels) > 0:
-        result_dict_copy["results"][0]["header"]["qubit_labels"] = qubit_labels
+        job_header["qubit_labels"] = qubit_labels
     
     if len(qreg_sizes) > 0:
-        result_dict_copy["results"][0]["header"]["qreg_sizes"] = qreg_sizes
-        result_dict_copy["results"][0]["header"]["n_qubits"] = n_qubits
+        job_header["qreg_sizes"] = qreg_sizes
+        job_header["n_qubits"] = record.qubit_counts[index]
 
-    return Result.from_dict(result_dict_copy)
+    return job_header
 
 def __relabel(reg_mapping, header, key):
     labels = []
@@ -0,0 +1,115 @@
+import time
+from typing import Dict, FrozenSet, List, Optional
+
+import logger
+from execution_handler.execution_handler import BackendLookUp
+from qiskit.providers.exceptions import BackendPropertyError
+from qiskit.providers.models import BackendProperties
+
+
+class NoiseSnapshot():
+    """Error estimates of the qubits and couplings of a backend at one point in time
+    """
+
+    def __init__(self, qubit_errors:Dict[int, float], edge_errors:Dict[FrozenSet[int], float]) -> None:
+        self.qubit_errors = qubit_errors
+        self.edge_errors = edge_errors
+        self.timestamp = time.time()
+
+    @classmethod
+    def from_properties(cls, properties:BackendProperties) -> 'NoiseSnapshot':
+        """Estimate the errors from the calibration data of a backend.
+        The error of a qubit is the sum of its readout error, its mean single-qubit gate error and its decoherence during a mean two-qubit gate.
+
+        Args:
+            properties (BackendProperties)
+
+        Returns:
+            NoiseSnapshot
+        """
+        single_qubit_errors = {}
+        edge_errors = {}
+        two_qubit_lengths = []
+        for gate in properties.gates:
+            try:
+                error = properties.gate_error(gate.gate, gate.qubits)
+            except BackendPropertyError:
+                continue
+            if len(gate.qubits) == 1:
+                single_qubit_errors.setdefault(gate.qubits[0], []).append(error)
+            elif len(gate.qubits) == 2:
+                edge = frozenset(gate.qubits)
+                edge_errors[edge] = min(error, edge_errors.get(edge, error))
+                try:
+                    two_qubit_lengths.append(properties.gate_length(gate.gate, gate.qubits))
+                except BackendPropertyError:
+                    pass
+        reference_time = sum(two_qubit_lengths)/len(two_qubit_lengths) if len(two_qubit_lengths) > 0 else 0
+
+        qubit_errors = {}
+        for qubit in range(len(properties.qubits)):
+            error = 0
+            try:
+                error += properties.readout_error(qubit)
+            except BackendPropertyError:
+                pass
+            gate_errors = single_qubit_errors.get(qubit, [])
+            if len(gate_errors) > 0:
+                error += sum(gate_errors)/len(gate_errors)
+            for decoherence_time in (properties.t1, properties.t2):
+                try:
+                    error += reference_time/decoherence_time(qubit)
+                except (BackendPropertyError, ZeroDivisionError):
+                    pass
+            qubit_errors[qubit] = error
+        return cls(qubit_errors, edge_errors)
+
+    def region_error(self, region:List[int]) -> float:
+        """Estimate the error of a region of the backend
+
+        Args:
+            region (List[int]): connected physical qubits
+
+        Returns:
+            float: the errors of the qubits plus the mean error of the couplings inside the region for every qubit beyond the first one
+        """
+        region_set = set(region)
+        error = sum(self.qubit_errors.get(qubit, 0) for qubit in region)
+        edge_errors = [edge_error for edge, edge_error in self.edge_errors.items() if edge <= region_set]
+        if len(edge_errors) > 0:
+            error += (len(region) - 1)*sum(edge_errors)/len(edge_errors)
+        return error
+
+
+class BackendPropertiesCache():
+    """Caches a NoiseSnapshot per backend and refreshes it after the refresh interval. Thus, the calibration data is not queried for every job.
+    """
+
+    def __init__(self, backend_look_up:BackendLookUp, refresh_interval:float=3600) -> None:
+        self._log = logger.get_logger(type(self).__name__)
+        self._backend_look_up = backend_look_up
+        self._refresh_interval = refresh_interval
+        self._snapshots = {}
+
+    def get(self, backend_name:str) -> Optional[NoiseSnapshot]:
+        """Get the cached NoiseSnapshot of the backend
+
+        Args:
+            backend_name (str)
+
+        Returns:
+            Optional[NoiseSnapshot]: None, if the backend provides no calibration data, e.g. simulators
+        """
+        try:
+            timestamp, snapshot = self._snapshots[backend_name]
+            if time.time() - timestamp < self._refresh_interval:
+                return snapshot
+        except KeyError:
+            pass
+        properties = self._backend_look_up.snapshot(backend_name).properties
+        snapshot = None
+        if properties is not None:
+            snapshot = NoiseSnapshot.from_properties(properties)
+            self._log.info(f"Refreshed the calibration data of backend {backend_name}")
+        self._snapshots[backend_name] = (time.time(), snapshot)
+        return snapshot
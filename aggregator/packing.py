@@ -0,0 +1,62 @@
+from typing import Callable, List
+
+from quantum_execution_job import QuantumExecutionJob
+
+
+def circuit_width(job:QuantumExecutionJob) -> int:
+    """
+    Returns:
+        int: number of qubits of the circuit of the job
+    """
+    return job.circuit.num_qubits
+
+def first_fit_decreasing(jobs:List[QuantumExecutionJob], capacity:int, width:Callable[[QuantumExecutionJob], int]=circuit_width) -> List[List[QuantumExecutionJob]]:
+    """Pack the jobs into bins via first-fit-decreasing, such that the total width of every bin does not exceed the capacity.
+    Jobs that are wider than the capacity get a bin on their own.
+
+    Args:
+        jobs (List[QuantumExecutionJob]): jobs to pack
+        capacity (int): maximal width of a bin, e.g. the number of qubits of the backend
+        width (Callable[[QuantumExecutionJob], int], optional): width of a job. Defaults to the number of qubits of its circuit.
+
+    Returns:
+        List[List[QuantumExecutionJob]]: the bins. Each bin contains the jobs in the order they were packed.
+    """
+    bins = []
+    free_space = []
+    for job in sorted(jobs, key=width, reverse=True):
+        job_width = width(job)
+        for i, space in enumerate(free_space):
+            if job_width <= space:
+                bins[i].append(job)
+                free_space[i] -= job_width
+                break
+        else:
+            bins.append([job])
+            free_space.append(capacity - job_width)
+    return bins
+
+def total_width(jobs:List[QuantumExecutionJob], width:Callable[[QuantumExecutionJob], int]=circuit_width) -> int:
+    """
+    Returns:
+        int: sum of the widths of the jobs
+    """
+    return sum(width(job) for job in jobs)
+
+def cluster_by_shots(jobs:List[QuantumExecutionJob], max_ratio:float) -> List[List[QuantumExecutionJob]]:
+    """Cluster the jobs such that the largest number of shots of a cluster is at most max_ratio times the smallest number of shots of the cluster
+
+    Args:
+        jobs (List[QuantumExecutionJob]): jobs to cluster
+        max_ratio (float): maximal ratio between the largest and smallest number of shots in a cluster
+
+    Returns:
+        List[List[QuantumExecutionJob]]: the clusters, starting with the cluster with the most shots
+    """
+    clusters = []
+    for job in sorted(jobs, key=lambda job: job.shots, reverse=True):
+        if len(clusters) > 0 and job.shots*max_ratio >= clusters[-1][0].shots:
+            clusters[-1].append(job)
+        else:
+            clusters.append([job])
+    return clusters
@@ -0,0 +1,117 @@
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+
+
+def _adjacency(coupling_map:List[List[int]], n_qubits:int) -> Dict[int, List[int]]:
+    """Generate the undirected adjacency lists of the coupling map
+
+    Args:
+        coupling_map (List[List[int]]): directed edges between physical qubits
+        n_qubits (int): number of physical qubits
+
+    Returns:
+        Dict[int, List[int]]: maps every physical qubit to its sorted neighbours
+    """
+    adjacency = {qubit:set() for qubit in range(n_qubits)}
+    for a, b in coupling_map:
+        adjacency[a].add(b)
+        adjacency[b].add(a)
+    return {qubit:sorted(neighbours) for qubit, neighbours in adjacency.items()}
+
+def _grow_region(seed:int, size:int, adjacency:Dict[int, List[int]], free:Set[int]) -> List[int]:
+    """Grow a connected region of free qubits via breadth-first search
+
+    Args:
+        seed (int): first qubit of the region
+        size (int): targeted number of qubits
+        adjacency (Dict[int, List[int]])
+        free (Set[int]): qubits that are not part of another region
+
+    Returns:
+        List[int]: the region. It contains less than size qubits, if the connected free component of the seed is too small.
+    """
+    region = [seed]
+    visited = {seed}
+    to_visit = deque([seed])
+    while to_visit and len(region) < size:
+        qubit = to_visit.popleft()
+        for neighbour in adjacency[qubit]:
+            if neighbour in free and neighbour not in visited:
+                visited.add(neighbour)
+                region.append(neighbour)
+                to_visit.append(neighbour)
+                if len(region) == size:
+                    break
+    return region
+
+def _boundary(region:List[int], adjacency:Dict[int, List[int]], free:Set[int]) -> int:
+    """
+    Returns:
+        int: number of edges between the region and the remaining free qubits
+    """
+    region_set = set(region)
+    return sum(1 for qubit in region for neighbour in adjacency[qubit] if neighbour in free and neighbour not in region_set)
+
+def _candidates(size:int, adjacency:Dict[int, List[int]], free:Set[int], region_cost:Optional[Callable[[List[int]], float]]=None) -> List[List[int]]:
+    """Generate the distinct connected regions of free qubits with the given size, one grown from every free qubit
+
+    Args:
+        size (int): number of qubits of the region
+        adjacency (Dict[int, List[int]])
+        free (Set[int]): qubits that are not part of another region
+        region_cost (Optional[Callable[[List[int]], float]], optional): If given, the candidates with the lowest costs come first. Defaults to None.
+
+    Returns:
+        List[List[int]]: the candidate regions sorted by their cost and the number of edges to the remaining free qubits
+    """
+    candidates = {}
+    for seed in sorted(free):
+        region = _grow_region(seed, size, adjacency, free)
+        if len(region) == size:
+            candidates.setdefault(frozenset(region), region)
+    if region_cost is None:
+        return sorted(candidates.values(), key=lambda region: _boundary(region, adjacency, free))
+    return sorted(candidates.values(), key=lambda region: (region_cost(region), _boundary(region, adjacency, free)))
+
+def allocate_regions(coupling_map:List[List[int]], n_qubits:int, sizes:List[int], max_tries:int=1000, region_cost:Optional[Callable[[List[int]], float]]=None, priorities:Optional[List[float]]=None) -> Optional[List[List[int]]]:
+    """Split the coupling map into disjoint connected regions, one for each size.
+    The largest regions are allocated first. Candidate regions with the lowest cost and the fewest edges to the remaining free qubits are tried first to keep the free part of the device connected.
+    If the remaining regions do not fit anymore, the search backtracks.
+
+    Args:
+        coupling_map (List[List[int]]): directed edges between physical qubits
+        n_qubits (int): number of physical qubits
+        sizes (List[int]): number of qubits of each region
+        max_tries (int, optional): maximal number of tried candidate regions. Defaults to 1000.
+        region_cost (Optional[Callable[[List[int]], float]], optional): cost of a region, e.g. its estimated error. Defaults to None.
+        priorities (Optional[List[float]], optional): Regions of the same size with a higher priority are allocated first and get the cheaper regions. Defaults to None.
+
+    Returns:
+        Optional[List[List[int]]]: the physical qubits of each region in the order of the sizes. Returns None if no allocation was found.
+    """
+    if sum(sizes) > n_qubits:
+        return None
+    if priorities is None:
+        priorities = [0]*len(sizes)
+    adjacency = _adjacency(coupling_map, n_qubits)
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i], priorities[i]), reverse=True)
+    regions = [None]*len(sizes)
+    tries = 0
+
+    def allocate(position:int, free:Set[int]) -> bool:
+        nonlocal tries
+        if position == len(order):
+            return True
+        index = order[position]
+        for region in _candidates(sizes[index], adjacency, free, region_cost):
+            tries += 1
+            if tries > max_tries:
+                return False
+            regions[index] = region
+            if allocate(position + 1, free.difference(region)):
+                return True
+        return False
+
+    if allocate(0, set(range(n_qubits))):
+        return regions
+    return None
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import logger
+from execution_handler.execution_handler import BackendLookUp, TranspilePool
+from execution_handler.transpile_cache import circuit_fingerprint
+from qiskit import QuantumCircuit, QuantumRegister, transpile
+
+
+class RegionTranspiler():
+    """Transpiles circuits for connected regions of the physical qubits of a backend and caches the transpiled circuits.
+    Regions with the same relabelled coupling map share the cached circuits.
+    """
+
+    def __init__(self, backend_look_up:BackendLookUp, cache_size:int=1000, pool:Optional[TranspilePool]=None) -> None:
+        """
+        Args:
+            backend_look_up (BackendLookUp)
+            cache_size (int, optional): maximal number of cached transpiled circuits. Defaults to 1000.
+            pool (Optional[TranspilePool], optional): shared process pool for the transpilation. If None, the circuits are transpiled in the calling thread. Defaults to None.
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        self._backend_look_up = backend_look_up
+        self._pool = pool
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _region_coupling_map(self, coupling_map:List[List[int]], region:List[int]) -> List[List[int]]:
+        """Restrict the coupling map to the region and relabel the qubits with their index in the region
+
+        Args:
+            coupling_map (List[List[int]]): edges between the physical qubits of the backend
+            region (List[int]): physical qubits of the region
+
+        Returns:
+            List[List[int]]: edges between the qubits of the region
+        """
+        index = {qubit:i for i, qubit in enumerate(region)}
+        return [[index[a], index[b]] for a, b in coupling_map if a in index and b in index]
+
+    def transpile(self, circuits:List[QuantumCircuit], backend_name:str, regions:List[List[int]]) -> List[QuantumCircuit]:
+        """Transpile each circuit for its region of the backend. Qubit i of a returned circuit corresponds to the physical qubit region[i] of its region.
+        The circuits that are not cached are transpiled concurrently by the process pool.
+
+        Args:
+            circuits (List[QuantumCircuit])
+            backend_name (str)
+            regions (List[List[int]]): connected physical qubits of the backend for each circuit
+
+        Returns:
+            List[QuantumCircuit]: the transpiled circuits
+        """
+        snapshot = self._backend_look_up.snapshot(backend_name)
+        transpiled_circuits = [None]*len(circuits)
+        # indices of the circuits per key of the circuits to transpile
+        duplicates = {}
+        tasks = []
+        for index, (circuit, region) in enumerate(zip(circuits, regions)):
+            # a region with a single qubit has no edges and needs no routing
+            region_coupling_map = self._region_coupling_map(snapshot.coupling_map, region) or None
+            # the version of the snapshot invalidates the cached circuits when the backend is recalibrated
+            key = (backend_name, snapshot.version, len(region), tuple(sorted(map(tuple, region_coupling_map or []))), circuit_fingerprint(circuit))
+            try:
+                transpiled_circuits[index] = self._cache[key]
+                self._cache.move_to_end(key)
+                self.hits += 1
+                continue
+            except KeyError:
+                pass
+            if key in duplicates:
+                # identical circuits on regions with the same coupling map are transpiled only once
+                duplicates[key].append(index)
+                self.hits += 1
+                continue
+            self.misses += 1
+            duplicates[key] = [index]
+            tasks.append(([circuit], snapshot.basis_gates, region_coupling_map, None, None))
+        if len(tasks) == 0:
+            return transpiled_circuits
+        if self._pool is None:
+            new_circuits = [transpile(task_circuits, basis_gates=basis_gates, coupling_map=coupling_map) for task_circuits, basis_gates, coupling_map, _, _ in tasks]
+        else:
+            new_circuits = self._pool.transpile(tasks)
+        for (key, indices), (transpiled_circuit,) in zip(duplicates.items(), new_circuits):
+            for index in indices:
+                transpiled_circuits[index] = transpiled_circuit
+            self._cache[key] = transpiled_circuit
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return transpiled_circuits
+
+
+def stitch(agg_circuit:QuantumCircuit, transpiled_circuits:List[QuantumCircuit], regions:List[List[int]], clbit_ranges:List[Tuple[int, int]], n_qubits:int) -> QuantumCircuit:
+    """Stitch the transpiled circuits into one circuit on the physical qubits of the backend
+
+    Args:
+        agg_circuit (QuantumCircuit): the aggregated circuit providing the classical registers and the name
+        transpiled_circuits (List[QuantumCircuit]): the initial circuits transpiled for their regions
+        regions (List[List[int]]): physical qubits of the region of each transpiled circuit
+        clbit_ranges (List[Tuple[int, int]]): start and stop of the classical bits of each initial circuit in the aggregated circuit
+        n_qubits (int): number of physical qubits of the backend
+
+    Returns:
+        QuantumCircuit: the stitched circuit, which can be executed without further transpilation
+    """
+    stitched_circuit = QuantumCircuit(QuantumRegister(n_qubits, "q"), *agg_circuit.cregs, name=agg_circuit.name)
+    global_phase = 0
+    for circ, region, (clbit_start, clbit_stop) in zip(transpiled_circuits, regions, clbit_ranges):
+        qubit_map = {qubit:stitched_circuit.qubits[region[i]] for i, qubit in enumerate(circ.qubits)}
+        clbit_map = dict(zip(circ.clbits, stitched_circuit.clbits[clbit_start:clbit_stop]))
+        for instruction, qargs, cargs in circ.data:
+            stitched_circuit._append(instruction, [qubit_map[q] for q in qargs], [clbit_map[c] for c in cargs])
+        global_phase += circ.global_phase
+    stitched_circuit.global_phase = global_phase
+    return stitched_circuit
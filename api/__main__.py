@@ -7,7 +7,7 @@ from flask import Flask
 from flask_mongoengine import MongoEngine
 from virtualization import Virtual_Execution_Environment
 
-from api.resources import HelloWorld, Task_API, TaskCreation_API, Task_Result, Task_Status
+from api.resources import HelloWorld, Metrics_API, Task_API, TaskCreation_API, Task_Result, Task_Status
 from api.results import ResultFetcher
 
 
@@ -36,6 +36,7 @@ def _initialize_routes(api):
     api.add_resource(Task_API, "/tasks/<string:task_id>")
     api.add_resource(Task_Status, "/tasks/<string:task_id>/status")
     api.add_resource(Task_Result, "/tasks/<string:task_id>/result")
+    api.add_resource(Metrics_API, "/metrics")
 
 
 
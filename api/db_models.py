@@ -1,26 +1,59 @@
 
+import base64
+import io
+
 from flask_mongoengine import Document
+from mongoengine.errors import ValidationError
 from mongoengine.fields import DictField, IntField, StringField
 
 from qiskit import QuantumCircuit
 
-from quantum_execution_job import QuantumExecutionJob
+from quantum_execution_job import QuantumExecutionJob, check_parameters
+
+try:
+    from qiskit.circuit import qpy_serialization
+except ImportError:
+    # QPY is only available since qiskit-terra 0.17, older versions only accept OpenQASM
+    qpy_serialization = None
 
 
 class Task(Document):
-    qasm = StringField(required=True)
+    qasm = StringField(null=True)
+    # base64 encoded QPY of a parameterized template, since OpenQASM 2 can not represent unbound parameters
+    qpy = StringField(null=True)
+    parameters = DictField(default={})
     shots = IntField(min_value=0, default=8192)
     qjob_id = StringField(null=True)
     status = StringField(default="created")
     config = DictField(default={})
     result = DictField(default={})
 
+    def clean(self):
+        if not self.qasm and not self.qpy:
+            raise ValidationError("Either qasm or qpy is required")
+        if not self.qasm and qpy_serialization is None:
+            raise ValidationError("qpy requires qiskit-terra 0.17 or newer, use qasm instead")
+        try:
+            circuit = self._load_circuit()
+        except Exception as e:
+            raise ValidationError(f"Invalid circuit: {e}")
+        try:
+            check_parameters(circuit, self.parameters)
+        except ValueError as e:
+            raise ValidationError(str(e))
+
     @property
     def id_str(self):
         return str(self.id)
 
     def to_dict(self):
-        d = {"id":self.id_str, "qasm":self.qasm, "status":self.status, "shots":self.shots, "config":self.config}
+        d = {"id":self.id_str, "status":self.status, "shots":self.shots, "config":self.config}
+        if self.qasm:
+            d["qasm"] = self.qasm
+        if self.qpy:
+            d["qpy"] = self.qpy
+        if self.parameters:
+            d["parameters"] = self.parameters
         if self.result:
             d["result"] = self.result
         return d
@@ -28,7 +61,13 @@ class Task(Document):
     def update_results(self, job:QuantumExecutionJob):
         self.result = job.result_prob
 
+    def _load_circuit(self) -> QuantumCircuit:
+        if self.qpy and qpy_serialization is not None:
+            return qpy_serialization.load(io.BytesIO(base64.b64decode(self.qpy)))[0]
+        return QuantumCircuit.from_qasm_str(self.qasm)
+
     def create_qjob(self):
-        qjob = QuantumExecutionJob(QuantumCircuit.from_qasm_str(self.qasm), shots=self.shots, config=self.config)
+        circuit = self._load_circuit()
+        qjob = QuantumExecutionJob(circuit, shots=self.shots, config=self.config, parameters=self.parameters)
         self.qjob_id = qjob.id
         return qjob
@@ -3,9 +3,11 @@ from typing import Optional
 
 import flask_restful
 from bson.objectid import ObjectId
-from flask import jsonify, request
+from flask import Response, jsonify, request
+from mongoengine.errors import ValidationError
 
 import api.db_models
+from metrics.registry import REGISTRY
 
 
 def get_task(task_id:str) -> Optional[ObjectId]:
@@ -22,15 +24,24 @@ class TaskCreation_API(flask_restful.Resource):
         if request.is_json:
                 body = request.get_json()
                 if "circuits" in body.keys():
+                    tasks = [api.db_models.Task(**item) for item in body["circuits"]]
+                    try:
+                        # reject all tasks, if one of them is invalid
+                        for task in tasks:
+                            task.validate()
+                    except ValidationError as e:
+                        return str(e), 400
                     result_list = []
-                    for item in body["circuits"]:
-                        task = api.db_models.Task(**item)
+                    for task in tasks:
                         task.save()
                         result_list.append({"id":task.id_str})
                     return jsonify(results=result_list)
                 else:
                     task = api.db_models.Task(**body)
-                    task.save()
+                    try:
+                        task.save()
+                    except ValidationError as e:
+                        return str(e), 400
                     return jsonify(id=task.id_str)
 
 class Task_API(flask_restful.Resource):
@@ -83,4 +94,10 @@ class Task_Result(flask_restful.Resource):
         task = get_task(task_id)
         if task is None:
             return 'TaskDoesNotExist', 404
-        return jsonify(task.result)
\ No newline at end of file
+        return jsonify(task.result)
+
+
+class Metrics_API(flask_restful.Resource):
+
+    def get(self):
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
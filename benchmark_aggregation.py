@@ -0,0 +1,56 @@
+import timeit
+from typing import List
+
+from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister
+from qiskit.circuit.random import random_circuit
+
+import logger
+from aggregator.aggregator import aggregate
+
+
+def aggregate_with_compose(list_of_circuits: List[QuantumCircuit]) -> QuantumCircuit:
+    """Reference implementation of the previous construction: copy the registers of every circuit and compose the circuits one after another into the aggregated circuit
+
+    Args:
+        list_of_circuits (List[QuantumCircuit]): List of QuantumCircuit to aggregate
+
+    Returns:
+        QuantumCircuit: the aggregated circuit
+    """
+    agg_circuit = QuantumCircuit()
+    for index, circ in enumerate(list_of_circuits):
+        for qreg in circ.qregs:
+            agg_circuit.add_register(QuantumRegister(qreg.size, f"circ{index}reg{qreg.name}"))
+        for creg in circ.cregs:
+            agg_circuit.add_register(ClassicalRegister(creg.size, f"circ{index}reg{creg.name}"))
+    qubit_count = 0
+    clbit_count = 0
+    for circ in list_of_circuits:
+        qubits = range(qubit_count, qubit_count + circ.num_qubits)
+        clbits = range(clbit_count, clbit_count + circ.num_clbits)
+        agg_circuit.compose(circ, qubits=qubits, clbits=clbits, inplace=True)
+        qubit_count += circ.num_qubits
+        clbit_count += circ.num_clbits
+    return agg_circuit
+
+
+if __name__ == "__main__":
+    """
+    Configure the benchmark here:
+    """
+    n_circuits_list = [10, 100, 1000]
+    n_qubits = 2
+    depth = 10
+    repetitions = 5
+
+    """
+    Configuration End
+    """
+
+    log = logger.get_logger("Benchmark")
+
+    for n_circuits in n_circuits_list:
+        circuits = [random_circuit(n_qubits, depth, measure=True, seed=i) for i in range(n_circuits)]
+        agg_time = min(timeit.repeat(lambda: aggregate(circuits), number=1, repeat=repetitions))
+        compose_time = min(timeit.repeat(lambda: aggregate_with_compose(circuits), number=1, repeat=repetitions))
+        log.info(f"{n_circuits} circuits: aggregate {agg_time*1000:.2f}ms, compose {compose_time*1000:.2f}ms, speedup {compose_time/agg_time:.1f}x")
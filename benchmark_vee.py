@@ -0,0 +1,259 @@
+import copy
+import os
+import random
+import subprocess
+import time
+from datetime import datetime
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import psutil
+from qiskit.circuit.random import random_circuit
+
+import config.files as cf
+import logger
+from config.json_util import write_json
+from fake_ibmq.provider import FakeIBMQProvider
+from quantum_execution_job import QuantumExecutionJob
+from virtualization import Virtual_Execution_Environment
+
+
+class TimedQueue(Queue):
+    """Queue that records how long the items wait in it
+    """
+
+    def __init__(self, name:str, maxsize:int=0) -> None:
+        self.name = name
+        self.waits = []
+        self._waits_lock = Lock()
+        Queue.__init__(self, maxsize)
+
+    def _put(self, item:Any):
+        self.queue.append((time.time(), item))
+
+    def _get(self) -> Any:
+        put_time, item = self.queue.popleft()
+        with self._waits_lock:
+            self.waits.append(time.time() - put_time)
+        return item
+
+
+def distribution(values:List[float]) -> Dict[str, Optional[float]]:
+    """Summarize the values by their mean, percentiles and maximum
+
+    Args:
+        values (List[float])
+
+    Returns:
+        Dict[str, Optional[float]]: the statistics are None, if there are no values
+    """
+    if len(values) == 0:
+        return {"count":0, "mean":None, "p50":None, "p95":None, "p99":None, "max":None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count":len(values), "mean":float(np.mean(values)), "p50":float(p50), "p95":float(p95), "p99":float(p99), "max":float(np.max(values))}
+
+
+def cpu_time(process:psutil.Process) -> float:
+    """CPU time in seconds of the process and its children, e.g. the transpile workers
+
+    Args:
+        process (psutil.Process)
+
+    Returns:
+        float
+    """
+    times = process.cpu_times()
+    total = times.user + times.system + times.children_user + times.children_system
+    for child in process.children(recursive=True):
+        try:
+            child_times = child.cpu_times()
+            total += child_times.user + child_times.system
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def generate_jobs(n_jobs:int, job_mix:Dict[str, float], widths:List[int], depth:int, shots:List[int], seed:int) -> List[QuantumExecutionJob]:
+    """Generate random circuits and wrap them in jobs, which are restricted to one execution type
+
+    Args:
+        n_jobs (int)
+        job_mix (Dict[str, float]): weights of the execution types "raw", "aggregation" and "partition"
+        widths (List[int]): number of qubits of the circuits, chosen uniformly
+        depth (int): depth of the circuits
+        shots (List[int]): number of shots of the jobs, chosen uniformly
+        seed (int)
+
+    Returns:
+        List[QuantumExecutionJob]
+    """
+    rng = random.Random(seed)
+    types = list(job_mix.keys())
+    weights = list(job_mix.values())
+    jobs = []
+    for index in range(n_jobs):
+        execution_type = rng.choices(types, weights)[0]
+        execution_types = {"raw":False, "aggregation":False, "partition":False, execution_type:True}
+        circuit = random_circuit(rng.choice(widths), depth, measure=True, seed=seed+index)
+        job_config = {"quantum_resource_mapper":{"execution_types":execution_types}}
+        job = QuantumExecutionJob(circuit, shots=rng.choice(shots), config=job_config)
+        job.benchmark_type = execution_type
+        jobs.append(job)
+    return jobs
+
+
+def arrival_times(n_jobs:int, arrival_process:str, rate:float, seed:int) -> List[float]:
+    """Offsets in seconds at which the jobs are put into the pipeline
+
+    Args:
+        n_jobs (int)
+        arrival_process (str): "poisson", "constant" or "burst"
+        rate (float): mean number of jobs per second
+        seed (int)
+
+    Returns:
+        List[float]
+    """
+    if arrival_process == "burst":
+        return [0.0]*n_jobs
+    if arrival_process == "constant":
+        return [index/rate for index in range(n_jobs)]
+    rng = random.Random(seed)
+    offsets = []
+    offset = 0.0
+    for _ in range(n_jobs):
+        offsets.append(offset)
+        offset += rng.expovariate(rate)
+    return offsets
+
+
+def run_benchmark(config:Dict, provider_options:Dict, n_jobs:int, job_mix:Dict[str, float], widths:List[int], depth:int, shots:List[int],
+                  arrival_process:str, rate:float, timeout:float, seed:int) -> Dict:
+    """Drive the Virtual_Execution_Environment with generated jobs on the fake provider and measure it
+
+    Returns:
+        Dict: throughput, latencies, queue waits and CPU usage
+    """
+    log = logger.get_logger("Benchmark")
+    queues = {}
+
+    def queue_factory(name:str) -> TimedQueue:
+        queue = TimedQueue(name)
+        queues[name] = queue
+        return queue
+
+    provider = FakeIBMQProvider(seed=seed, **provider_options)
+    vee = Virtual_Execution_Environment(provider, config, queue_factory=queue_factory)
+    jobs = generate_jobs(n_jobs, job_mix, widths, depth, shots, seed)
+    offsets = arrival_times(n_jobs, arrival_process, rate, seed)
+    submit_times = {}
+    log.info(f"Generated {n_jobs} jobs")
+
+    process = psutil.Process()
+    vee.start()
+    start_time = time.time()
+    start_cpu = cpu_time(process)
+
+    def submit():
+        for job, offset in zip(jobs, offsets):
+            delay = start_time + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            submit_times[job.id] = time.time()
+            vee.input.put(job)
+
+    Thread(target=submit, daemon=True).start()
+
+    latencies = {}
+    n_errors = 0
+    while len(latencies) + n_errors < n_jobs and time.time() - start_time < timeout:
+        try:
+            job = vee.output.get(timeout=1)
+            latencies[job.id] = (getattr(job, "benchmark_type", str(job.type)), time.time() - submit_times[job.id])
+        except Empty:
+            pass
+        try:
+            while True:
+                vee.errors.get_nowait()
+                n_errors += 1
+        except Empty:
+            pass
+    wall_time = time.time() - start_time
+    used_cpu = cpu_time(process) - start_cpu
+    log.info(f"Finished {len(latencies)} of {n_jobs} jobs with {n_errors} errors in {wall_time}s")
+
+    latencies_per_type = {}
+    for execution_type, latency in latencies.values():
+        latencies_per_type.setdefault(execution_type, []).append(latency)
+    return {
+        "completed_jobs":len(latencies),
+        "errors":n_errors,
+        "timed_out":len(latencies) + n_errors < n_jobs,
+        "wall_time":wall_time,
+        "throughput":len(latencies)/wall_time,
+        "latency":distribution([latency for _, latency in latencies.values()]),
+        "latency_per_type":{execution_type:distribution(values) for execution_type, values in latencies_per_type.items()},
+        "queue_wait":{name:distribution(queue.waits) for name, queue in queues.items()},
+        "cpu_time":used_cpu,
+        "cpu_utilization":used_cpu/(wall_time*psutil.cpu_count(logical=True))
+    }
+
+
+if __name__ == "__main__":
+    """
+    Configure the benchmark here:
+    """
+    n_jobs = 100
+    job_mix = {"raw":0.5, "aggregation":0.5, "partition":0}
+    # the fake backends have 5 qubits, aggregated circuits may use at most half of them
+    widths = [1, 2]
+    depth = 5
+    shots = [1024, 8192]
+    # "poisson", "constant" or "burst"
+    arrival_process = "poisson"
+    # jobs per second
+    rate = 2
+    timeout = 1800
+    seed = 42
+
+    provider_options = {
+        "queue_delay":5,
+        "time_per_shot":1e-4,
+        "maximum_jobs":5
+    }
+    pipeline_options = {
+        "aggregator":{"timeout":10},
+        # no on-disk transpile cache, so that the runs are comparable
+        "execution_handler":{"batch_timeout":10, "transpile_timeout":5, "retrieve_interval":5, "transpile_cache_dir":None}
+    }
+    result_dir = "benchmark_results"
+
+    """
+    Configuration End
+    """
+
+    config = copy.deepcopy(cf.example_config)
+    for section, options in pipeline_options.items():
+        config[section].update(options)
+    logger.set_log_level_from_config(config)
+
+    result = run_benchmark(config, provider_options, n_jobs, job_mix, widths, depth, shots, arrival_process, rate, timeout, seed)
+    result["commit"] = git_commit()
+    result["parameters"] = {"n_jobs":n_jobs, "job_mix":job_mix, "widths":widths, "depth":depth, "shots":shots, "arrival_process":arrival_process,
+                            "rate":rate, "seed":seed, "provider_options":provider_options, "config":config}
+
+    os.makedirs(result_dir, exist_ok=True)
+    path = f"{result_dir}/vee-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.json"
+    write_json(result, path)
+    logger.get_logger("Benchmark").info(f"Wrote results to {path}, throughput {result['throughput']:.2f} jobs/s, p95 latency {result['latency']['p95']}s")
+    # the pipeline threads run forever
+    os._exit(0)
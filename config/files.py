@@ -5,7 +5,8 @@ CONFIG_PATH = "./config.json"
 
 example_config = {
     "IBMQ":{
-        "token":"Insert your token here or delete this key-value pair to use the default token of your system."
+        "token":"Insert your token here or delete this key-value pair to use the default token of your system.",
+        "fake_provider":None
     },
     "logger":{
         "level":"INFO"
@@ -27,23 +28,48 @@ example_config = {
         "execution_types":{
             "raw":True,
             "aggregation":True,
-            "partition":True
+            "partition":True,
+            "shard":False
         },
         "optimization_goal":"Either pick: 'high_throughput' or 'low_waiting_time'. The default value 'high_throughput' gets chosen, if the given value does not match."
     },
     "aggregator":{
-        "timeout":10
+        "timeout":10,
+        "pre_transpile":True,
+        "transpile_cache_size":1000,
+        "shot_ratio":2,
+        "noise_aware":True,
+        "properties_refresh_interval":3600,
+        "fill_ratio":0.8
     },
     "partitioner":{
         "max_separate_circuits":4,
         "max_cuts":10,
     },
+    "sharding":{
+        "max_shards":4
+    },
+    "metrics":{
+        "interval":5
+    },
     "execution_handler":{
         "transpile_timeout":20,
         "batch_timeout":60,
         "submitter_defer_interval":30, 
+        "assembly_workers":2,
+        "assembly_cache_size":1000,
         "retrieve_interval":30,
-        "provide_memory":False
+        "min_retrieve_interval":1,
+        "max_retrieve_workers":10,
+        "provide_memory":False,
+        "transpile_cache_size":1000,
+        "transpile_cache_dir":None,
+        "transpile_cache_max_disk_entries":10000,
+        "backend_refresh_interval":900,
+        "job_limit_reconcile_interval":30,
+        "transpile_pool_size":None,
+        "transpile_warm_up":True,
+        "max_transpile_batches_per_backend":2
     }
 }
 
@@ -134,8 +134,9 @@ if __name__ == "__main__":
                 input_exec.put(QuantumExecutionJob(circuit=circ.measure_all(inplace=False), shots=shots, backend_data=backend_data))
 
     agg_job_dict = {}
+    agg_job_table = {}
 
-    aggregator = Aggregator(input=input_pipeline, output=input_exec, job_dict=agg_job_dict, timeout=10)
+    aggregator = Aggregator(input=input_pipeline, output=input_exec, job_dict=agg_job_dict, job_table=agg_job_table, timeout=10)
     aggregator.start()
 
     exec_handler = ExecutionHandler(provider, input=input_exec, output=output_exec, batch_timeout=5)
@@ -144,7 +145,7 @@ if __name__ == "__main__":
     result_analyzer = ResultAnalyzer(input=output_exec, output=output_pipline, output_agg=agg_results, output_part=None)
     result_analyzer.start()
 
-    aggregator_results = AggregatorResults(input=agg_results, output=output_pipline, job_dict=agg_job_dict)
+    aggregator_results = AggregatorResults(input=agg_results, output=output_pipline, job_dict=agg_job_dict, job_table=agg_job_table)
     aggregator_results.start()
 
     log.info("Started the Aggrgator pipeline")
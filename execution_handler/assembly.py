@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Tuple
+from uuid import uuid4
+
+from qiskit import QuantumCircuit, assemble
+from qiskit.providers import Backend
+from qiskit.qobj import QasmQobj, QasmQobjConfig, QasmQobjExperiment, QobjHeader
+
+from execution_handler.transpile_cache import circuit_fingerprint
+
+
+class AssemblyCache():
+    """Converts transpiled circuits to Qobj experiments once and builds Qobjs from the cached experiments
+    """
+
+    def __init__(self, cache_size:int=1000) -> None:
+        """
+        Args:
+            cache_size (int, optional): maximal number of cached experiments. Defaults to 1000.
+        """
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _experiment(self, circuit:QuantumCircuit, backend:Backend) -> Tuple[QasmQobjExperiment, QasmQobjConfig, QobjHeader]:
+        """Get the Qobj experiment of the circuit from the cache or assemble it
+
+        Args:
+            circuit (QuantumCircuit): transpiled circuit
+            backend (Backend)
+
+        Returns:
+            Tuple[QasmQobjExperiment, QasmQobjConfig, QobjHeader]: the experiment and the Qobj config and header it was assembled with
+        """
+        # the name is part of the header of the experiment
+        key = (backend.name(), circuit.name, circuit_fingerprint(circuit))
+        with self._lock:
+            try:
+                experiment = self._cache[key]
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return experiment
+            except KeyError:
+                self.misses += 1
+        qobj = assemble(circuit, backend, memory=True)
+        experiment = (qobj.experiments[0], qobj.config, qobj.header)
+        with self._lock:
+            self._cache[key] = experiment
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return experiment
+
+    def assemble(self, circuits:List[Tuple[QuantumCircuit, int]], backend:Backend, shots:int) -> QasmQobj:
+        """Assemble a Qobj. Repetitions of a circuit share the same experiment object.
+
+        Args:
+            circuits (List[Tuple[QuantumCircuit, int]]): transpiled circuits and their number of repetitions
+            backend (Backend)
+            shots (int): shots per experiment
+
+        Returns:
+            QasmQobj
+        """
+        experiments = []
+        memory_slots = 0
+        n_qubits = 0
+        config = None
+        header = None
+        for circuit, reps in circuits:
+            experiment, config, header = self._experiment(circuit, backend)
+            experiments.extend([experiment]*reps)
+            memory_slots = max(memory_slots, experiment.config.memory_slots)
+            n_qubits = max(n_qubits, experiment.config.n_qubits)
+        config_dict = config.to_dict()
+        config_dict.update({"shots":shots, "memory":True, "memory_slots":memory_slots, "n_qubits":n_qubits})
+        return QasmQobj(qobj_id=str(uuid4()), config=QasmQobjConfig.from_dict(config_dict), experiments=experiments, header=header)
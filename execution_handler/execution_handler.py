@@ -1,45 +1,239 @@
-import copy
 import math
+import multiprocessing
+import os
 import time
-from collections import Counter
-from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool, ProcessPoolExecutor
 from queue import Empty, Queue
-from threading import Lock, Thread
-from typing import Dict, List, Union
+from threading import BoundedSemaphore, Lock, Thread
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import logger
+import numpy as np
 import psutil
 import qiskit.providers.ibmq.job.exceptions
-import qiskit.tools.parallel
-from qiskit import QuantumCircuit, assemble, transpile
+from qiskit import QuantumCircuit, transpile
 from qiskit.providers import Backend
+from qiskit.providers.models import BackendProperties
 from qiskit.providers.ibmq.accountprovider import AccountProvider
 from qiskit.providers.job import Job
+from qiskit.providers.jobstatus import JOB_FINAL_STATES, JobStatus
 from qiskit.providers.provider import Provider
 from qiskit.qobj import Qobj
-from qiskit.result.models import ExperimentResultData
+from qiskit.result.models import ExperimentResult, ExperimentResultData
 from qiskit.result.result import Result
 from quantum_execution_job import QuantumExecutionJob
 
+from execution_handler.assembly import AssemblyCache
+from metrics.pipeline import enter_stage, leave_stage, merge_timestamps
+from execution_handler.transpile_cache import TranspileCache
 
-def new_parallel_map(task, values, task_args=tuple(), task_kwargs={}, num_processes=qiskit.tools.parallel.CPU_COUNT):
-    if num_processes == psutil.cpu_count(logical=True) and num_processes > 1:
-        # at least one free logical core
-        num_processes -= 1
-    print(f"num_processes={num_processes}")
-    return qiskit.tools.parallel.parallel_map(task, values, task_args, task_kwargs, num_processes)
 
-# overwrite the parallel_map function to enable the usage of more CPU cores
-transpile.__globals__["parallel_map"] = new_parallel_map
+def _init_transpile_worker():
+    """Initializer of the worker processes of the transpile pool
+    """
+    # the workers are already parallel, qiskit must not start nested process pools
+    os.environ["QISKIT_IN_PARALLEL"] = "TRUE"
+
+
+def _warm_up_transpile_worker() -> int:
+    """Transpile a small circuit to import and initialize the transpiler passes in the worker process
+
+    Returns:
+        int: process id of the worker
+    """
+    circuit = QuantumCircuit(2, 2)
+    circuit.h(0)
+    circuit.cx(0, 1)
+    circuit.measure([0, 1], [0, 1])
+    transpile(circuit, basis_gates=["id", "rz", "sx", "x", "cx"], coupling_map=[[0, 1], [1, 0]])
+    return os.getpid()
+
+
+def _transpile_in_worker(circuits:List[QuantumCircuit], basis_gates:List[str], coupling_map:Optional[List[List[int]]], backend_properties:Optional[BackendProperties], initial_layouts:Optional[List[Optional[List[int]]]]) -> List[QuantumCircuit]:
+    """Transpile circuits in a worker process of the transpile pool. The backend is passed by its configuration and properties, because the backend object can not be pickled.
+
+    Args:
+        circuits (List[QuantumCircuit])
+        basis_gates (List[str])
+        coupling_map (Optional[List[List[int]]])
+        backend_properties (Optional[BackendProperties])
+        initial_layouts (Optional[List[Optional[List[int]]]])
+
+    Returns:
+        List[QuantumCircuit]: the transpiled circuits
+    """
+    transpiled_circuits = transpile(circuits, basis_gates=basis_gates, coupling_map=coupling_map, backend_properties=backend_properties, initial_layout=initial_layouts)
+    if isinstance(transpiled_circuits, QuantumCircuit):
+        transpiled_circuits = [transpiled_circuits]
+    return transpiled_circuits
+
+
+def create_transpile_pool(pool_size:int, warm_up:bool=True) -> ProcessPoolExecutor:
+    """Create a long-lived process pool for the transpilation.
+    The worker processes are spawned instead of forked, since forking a process with running threads can deadlock the child on locks held by these threads.
+
+    Args:
+        pool_size (int): number of worker processes
+        warm_up (bool, optional): If True, initialize the transpiler in every worker process in advance. Defaults to True.
 
-class BackendLookUp():
-    """Look up information about the remote backends
+    Returns:
+        ProcessPoolExecutor
     """
+    pool = ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context("spawn"), initializer=_init_transpile_worker)
+    if warm_up:
+        for _ in range(pool_size):
+            pool.submit(_warm_up_transpile_worker)
+    return pool
 
-    def __init__(self, provider:Provider) -> None:
+
+class TranspilePool():
+    """Long-lived process pool for the transpilation. At most pool_size tasks are in the pool at the same time, since multiple batches are split into chunks concurrently.
+    A broken pool is replaced by a new one.
+    """
+
+    def __init__(self, pool_size:int, warm_up:bool=True, tries:int=3) -> None:
+        """
+        Args:
+            pool_size (int): number of worker processes
+            warm_up (bool, optional): If True, initialize the transpiler in every worker process in advance. Defaults to True.
+            tries (int, optional): number of tries to transpile, if the pool breaks. Defaults to 3.
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        self.pool_size = pool_size
+        self._warm_up = warm_up
+        self._tries = tries
+        self._lock = Lock()
+        self._slots = BoundedSemaphore(pool_size)
+        self._pool = create_transpile_pool(pool_size, warm_up)
+
+    def _replace(self, broken_pool:ProcessPoolExecutor):
+        """Replace the broken pool, unless another thread already replaced it
+
+        Args:
+            broken_pool (ProcessPoolExecutor)
+        """
+        with self._lock:
+            if self._pool is broken_pool:
+                broken_pool.shutdown(wait=False)
+                self._pool = create_transpile_pool(self.pool_size, self._warm_up)
+                self._log.warning("Replaced the broken transpile pool")
+
+    def transpile(self, tasks:List[Tuple[List[QuantumCircuit], List[str], Optional[List[List[int]]], Optional[BackendProperties], Optional[List[Optional[List[int]]]]]]) -> List[List[QuantumCircuit]]:
+        """Transpile the tasks concurrently in the worker processes
+
+        Args:
+            tasks (List[Tuple[List[QuantumCircuit], List[str], Optional[List[List[int]]], Optional[BackendProperties], Optional[List[Optional[List[int]]]]]]): 
+                circuits, basis gates, coupling map, backend properties and initial layouts of each task
+
+        Raises:
+            e: BrokenProcessPool, if the pool broke in every try
+
+        Returns:
+            List[List[QuantumCircuit]]: the transpiled circuits of each task
+        """
+        for i in range(self._tries):
+            pool = self._pool
+            try:
+                futures = []
+                for task in tasks:
+                    self._slots.acquire()
+                    try:
+                        future = pool.submit(_transpile_in_worker, *task)
+                    except BaseException:
+                        self._slots.release()
+                        raise
+                    future.add_done_callback(lambda _: self._slots.release())
+                    futures.append(future)
+                return [future.result() for future in futures]
+            except BrokenProcessPool as e:
+                self._log.warning(f"In try {i} the transpile pool broke: {e}")
+                if i == self._tries-1:
+                    raise e
+                self._replace(pool)
+
+
+class BackendSnapshot(NamedTuple):
+    """Immutable snapshot of the configuration and the calibration of a backend
+    """
+    name: str
+    max_shots: int
+    max_experiments: int
+    basis_gates: List[str]
+    coupling_map: Optional[List[List[int]]]
+    properties: Optional[BackendProperties]
+    # version of the backend and date of the last calibration update
+    version: Tuple[str, Optional[str]]
+
+    @classmethod
+    def from_backend(cls, backend:Backend, refresh:bool=False) -> 'BackendSnapshot':
+        """Create a snapshot of the backend
+
+        Args:
+            backend (Backend)
+            refresh (bool, optional): If True, request the latest calibration data of IBMQ backends. Defaults to False.
+
+        Returns:
+            BackendSnapshot
+        """
+        configuration = backend.configuration()
+        try:
+            properties = backend.properties(refresh=refresh)
+        except TypeError:
+            # the backend does not cache its properties
+            properties = backend.properties()
+        last_update = None
+        if properties is not None:
+            last_update = str(properties.last_update_date)
+        return cls(backend.name(), configuration.max_shots, configuration.max_experiments, configuration.basis_gates, configuration.coupling_map, properties, 
+                   (str(configuration.backend_version), last_update))
+
+
+class BackendLookUp(Thread):
+    """Look up information about the remote backends. When started, the snapshots of the known backends are refreshed periodically in the background.
+    Only the calibration data is refreshed, since IBMQ backends cache their configuration locally.
+    """
+
+    def __init__(self, provider:Provider, refresh_interval:float=900) -> None:
+        """
+        Args:
+            provider (Provider)
+            refresh_interval (float, optional): time in seconds after that the snapshots of the backends are refreshed in the background. Defaults to 900.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self._provider = provider
+        self._refresh_interval = refresh_interval
         self._backends = {}
+        self._snapshots = {}
+        Thread.__init__(self, daemon=True)
+
+    def run(self):
+        """Periodically replace the snapshots of the known backends with the latest calibration data
+        """
+        while True:
+            time.sleep(self._refresh_interval)
+            for backend_name in list(self._snapshots.keys()):
+                try:
+                    self._snapshots[backend_name] = BackendSnapshot.from_backend(self.get(backend_name), refresh=True)
+                    self._log.debug(f"Refreshed snapshot of backend {backend_name}")
+                except Exception as e:
+                    self._log.exception(e)
+
+    def snapshot(self, backend_name:str) -> BackendSnapshot:
+        """Get the current snapshot of the backend's configuration and calibration
+
+        Args:
+            backend_name (str)
+
+        Returns:
+            BackendSnapshot
+        """
+        try:
+            return self._snapshots[backend_name]
+        except KeyError:
+            snapshot = BackendSnapshot.from_backend(self.get(backend_name))
+            self._snapshots[backend_name] = snapshot
+            return snapshot
 
     def get(self, backend_name:str, exclusiv=False) -> Backend:
         """Get the corresponding backend
@@ -62,48 +256,98 @@ class BackendLookUp():
         return backend
 
     def max_shots(self, backend_name:str) -> int:
-        backend = self.get(backend_name)
-        return backend.configuration().max_shots
+        return self.snapshot(backend_name).max_shots
 
     def max_experiments(self, backend_name:str) -> int:
-        backend = self.get(backend_name)
-        return backend.configuration().max_experiments
+        return self.snapshot(backend_name).max_experiments
 
 
-class BackendControl():
-    """Control the access to the backends to regulate the number of queued jobs"""
+class BackendControl(Thread):
+    """Control the access to the backends to regulate the number of queued jobs.
+    The active jobs are counted locally and, when started, the job limits of the backends are reconciled in the background, so that the admission never waits for the remote API.
+    """
 
-    def __init__(self,):
+    def __init__(self, backend_look_up:BackendLookUp, reconcile_interval:float=30):
+        """
+        Args:
+            backend_look_up (BackendLookUp)
+            reconcile_interval (float, optional): time in seconds between the reconciliations of the local counters with the job limits of the backends. Defaults to 30.
+        """
         self._log = logger.get_logger(type(self).__name__)
+        self._backend_look_up = backend_look_up
+        self._reconcile_interval = reconcile_interval
         self._locks = {}
         self._counters = {}
+        # number of active jobs that are not submitted by this BackendControl
+        self._external_jobs = {}
+        self._maximum_jobs = {}
+        self._listeners = []
+        Thread.__init__(self, daemon=True)
+
+    def add_listener(self, listener:Callable[[str], None]):
+        """Register a function that is called with the backend name, whenever a job slot of the backend is freed
+
+        Args:
+            listener (Callable[[str], None])
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, backend_name:str):
+        for listener in self._listeners:
+            listener(backend_name)
+
+    def _update_limit(self, backend_name:str) -> bool:
+        """Query the job limit of the backend and update the number of external jobs and the maximum number of jobs
+
+        Args:
+            backend_name (str)
+
+        Returns:
+            bool: True, if the number of free job slots increased
+        """
+        limit = self._backend_look_up.get(backend_name).job_limit()
+        with self._locks[backend_name]:
+            counter = self._counters[backend_name]
+            free_slots_before = self._maximum_jobs.get(backend_name, 0) - self._external_jobs.get(backend_name, 0)
+            maximum_jobs = limit.maximum_jobs
+            if maximum_jobs is None:
+                # no limit for the backend
+                maximum_jobs = float('inf')
+            self._maximum_jobs[backend_name] = maximum_jobs
+            self._external_jobs[backend_name] = max(0, limit.active_jobs - counter)
+            self._log.debug(f"Backend: {backend_name} Counter:{counter} Active_Jobs:{limit.active_jobs} Maximum_jobs:{limit.maximum_jobs}")
+            return maximum_jobs - self._external_jobs[backend_name] > free_slots_before
+
+    def run(self):
+        """Periodically reconcile the local counters with the job limits of the backends
+        """
+        while True:
+            time.sleep(self._reconcile_interval)
+            for backend_name in list(self._maximum_jobs.keys()):
+                try:
+                    if self._update_limit(backend_name):
+                        self._notify(backend_name)
+                except Exception as e:
+                    self._log.exception(e)
         
-    def try_to_enter(self, backend_name:str, backend:Backend) -> bool:
+    def try_to_enter(self, backend_name:str) -> bool:
         """Try to enter the lock of the backend
 
         Args:
             backend_name (str)
-            backend (Backend)
 
         Returns:
             bool: True, if successfully entered the lock. False, otherwise
         """
-        try:
-            lock = self._locks[backend_name]
-            counter = self._counters[backend_name]
-        except KeyError:
-            lock = Lock()
-            counter = 0
-            self._locks[backend_name] = lock
-            self._counters[backend_name] = counter
+        if backend_name not in self._maximum_jobs:
+            self._locks.setdefault(backend_name, Lock())
+            self._counters.setdefault(backend_name, 0)
+            self._update_limit(backend_name)
 
-        with lock:
-            limit = backend.job_limit()
-            self._log.debug(f"Backend: {backend_name} Counter:{counter} Active_Jobs:{limit.active_jobs} Maximum_jobs:{limit.maximum_jobs}")
-            if limit.active_jobs < limit.maximum_jobs:
-                if counter < limit.maximum_jobs:
-                    self._counters[backend_name] += 1
-                    return True
+        with self._locks[backend_name]:
+            if self._counters[backend_name] + self._external_jobs[backend_name] < self._maximum_jobs[backend_name]:
+                self._counters[backend_name] += 1
+                return True
             return False
 
     def leave(self, backend_name:str):
@@ -114,17 +358,39 @@ class BackendControl():
         """
         with self._locks[backend_name]:
             self._counters[backend_name] -= 1
+        self._notify(backend_name)
 
 
 class Transpiler():
 
-    def __init__(self, input:Queue, output:Queue, backend_look_up:BackendLookUp, timeout:int, max_transpile_batch_size:Union[float, int]=float('inf')) -> None:
+    def __init__(self, input:Queue, output:Queue, backend_look_up:BackendLookUp, timeout:int, max_transpile_batch_size:Union[float, int]=float('inf'), transpile_cache:Optional[TranspileCache]=None, pool:Optional[TranspilePool]=None, pool_size:int=1, max_batches_per_backend:int=2,
+                 error_queue:Optional[Queue]=None) -> None:
+        """
+        Args:
+            input (Queue): incoming jobs
+            output (Queue): tuples of transpiled circuits and jobs
+            backend_look_up (BackendLookUp)
+            timeout (int): time in seconds to wait for further jobs before a transpilation batch is created
+            max_transpile_batch_size (Union[float, int], optional): maximal number of circuits per transpilation batch. Defaults to float('inf').
+            transpile_cache (Optional[TranspileCache], optional): cache of transpiled circuits. Defaults to None.
+            pool (Optional[TranspilePool], optional): shared process pool for the transpilation. If None, the circuits are transpiled in the threads of the Transpiler. Defaults to None.
+            pool_size (int, optional): number of worker processes of the pool, i.e. the number of chunks a transpilation batch is split into. Defaults to 1.
+            max_batches_per_backend (int, optional): maximal number of concurrent transpilation batches per backend. Defaults to 2.
+            error_queue (Optional[Queue], optional): receives the jobs of transpilation batches that can not be transpiled. Defaults to None.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._backend_look_up = backend_look_up
         self._timeout = timeout
         self._max_transpile_batch_size = max_transpile_batch_size
+        if transpile_cache is None:
+            transpile_cache = TranspileCache()
+        self._transpile_cache = transpile_cache
+        self._pool = pool
+        self._pool_size = pool_size
+        self._error_queue = error_queue
+        self._max_batches_per_backend = max_batches_per_backend
         self._jobs_to_transpile = {}
         self._timers = {}
         self._pending_transpilation = {}
@@ -134,41 +400,117 @@ class Transpiler():
 
     def start(self):
         Thread(target=self._route_job).start()
-        Thread(target=self._transpile).start()
+        # batches of different backends and multiple batches of the same backend are transpiled concurrently
+        for _ in range(max(1, self._pool_size)):
+            Thread(target=self._transpile).start()
         self._log.info("Started")
 
+    def _transpile_circuits(self, snapshot:BackendSnapshot, circuits:List[QuantumCircuit], initial_layouts:Optional[List[Optional[List[int]]]]) -> List[QuantumCircuit]:
+        """Transpile the circuits for the backend. The circuits are split into chunks, which are transpiled concurrently by the process pool.
+
+        Args:
+            snapshot (BackendSnapshot): snapshot of the backend
+            circuits (List[QuantumCircuit])
+            initial_layouts (Optional[List[Optional[List[int]]]]): initial layout of each circuit or None
+
+        Returns:
+            List[QuantumCircuit]: the transpiled circuits
+        """
+        args = (snapshot.basis_gates, snapshot.coupling_map, snapshot.properties)
+        if self._pool is None:
+            return _transpile_in_worker(circuits, *args, initial_layouts)
+        chunk_size = math.ceil(len(circuits)/self._pool_size)
+        tasks = []
+        for start in range(0, len(circuits), chunk_size):
+            chunk_layouts = initial_layouts[start:start+chunk_size] if initial_layouts is not None else None
+            if chunk_layouts is not None and all(layout is None for layout in chunk_layouts):
+                # transpile reads a list of Nones as a single layout
+                chunk_layouts = None
+            tasks.append((circuits[start:start+chunk_size], *args, chunk_layouts))
+        transpiled_circuits = []
+        for transpiled_chunk in self._pool.transpile(tasks):
+            transpiled_circuits.extend(transpiled_chunk)
+        return transpiled_circuits
 
     def _transpile(self):
         """Function that transpiles the pending transpilation Batches 
-
-        Raises:
-            e: BrokenProcessPool
         """
         while True:
             backend_name, jobs = self._pending.get()
-            backend = self._backend_look_up.get(backend_name)
-            circuits = list([job.circuit for job in jobs])
-            self._log.debug(f"Start transpilation of {len(circuits)} circuits for backend {backend.name()}")
-            trans_start_time = time.time()
-            tries = 3
-            for i in range(tries):
-                try:
-                    transpiled_circuits = transpile(circuits, backend=backend)
-                    break
-                except BrokenProcessPool as e:
-                    if hasattr(e, 'message'):
-                        self._log.info(f"In try {i} the following error occured {e.message}")
-                    else:
-                        self._log.exception(e)
-                    if i == tries-1:
-                        raise e
-            time_diff = time.time() - trans_start_time
-            self._log.info(f"Transpiled {len(transpiled_circuits)} circuits for backend {backend.name()} in {time_diff}s")
+            try:
+                transpiled_circuits = self._transpile_batch(backend_name, jobs)
+            except Exception as e:
+                # a failed batch must not stop the transpilation of the other batches
+                self._log.exception(e)
+                self._transpilation_failed(jobs, e)
+                self._finished.put((backend_name, []))
+                continue
             self._finished.put((backend_name, zip(transpiled_circuits, jobs)))
+
+    def _transpilation_failed(self, jobs:List[QuantumExecutionJob], error:Exception):
+        """Put the jobs of a failed transpilation batch into the error queue
+
+        Args:
+            jobs (List[QuantumExecutionJob])
+            error (Exception)
+        """
+        if self._error_queue is None:
+            return
+        for job in jobs:
+            job.error = str(error)
+            self._error_queue.put(job)
+
+    def _transpile_batch(self, backend_name:str, jobs:List[QuantumExecutionJob]) -> List[QuantumCircuit]:
+        """Transpile a transpilation batch. Circuits in the cache are not transpiled again.
+
+        Args:
+            backend_name (str)
+            jobs (List[QuantumExecutionJob])
+
+        Returns:
+            List[QuantumCircuit]: the transpiled circuit of each job
+        """
+        snapshot = self._backend_look_up.snapshot(backend_name)
+        trans_start_time = time.time()
+        transpiled_circuits = [None]*len(jobs)
+        # jobs with identical circuits in the batch are transpiled only once
+        duplicates = {}
+        to_transpile = []
+        for index, job in enumerate(jobs):
+            # jobs can pin their circuit to physical qubits, e.g. aggregated circuits
+            initial_layout = getattr(job, "initial_layout", None)
+            options = tuple(initial_layout) if initial_layout is not None else None
+            key = self._transpile_cache.key(job.circuit, backend_name, snapshot.version, options)
+            transpiled_circuits[index] = self._transpile_cache.get(key, job.circuit.name)
+            if transpiled_circuits[index] is None:
+                if key in duplicates:
+                    duplicates[key].append(index)
+                else:
+                    duplicates[key] = []
+                    to_transpile.append((key, index, initial_layout))
+        if len(to_transpile) > 0:
+            circuits = list([jobs[index].circuit for _, index, _ in to_transpile])
+            initial_layouts = list([initial_layout for _, _, initial_layout in to_transpile])
+            if all(layout is None for layout in initial_layouts):
+                initial_layouts = None
+            self._log.debug(f"Start transpilation of {len(circuits)} circuits for backend {backend_name}")
+            new_circuits = self._transpile_circuits(snapshot, circuits, initial_layouts)
+            for (key, index, _), transpiled_circuit in zip(to_transpile, new_circuits):
+                self._transpile_cache.put(key, transpiled_circuit)
+                transpiled_circuits[index] = transpiled_circuit
+                for duplicate_index in duplicates[key]:
+                    transpiled_circuits[duplicate_index] = self._transpile_cache.get(key, jobs[duplicate_index].circuit.name)
+        for index, job in enumerate(jobs):
+            if job.parameters:
+                # the template is transpiled once, the values are bound per job
+                transpiled_circuits[index] = job.bound_circuit(transpiled_circuits[index])
+        time_diff = time.time() - trans_start_time
+        self._log.info(f"Transpiled {len(to_transpile)} of {len(transpiled_circuits)} circuits for backend {backend_name} in {time_diff}s, cache hits: {self._transpile_cache.hits}, misses: {self._transpile_cache.misses}")
+        return transpiled_circuits
             
             
     def _create_transpilation_batch(self, backend_name:str) -> bool:
-        """Creates a batch for the transpilation for the given backend, if there is not already a pending transpilation for the backend
+        """Creates a batch for the transpilation for the given backend, if the backend has less than the maximal number of pending transpilation batches
 
         Args:
             backend_name (str)
@@ -176,17 +518,14 @@ class Transpiler():
         Returns:
             bool: True, if a batch was created
         """
-        try:
-            if self._pending_transpilation[backend_name]:
-                return False
-        except KeyError:
-            pass
+        if self._pending_transpilation.get(backend_name, 0) >= self._max_batches_per_backend:
+            return False
         n_jobs = min([len(self._jobs_to_transpile[backend_name]), self._backend_look_up.max_experiments(backend_name), self._max_transpile_batch_size])
         self._log.debug(f"Prepared {n_jobs} circuits for the transpilation for backend {backend_name}")
         jobs = self._jobs_to_transpile[backend_name][:n_jobs]
         self._jobs_to_transpile[backend_name] = self._jobs_to_transpile[backend_name][n_jobs:]
         self._pending.put((backend_name, jobs))
-        self._pending_transpilation[backend_name] = True
+        self._pending_transpilation[backend_name] = self._pending_transpilation.get(backend_name, 0) + 1
         if len(self._jobs_to_transpile[backend_name]) > 0:
                 self._timers[backend_name] =  time.time()
         return True
@@ -199,6 +538,12 @@ class Transpiler():
         Args:
             job (QuantumExecutionJob): job to transpile
         """
+        enter_stage(job, "transpiler")
+        if getattr(job, "transpiled", False):
+            # the circuit is already transpiled, e.g. a stitched aggregated circuit
+            leave_stage(job, "transpiler")
+            self._output.put((job.circuit, job))
+            return
         backend_name = job.backend_data.name
         try:
             self._jobs_to_transpile[backend_name].append(job)
@@ -206,7 +551,7 @@ class Transpiler():
             self._jobs_to_transpile[backend_name] = [job]
         if not backend_name in self._timers.keys():
             self._timers[backend_name] = time.time()
-        if len(self._jobs_to_transpile[backend_name]) == self._backend_look_up.max_experiments(backend_name):
+        if len(self._jobs_to_transpile[backend_name]) >= self._backend_look_up.max_experiments(backend_name):
             # Todo try to cancel
             if self._create_transpilation_batch(backend_name):
                 self._timers.pop(backend_name)
@@ -228,16 +573,6 @@ class Transpiler():
                 self._timers[backend_name] = time.time()
 
 
-    def _any_pending_transpilation(self) -> bool:
-        """
-        Returns:
-            bool: True if there are any pending transpilation batches
-        """
-        if len(self._pending_transpilation) == 0:
-            return False
-        else:
-            return any(self._pending_transpilation.values())
-
     def _route_job(self):
         """Function that processes incoming jobs, periodically chechs the timers, and forwards transpiled jobs to the output
         """
@@ -252,63 +587,121 @@ class Transpiler():
                     self._add_job(job)
                 except Empty:
                     break
-            if not self._any_pending_transpilation():
-                self._check_timers()
-            try:
-                backend_name, transpiled_result = self._finished.get(block=False)
-                self._pending_transpilation[backend_name] = False
+            while True:
+                try:
+                    backend_name, transpiled_result = self._finished.get(block=False)
+                except Empty:
+                    break
+                self._pending_transpilation[backend_name] -= 1
                 for transpiled_tuple in transpiled_result:
+                    leave_stage(transpiled_tuple[1], "transpiler")
                     self._output.put(transpiled_tuple)
-                self._check_timers()
-            except Empty:
-                pass
+            # backends below their limit of pending transpilation batches can start a new batch
+            self._check_timers()
 
 
         
 
 class Batch():
-    '''A batch represents a job on a backend. It can contain multiple experiments.'''
+    '''A batch represents a job on a backend. It can contain multiple experiments. All experiments of a batch are executed with the same number of shots.'''
 
-    def __init__(self, backen_name:str, max_shots: int, max_experiments: int, batch_number:int):
+    def __init__(self, backen_name:str, max_shots: int, max_experiments: int, shots:int):
+        """
+        Args:
+            backen_name (str)
+            max_shots (int): maximal number of shots per experiment of the backend
+            max_experiments (int): maximal number of experiments per job of the backend
+            shots (int): number of shots of every experiment in the batch. Circuits with more shots are repeated.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self.backend_name = backen_name
         self.max_shots = max_shots
-        self.shots = 0
+        self.shots = shots
         self.max_experiments = max_experiments
         self.experiments = []
         self.remaining_experiments = max_experiments
         self.n_circuits = 0
-        self.batch_number = batch_number
+        # the batch number is assigned when the batch is forwarded
+        self.batch_number = None
+        # times when the batch entered and left the stages of the execution handler
+        self.timestamps = {}
+        enter_stage(self, "batcher")
 
     
-    def add_circuit(self, key, circuit:QuantumCircuit, shots:int) -> int:
-        """Add a circuit to the Batch.
+    def add_circuit(self, key, circuit:QuantumCircuit, shots:int, total_shots:Optional[int]=None) -> int:
+        """Add a circuit to the Batch. If the batch has not enough free experiments, only a piece of the shots is added.
 
         Args:
             key (Any): Identifier for the circuit
             circuit (QuantumCircuit): The circuit, which should be executed
-            shots (int): The number of shots
+            shots (int): The number of shots that are not yet assigned to a batch
+            total_shots (Optional[int], optional): The total number of shots of the circuit over all batches. Defaults to shots.
     
         Returns:
             int: remaining shots. If they are 0, all shots are executed
         """
         if self.remaining_experiments == 0:
             return shots
+        if total_shots is None:
+            total_shots = shots
 
         self.n_circuits += 1
-        reps = math.ceil(shots/self.max_shots)
-        self.shots = max(self.shots, min(shots, self.max_shots))
+        reps = math.ceil(shots/self.shots)
 
         if reps <= self.remaining_experiments:
             remaining_shots = 0
         else:
             reps = self.remaining_experiments
-            remaining_shots = shots - reps*self.max_shots
+            remaining_shots = shots - reps*self.shots
 
         self.remaining_experiments -= reps
-        self.experiments.append({"key":key, "circuit":circuit, "reps":reps, "shots":shots-remaining_shots, "total_shots":shots})
+        # the offset is the index of the first shot of this piece among all shots of the circuit
+        self.experiments.append({"key":key, "circuit":circuit, "reps":reps, "shots":shots-remaining_shots, "total_shots":total_shots, "offset":total_shots-shots})
         
-        return remaining_shots       
+        return remaining_shots
+
+    def merge(self, other:'Batch') -> bool:
+        """Move the experiments of a batch with more shots into this batch as repetitions, if they fit and the shots of this batch divide their shots exactly.
+
+        Args:
+            other (Batch): batch of the same backend with more shots per experiment
+
+        Returns:
+            bool: True, if the experiments were moved
+        """
+        if any(exp["shots"] % self.shots != 0 for exp in other.experiments):
+            # the experiments would be executed with more shots than requested
+            return False
+        experiments = [dict(exp, reps=exp["shots"]//self.shots) for exp in other.experiments]
+        reps = sum(exp["reps"] for exp in experiments)
+        if reps > self.remaining_experiments:
+            return False
+        self.experiments.extend(experiments)
+        self.remaining_experiments -= reps
+        self.n_circuits += other.n_circuits
+        self.timestamps = merge_timestamps({}, [self.timestamps, other.timestamps])
+        return True
+
+
+def shot_bucket(shots:int, max_shots:int) -> int:
+    """Number of shots per experiment of the batch for a circuit. Circuits with the same number of shots share a bucket, 
+    so no circuit is executed with more shots than requested. Circuits with more than max_shots are repeated.
+
+    Args:
+        shots (int): requested number of shots of the circuit
+        max_shots (int): maximal number of shots per experiment of the backend
+
+    Returns:
+        int: the requested shots, if they do not exceed max_shots. Otherwise, the shots per repetition, if the shots can be split into at most
+             twice the minimal number of repetitions with equal shots, else max_shots.
+    """
+    if shots <= max_shots:
+        return max(shots, 1)
+    min_reps = math.ceil(shots/max_shots)
+    for reps in range(min_reps, 2*min_reps + 1):
+        if shots % reps == 0:
+            return shots//reps
+    return max_shots
                 
 
 class Batcher(Thread):
@@ -320,6 +713,7 @@ class Batcher(Thread):
         self._batch_timeout = batch_timeout
         self._quantum_job_table = quantum_job_table
         self._backend_look_up = backend_look_up
+        # timers and open batches per backend and shot bucket
         self._batch_timers = {}
         self._batch_count = {}
         self._batches = {}
@@ -327,62 +721,104 @@ class Batcher(Thread):
         self._log.info("Init")
 
 
-    def _get_or_create_batch(self, backend_name:str):
+    def _get_or_create_batch(self, backend_name:str, shots:int) -> Batch:
+        """Get the open batch of the backend for the shot bucket or create a new one
+
+        Args:
+            backend_name (str)
+            shots (int): shots per experiment of the batch
+
+        Returns:
+            Batch
+        """
         try:
-            batch = self._batches[backend_name]
-            if batch.remaining_experiments == 0:
-                batch = self._create_new_batch(backend_name)
+            batch = self._batches[(backend_name, shots)]
         except KeyError:
-            batch = Batch(backend_name, self._backend_look_up.max_shots(backend_name), self._backend_look_up.max_experiments(backend_name), 0)
-            self._batches[backend_name] = batch
-            self._batch_count[backend_name] = 0
+            batch = Batch(backend_name, self._backend_look_up.max_shots(backend_name), self._backend_look_up.max_experiments(backend_name), shots)
+            self._batches[(backend_name, shots)] = batch
         return batch
 
-    def _create_new_batch(self, backend_name:str):
-        self._batch_count[backend_name] += 1
-        batch = Batch(backend_name, self._backend_look_up.max_shots(backend_name), self._backend_look_up.max_experiments(backend_name), self._batch_count[backend_name])
-        self._batches[backend_name] =  batch
-        return batch
+    def _forward_batch(self, batch:Batch):
+        """Number the batch and forward it. The batches of a backend are numbered in the order they are forwarded.
+
+        Args:
+            batch (Batch)
+        """
+        backend_name = batch.backend_name
+        batch.batch_number = self._batch_count.get(backend_name, 0)
+        self._batch_count[backend_name] = batch.batch_number + 1
+        if self._batches.get((backend_name, batch.shots)) is batch:
+            self._batches.pop((backend_name, batch.shots))
+        leave_stage(batch, "batcher")
+        self._output.put(batch)
         
 
     def _add_to_batch(self, transpiled_circuit:QuantumCircuit, job:QuantumExecutionJob):
-        """Add the circuit to the batch. Automatically forwards full batches and creates new batches.
+        """Add the circuit to the batch of its shot bucket. Automatically forwards full batches and creates new batches.
 
         Args:
             transpiled_circuit (QuantumCircuit)
             job (QuantumExecutionJob): corresponding job to the transpiled circuit containing the shot number and the backend
         """
         backend_name = job.backend_data.name
-        if not backend_name in self._batch_timers.keys():
-            self._batch_timers[backend_name] = time.time()
+        shots = shot_bucket(job.shots, self._backend_look_up.max_shots(backend_name))
+        if getattr(job, "dedicated_batch", False):
+            self._add_to_dedicated_batch(transpiled_circuit, job, shots)
+            return
+        bucket = (backend_name, shots)
+        if not bucket in self._batch_timers.keys():
+            self._batch_timers[bucket] = time.time()
         key = job.id
         remaining_shots = job.shots
         while remaining_shots > 0:
-            batch = self._get_or_create_batch(backend_name)
-            remaining_shots = batch.add_circuit(key, transpiled_circuit, remaining_shots)
+            batch = self._get_or_create_batch(backend_name, shots)
+            remaining_shots = batch.add_circuit(key, transpiled_circuit, remaining_shots, job.shots)
             if batch.remaining_experiments == 0:
-                self._log.info(f"Generated full batch {backend_name}/{self._batch_count[backend_name]}")
-                self._output.put(batch)
+                self._forward_batch(batch)
+                self._log.info(f"Generated full batch {backend_name}/{batch.batch_number} with {shots} shots")
                 if remaining_shots > 0:
-                    self._batch_timers[backend_name] = time.time()
+                    self._batch_timers[bucket] = time.time()
                 else:
-                    self._batch_timers.pop(backend_name)
+                    self._batch_timers.pop(bucket)
         
     
+    def _add_to_dedicated_batch(self, transpiled_circuit:QuantumCircuit, job:QuantumExecutionJob, shots:int):
+        """Add the circuit to its own batches and forward them immediately, e.g. for shards of a job that should run in separate job slots
+
+        Args:
+            transpiled_circuit (QuantumCircuit)
+            job (QuantumExecutionJob)
+            shots (int): shots per experiment of the batches
+        """
+        backend_name = job.backend_data.name
+        remaining_shots = job.shots
+        while remaining_shots > 0:
+            batch = Batch(backend_name, self._backend_look_up.max_shots(backend_name), self._backend_look_up.max_experiments(backend_name), shots)
+            remaining_shots = batch.add_circuit(job.id, transpiled_circuit, remaining_shots, job.shots)
+            self._forward_batch(batch)
+            self._log.info(f"Generated dedicated batch {backend_name}/{batch.batch_number} for job {job.id}")
+
     def _check_timers(self):
-        """Checks if an timeout occured for a batch and then forward it.
+        """Checks if an timeout occured for a batch and then forward it. 
+        Before, the open batches of the backend with a multiple of its shots are merged into it as repetitions to reduce the number of submitted jobs.
         """
         timers_to_clear = []
-        for backend_name in self._batch_timers.keys():
-            time_diff = time.time() - self._batch_timers[backend_name]
+        for bucket in sorted(self._batch_timers.keys(), key=lambda bucket:bucket[1]):
+            if bucket in timers_to_clear:
+                continue
+            backend_name, shots = bucket
+            time_diff = time.time() - self._batch_timers[bucket]
             if time_diff > self._batch_timeout:
-                batch = self._batches[backend_name]
-                self._log.debug(f"Timeout for batch {backend_name}/{self._batch_count[backend_name]}, Time passed: {time_diff}, batch_size:{batch.max_experiments - batch.remaining_experiments}, max batch size {batch.max_experiments}")
-                self._output.put(batch)
-                self._create_new_batch(backend_name)
-                timers_to_clear.append(backend_name)
-        for backend_name in timers_to_clear:
-            self._batch_timers.pop(backend_name)
+                batch = self._batches[bucket]
+                for other_bucket in sorted(self._batches.keys(), key=lambda bucket:bucket[1]):
+                    if other_bucket[0] == backend_name and other_bucket[1] > shots and other_bucket[1] % shots == 0 and batch.merge(self._batches[other_bucket]):
+                        self._batches.pop(other_bucket)
+                        timers_to_clear.append(other_bucket)
+                self._forward_batch(batch)
+                self._log.debug(f"Timeout for batch {backend_name}/{batch.batch_number}, Time passed: {time_diff}, shots: {shots}, batch_size:{batch.max_experiments - batch.remaining_experiments}, max batch size {batch.max_experiments}")
+                timers_to_clear.append(bucket)
+        for bucket in timers_to_clear:
+            self._batch_timers.pop(bucket, None)
 
 
     def run(self) -> None:
@@ -390,6 +826,7 @@ class Batcher(Thread):
         while True:
             try:
                 transpiled_circ, job = self._input.get(timeout=5)
+                enter_stage(job, "batcher")
                 self._quantum_job_table[job.id] = job
                 self._add_to_batch(transpiled_circ, job)
             except Empty:
@@ -397,140 +834,324 @@ class Batcher(Thread):
             self._check_timers()
 
 
+class _SlotFreed():
+    '''Event for the Submitter that a job slot of the backend is freed'''
+
+    def __init__(self, backend_name:str):
+        self.backend_name = backend_name
+
+
+class _Assembled():
+    '''Event for the Submitter with the assembled Qobj of a batch from an assembly thread. If the assembly failed, the Qobj is None.'''
+
+    def __init__(self, batch:Batch, qobj:Optional[Qobj], error:Optional[Exception]=None):
+        self.batch = batch
+        self.qobj = qobj
+        self.error = error
+
+
 class Submitter(Thread):
 
-    def __init__(self, input: Queue, output: Queue, backend_look_up:BackendLookUp, backend_control:BackendControl, defer_interval=60):
+    def __init__(self, input: Queue, output: Queue, backend_look_up:BackendLookUp, backend_control:BackendControl, defer_interval=60, assembly_workers:int=2, assembly_cache_size:int=1000,
+                 quantum_job_table:Optional[Dict]=None, error_queue:Optional[Queue]=None, assembly_tries:int=3, submit_tries:int=3):
+        """
+        Args:
+            input (Queue): batches to submit
+            output (Queue): tuples of batches and submitted jobs
+            backend_look_up (BackendLookUp)
+            backend_control (BackendControl)
+            defer_interval (int, optional): time in seconds after that the deferred batches are retried. Defaults to 60.
+            assembly_workers (int, optional): number of threads that assemble the Qobjs. Defaults to 2.
+            assembly_cache_size (int, optional): maximal number of cached Qobj experiments. Defaults to 1000.
+            quantum_job_table (Optional[Dict], optional): maps the keys of the experiments to their QuantumExecutionJobs. The jobs of failed batches are removed. Defaults to None.
+            error_queue (Optional[Queue], optional): receives the jobs of batches that can not be assembled or submitted. Defaults to None.
+            assembly_tries (int, optional): number of tries to assemble a batch. Defaults to 3.
+            submit_tries (int, optional): number of tries to submit a batch. A failed batch is retried after the defer_interval. Defaults to 3.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._backend_look_up = backend_look_up
         self._backend_control = backend_control
         self._defer_interval = defer_interval
-        self._internal_jobs_queue = []
+        self._quantum_job_table = quantum_job_table if quantum_job_table is not None else {}
+        self._error_queue = error_queue
+        self._assembly_tries = assembly_tries
+        self._submit_tries = submit_tries
+        # number of failed assemblies and submissions per batch
+        self._failed_assemblies = {}
+        self._failed_submissions = {}
+        # time after that the deferred batches of a backend are submitted again after a failed submission
+        self._retry_times = {}
+        self._assembly_cache = AssemblyCache(assembly_cache_size)
+        self._assembly_executor = ThreadPoolExecutor(max_workers=assembly_workers)
+        # deferred batches per backend in the order of their batch numbers
+        self._deferred = {}
+        # signals of freed job slots and assembled batches, the input queue only carries batches
+        self._events = Queue()
+        self._backend_control.add_listener(self._slot_freed)
         Thread.__init__(self)
         self._log.info("Init")
 
-    def _assemble(self, batch:Batch) -> Qobj:
-        """Assemble a Qobj from a Batch.
+    def _slot_freed(self, backend_name:str):
+        """Wake up the Submitter to submit the deferred batches of the backend. Called by the BackendControl.
 
         Args:
-            batch (Batch)
+            backend_name (str)
+        """
+        self._events.put(_SlotFreed(backend_name))
 
-        Returns:
-            Qobj
+    def _assemble(self, batch:Batch):
+        """Assemble a Qobj from a Batch on a worker thread and pass it to the Submitter loop. A failure is also passed to the Submitter loop.
+
+        Args:
+            batch (Batch)
         """
         backend_name = batch.backend_name
-        backend = self._backend_look_up.get(backend_name)
-        circuits = list([circuit_item["circuit"] for circuit_item in batch.experiments])
-        multiplied_circuits = []
-        for i, circuit_item in enumerate(batch.experiments):
-            reps = circuit_item["reps"]
-            circ = circuits[i]
-            multiplied_circuits.extend([circ]*reps)
-        #self._log.info(f"Transpiled batch {backend_name}/{batch.batch_number}")
-        qobj =  assemble(multiplied_circuits, backend, shots=batch.shots, memory=True)
-        self._log.info(f"Assembled Qobj for batch {backend_name}/{batch.batch_number}")
-        return qobj
+        try:
+            backend = self._backend_look_up.get(backend_name)
+            qobj = self._assembly_cache.assemble([(circuit_item["circuit"], circuit_item["reps"]) for circuit_item in batch.experiments], backend, batch.shots)
+        except Exception as e:
+            self._log.exception(e)
+            self._events.put(_Assembled(batch, None, e))
+            return
+        self._log.info(f"Assembled Qobj for batch {backend_name}/{batch.batch_number}, cache hits: {self._assembly_cache.hits}, misses: {self._assembly_cache.misses}")
+        self._events.put(_Assembled(batch, qobj))
+
+    def _assembly_failed(self, batch:Batch, error:Exception):
+        """Retry the assembly of the batch. If all tries failed, the jobs of the batch are removed and put into the error queue.
+
+        Args:
+            batch (Batch)
+            error (Exception): error of the last try
+        """
+        batch_id = (batch.backend_name, batch.batch_number)
+        failed = self._failed_assemblies.get(batch_id, 0) + 1
+        if failed < self._assembly_tries:
+            self._failed_assemblies[batch_id] = failed
+            self._log.info(f"Retry the assembly of batch {batch.backend_name}/{batch.batch_number} after {failed} failed tries")
+            self._assembly_executor.submit(self._assemble, batch)
+            return
+        self._failed_assemblies.pop(batch_id, None)
+        self._log.error(f"Failed to assemble batch {batch.backend_name}/{batch.batch_number}: {error}")
+        self._fail_batch(batch, error)
+
+    def _submission_failed(self, batch:Batch, qobj:Qobj, error:Exception):
+        """Defer the batch again to retry the submission after the defer_interval. If all tries failed, the jobs of the batch are removed and put into the error queue.
+
+        Args:
+            batch (Batch)
+            qobj (Qobj)
+            error (Exception): error of the last try
+        """
+        batch_id = (batch.backend_name, batch.batch_number)
+        failed = self._failed_submissions.get(batch_id, 0) + 1
+        if failed < self._submit_tries:
+            self._failed_submissions[batch_id] = failed
+            self._log.info(f"Retry the submission of batch {batch.backend_name}/{batch.batch_number} after {failed} failed tries")
+            self._deferred[batch.backend_name].insert(0, (batch, qobj))
+            self._retry_times[batch.backend_name] = time.time() + self._defer_interval
+            return
+        self._failed_submissions.pop(batch_id, None)
+        self._log.error(f"Failed to submit batch {batch.backend_name}/{batch.batch_number}: {error}")
+        self._fail_batch(batch, error)
+
+    def _fail_batch(self, batch:Batch, error:Exception):
+        """Remove the jobs of the batch and put them into the error queue
+
+        Args:
+            batch (Batch)
+            error (Exception)
+        """
+        for key in dict.fromkeys(exp["key"] for exp in batch.experiments):
+            job = self._quantum_job_table.pop(key, None)
+            if job is None:
+                continue
+            if self._error_queue is not None:
+                job.error = str(error)
+                self._error_queue.put(job)
+
+    def _submit_deferred(self, backend_name:str):
+        """Submit the deferred batches of the backend in order as long as the backend has free job slots
+
+        Args:
+            backend_name (str)
+        """
+        if time.time() < self._retry_times.get(backend_name, 0):
+            return
+        deferred = self._deferred.get(backend_name, [])
+        while len(deferred) > 0 and self._backend_control.try_to_enter(backend_name):
+            batch, qobj = deferred.pop(0)
+            try:
+                job = self._backend_look_up.get(backend_name).run(qobj)
+            except Exception as e:
+                self._log.exception(e)
+                self._backend_control.leave(backend_name)
+                self._submission_failed(batch, qobj, e)
+                return
+            self._failed_submissions.pop((batch.backend_name, batch.batch_number), None)
+            leave_stage(batch, "submitter")
+            self._log.info(f"Submitted batch {batch.backend_name}/{batch.batch_number}")
+            self._output.put((batch, job))
+
+    def _receive_batches(self):
+        """Take the incoming batches and assemble them on the worker threads
+        """
+        while True:
+            batch = self._input.get()
+            enter_stage(batch, "submitter")
+            self._assembly_executor.submit(self._assemble, batch)
 
-        
     def run(self) -> None:
         self._log.info("Started")
+        Thread(target=self._receive_batches).start()
         batch: Batch
         qobj: Qobj
-        submit_interval = 30
-        last_time = 0
         while True:
+            current = time.time()
+            for backend_name in [backend_name for backend_name, retry_time in self._retry_times.items() if retry_time <= current]:
+                self._retry_times.pop(backend_name)
+                self._submit_deferred(backend_name)
+            timeout = self._defer_interval
+            if len(self._retry_times) > 0:
+                timeout = max(0, min(min(self._retry_times.values()) - current, timeout))
             try:
-                batch = self._input.get(timeout=self._defer_interval)
-                qobj = self._assemble(batch)
-                self._internal_jobs_queue.append((batch, qobj))
+                item = self._events.get(timeout=timeout)
             except Empty:
-                pass
-            current = time.time()
-            if current - last_time > submit_interval:
-                deferred_jobs = []
-                for batch, qobj in self._internal_jobs_queue:
-                    backend_name = batch.backend_name
-                    backend = self._backend_look_up.get(backend_name)
-                    if self._backend_control.try_to_enter(backend_name, backend):
-                        job = backend.run(qobj)
-                        self._log.info(f"Submitted batch {batch.backend_name}/{batch.batch_number}")
-                        self._output.put((batch, job))
-                    else:
-                        # self._log.debug(f"Reached limit of queued jobs for backend {backend_name} -> defer job for batch {batch.batch_number}")
-                        deferred_jobs.append((batch, qobj))
-                self._internal_jobs_queue = deferred_jobs
-                last_time = time.time()
+                # the job limits can also change due to jobs that are not submitted by the Submitter
+                for backend_name in self._deferred.keys():
+                    self._submit_deferred(backend_name)
+                continue
+            if isinstance(item, _SlotFreed):
+                self._submit_deferred(item.backend_name)
+                continue
+            batch, qobj = item.batch, item.qobj
+            if qobj is None:
+                self._assembly_failed(batch, item.error)
+                continue
+            self._failed_assemblies.pop((batch.backend_name, batch.batch_number), None)
+            deferred = self._deferred.setdefault(batch.backend_name, [])
+            # the assembly can finish out of order
+            index = len(deferred)
+            while index > 0 and deferred[index-1][0].batch_number > batch.batch_number:
+                index -= 1
+            deferred.insert(index, (batch, qobj))
+            self._submit_deferred(batch.backend_name)
 
             
 class Retriever(Thread):
 
-    def __init__(self, input: Queue, output: Queue, wait_time:float, backend_control:BackendControl):
+    def __init__(self, input: Queue, output: Queue, wait_time:float, backend_control:BackendControl, min_wait_time:float=1, max_workers:int=10):
+        """
+        Args:
+            input (Queue): tuples of batches and submitted jobs
+            output (Queue): tuples of batches and finished jobs
+            wait_time (float): maximal time in seconds between two status checks of a job
+            backend_control (BackendControl)
+            min_wait_time (float, optional): minimal time in seconds between two status checks of a job. Defaults to 1.
+            max_workers (int, optional): maximal number of concurrent status checks. Defaults to 10.
+        """
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._wait_time = wait_time
+        self._min_wait_time = min_wait_time
         self._backend_control = backend_control
-        self._jobs = []
-        self._batch_counter = {}
-        self._deferred_results = {}   
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # maps the job tuples to the time of their next status check
+        self._jobs = {}
+        # last status and current backoff interval of the jobs
+        self._backoff = {}
         Thread.__init__(self)
         self._log.info("Init")    
 
+    def _poll_interval(self, job_tuple:Tuple[Batch, Job], status:JobStatus, queue_position:Optional[int]) -> float:
+        """Time until the next status check of a job. The interval starts at min_wait_time and doubles with every check without a status change up to wait_time.
+        Queued jobs with a known position are checked according to their position.
 
-    def run(self):
-        self._log.info("Started")
-        batch: Batch
-        job: Job
-        while True:
-            i = 0
-            while not self._input.empty() and i < 5:
-                job_tuple = self._input.get()
-                self._jobs.append(job_tuple)
-                i += 1
-            final_state_jobs = []
-            for batch, job in self._jobs:
-                try:
-                    if job.in_final_state():
-                        final_state_jobs.append((batch, job))
-                        self._backend_control.leave(batch.backend_name)
-                except qiskit.providers.ibmq.job.exceptions.IBMQJobApiError as e:
-                    self._log.info("Connection Problem") 
-            for job_tuple in final_state_jobs:
-                self._jobs.remove(job_tuple)
-                batch, job = job_tuple
-                self._log.info(f"Received result for batch {batch.backend_name}/{batch.batch_number}")
-                try:
-                    batch_counter = self._batch_counter[batch.backend_name]
-                except KeyError:
-                    batch_counter = 0
-                    self._batch_counter[batch.backend_name] = 0
-                    self._deferred_results[batch.backend_name] = []
-                if batch_counter == batch.batch_number:
-                    # the received batch is the next batch -> output it
-                    batch_counter += 1
-                    self._output.put(job_tuple)
-                    # check if deferred results can be output
-                    if len(self._deferred_results[batch.backend_name]) > 0:
-                        # sort the deferred job tuples according to their batch number
-                        self._deferred_results[batch.backend_name].sort(key=lambda tuple:tuple[0].batch_number)
-                    while len(self._deferred_results[batch.backend_name]) > 0 and batch_counter == self._deferred_results[batch.backend_name][0][0].batch_number:
-                        # ouput jobs as long as their are deferred jobs and the batch number is next following number
-                        self._output.put(self._deferred_results[batch.backend_name].pop(0))
-                        batch_counter += 1
-                    
-                    self._batch_counter[batch.backend_name] = batch_counter
-                else:
-                    # the received batch is not the next batch
-                    self._deferred_results[batch.backend_name].append(job_tuple)
-                    self._log.info(f"Deferred result for batch {batch.backend_name}/{batch.batch_number} to establish order")
+        Args:
+            job_tuple (Tuple[Batch, Job])
+            status (JobStatus)
+            queue_position (Optional[int]): position of a queued job or None, if it is unknown
 
-            time.sleep(self._wait_time)
+        Returns:
+            float: time in seconds
+        """
+        last_status, interval = self._backoff.get(job_tuple, (None, self._min_wait_time))
+        if status == last_status:
+            interval = min(self._wait_time, 2*interval)
+        else:
+            interval = self._min_wait_time
+        self._backoff[job_tuple] = (status, interval)
+        if status == JobStatus.QUEUED and queue_position is not None:
+            return min(self._wait_time, self._min_wait_time*(1+queue_position))
+        return interval
 
+    def _check(self, job:Job) -> Tuple[JobStatus, Optional[int]]:
+        """Check the status of the job. The result of a finished job is downloaded by the ResultProcessor.
 
+        Args:
+            job (Job)
 
+        Returns:
+            Tuple[JobStatus, Optional[int]]: the status of the job and its queue position, if it is queued and the position is known
+        """
+        status = job.status()
+        queue_position = None
+        if status == JobStatus.QUEUED and hasattr(job, "queue_position"):
+            queue_position = job.queue_position()
+        return status, queue_position
+
+    def _add_job(self, job_tuple:Tuple[Batch, Job]):
+        enter_stage(job_tuple[0], "retriever")
+        self._jobs[job_tuple] = time.time()
+
+    def _check_due_jobs(self):
+        """Check the status of all jobs whose next status check is due and forward the jobs in a final state
+        """
+        current = time.time()
+        due_jobs = [job_tuple for job_tuple, next_check in self._jobs.items() if next_check <= current]
+        futures = [(job_tuple, self._executor.submit(self._check, job_tuple[1])) for job_tuple in due_jobs]
+        for job_tuple, future in futures:
+            batch, job = job_tuple
+            try:
+                status, queue_position = future.result()
+            except qiskit.providers.ibmq.job.exceptions.IBMQJobApiError as e:
+                self._log.info("Connection Problem")
+                self._jobs[job_tuple] = time.time() + self._wait_time
+                continue
+            except Exception as e:
+                # a failed check must not stop the checks of the other jobs
+                self._log.warning(f"Status check of batch {batch.backend_name}/{batch.batch_number} failed: {e}")
+                self._jobs[job_tuple] = time.time() + self._wait_time
+                continue
+            if status not in JOB_FINAL_STATES:
+                self._jobs[job_tuple] = time.time() + self._poll_interval(job_tuple, status, queue_position)
+                continue
+            self._jobs.pop(job_tuple)
+            self._backoff.pop(job_tuple, None)
+            leave_stage(batch, "retriever")
+            self._backend_control.leave(batch.backend_name)
+            self._log.info(f"Batch {batch.backend_name}/{batch.batch_number} is finished")
+            # the ResultProcessor tracks the pieces of circuits split over multiple batches, so the results can be output in any order
+            self._output.put(job_tuple)
+
+    def run(self):
+        self._log.info("Started")
+        while True:
+            # wait for new jobs until the next status check is due
+            timeout = self._wait_time
+            if len(self._jobs) > 0:
+                timeout = max(0, min(self._jobs.values()) - time.time())
+            try:
+                self._add_job(self._input.get(timeout=timeout))
+                # take the other new jobs without waiting, so incoming jobs do not delay the due status checks
+                while True:
+                    self._add_job(self._input.get_nowait())
+            except Empty:
+                pass
+            self._check_due_jobs()
 
-    
 
 class ResultProcessor(Thread):
 
@@ -540,19 +1161,49 @@ class ResultProcessor(Thread):
         self._output = output
         self._quantum_job_table = quantum_job_table
         self._memory = memory
-        self._previous_key = {}
-        self._previous_memory = {}
-        self._previous_counts = {}
+        # memory pieces of circuits split over multiple batches
+        self._pieces = {}
+        # timestamps of the batches with the pieces of these circuits
+        self._piece_timestamps = {}
         Thread.__init__(self)
         self._log.info("Init") 
 
-    def _add_dicts(self, d1, d2):
-        c = Counter(d1)
-        c.update(d2)
-        return dict(c)
+    def _experiment_result(self, template:ExperimentResult, memory:np.ndarray, shots:int, provide_memory:bool) -> ExperimentResult:
+        """Create the experiment result of a job from the merged memory
+
+        Args:
+            template (ExperimentResult): an executed experiment of the job providing the header and the status
+            memory (np.ndarray): per-shot memory of the job
+            shots (int): number of shots of the job
+            provide_memory (bool): If True, the memory is part of the result
+
+        Returns:
+            ExperimentResult
+        """
+        states, state_counts = np.unique(memory, return_counts=True)
+        counts = dict(zip(states.tolist(), state_counts.tolist()))
+        if provide_memory:
+            data = ExperimentResultData(counts=counts, memory=memory.tolist())
+        else:
+            data = ExperimentResultData(counts=counts)
+        return ExperimentResult(shots=shots, success=template.success, data=data, meas_level=template.meas_level, status=getattr(template, "status", None), header=getattr(template, "header", None))
+
+    def _result(self, job_result:Result, experiment_result:ExperimentResult) -> Result:
+        """Create the result of a job containing a single experiment result
+
+        Args:
+            job_result (Result): result of the batch
+            experiment_result (ExperimentResult)
+
+        Returns:
+            Result
+        """
+        return Result(backend_name=job_result.backend_name, backend_version=job_result.backend_version, qobj_id=job_result.qobj_id, job_id=job_result.job_id, 
+                      success=job_result.success, results=[experiment_result], date=getattr(job_result, "date", None), status=getattr(job_result, "status", None), header=getattr(job_result, "header", None))
 
     def _process_job_result(self, job_result:Result, batch:Batch) -> Dict[str, Result]:
-        """Post-process the job result corresponding to a batch. Recreate the single results by adding up the shots of multiple executions
+        """Post-process the job result corresponding to a batch. Recreate the single results by merging the memory of multiple executions.
+        Circuits that are split over multiple batches are only returned, if all of their pieces are received.
 
         Args:
             job_result (Result)
@@ -563,93 +1214,47 @@ class ResultProcessor(Thread):
         """
         results = {}
         exp_number = 0
-        # get the Result as dict and delete the results 
-        result_dict = job_result.to_dict()
-
-        index = batch.batch_number
-        backend_name = batch.backend_name
-        try:
-            previous_key = self._previous_key[backend_name]
-            previous_memory = self._previous_memory[backend_name]
-            previous_counts = self._previous_counts[backend_name]
-        except KeyError:
-            previous_key = None
-            previous_memory = None
-            previous_counts = None
-        
-        self._log.info(f"Process result of job {index}")
+        self._log.info(f"Process result of batch {batch.backend_name}/{batch.batch_number}")
 
         for exp in batch.experiments:
             key = exp["key"]
-            circ = exp["circuit"]
             reps = exp["reps"]
             shots = exp["shots"]
             total_shots = exp["total_shots"]
-            memory = []
-            counts = {}
-            result_data = None
-
-            
-
-            if previous_memory:
-                # there is data from the previous job
-                assert(previous_key==key)
-                memory.extend(previous_memory)
-                counts.update(previous_counts)
-                shots += len(previous_memory)
-                total_shots += len(previous_memory)
-                previous_memory = None
-                previous_counts = None
-                previous_key = None
-            
-            # get ExperimentResult as dict
-            job_exp_result_dict = job_result._get_experiment(exp_number).to_dict() 
-
-            if not (shots == total_shots and reps == 1 and len(memory) == 0):
-                # do not run this block if it is only one experiment (shots == total_shots) with one repetition and no previous data is available
-                for exp_index in range(exp_number, exp_number+reps):
-                    mem = job_result.data(exp_index)['memory']
-                    memory.extend(mem)
-                    cnts = job_result.data(exp_index)['counts']
-                    
-                    if exp_index == exp_number+reps-1 and shots == total_shots:
-                        # last experiment for this circuit
-                        if len(memory) > total_shots:
-                            # trim memory and counts w.r.t. number of shots
-                            too_much = len(memory) - total_shots
-                            memory = memory[:total_shots]
-                            mem = mem[:-too_much]
-                            cnts = dict(Counter(mem))
-
-                    counts = self._add_dicts(counts, cnts)
-                
-                if shots < total_shots:
-                    previous_memory = copy.deepcopy(memory)
-                    previous_counts = copy.deepcopy(counts)
-                    previous_key = key
+            # jobs can request the memory, e.g. aggregated jobs that need to cut their results to the requested shots
+            provide_memory = self._memory or getattr(self._quantum_job_table.get(key), "memory", False)
+            experiment_results = job_result.results[exp_number:exp_number+reps]
+            exp_number += reps
+            if key not in self._quantum_job_table:
+                # the job failed, e.g. another batch with a piece of its circuit could not be assembled
+                self._pieces.pop(key, None)
+                self._piece_timestamps.pop(key, None)
+                continue
+
+            if shots == total_shots and reps == 1 and batch.shots == total_shots:
+                # only one experiment with exactly the requested shots
+                experiment_result = experiment_results[0]
+                if not provide_memory:
+                    experiment_result = ExperimentResult(shots=total_shots, success=experiment_result.success, data=ExperimentResultData(counts=experiment_result.data.counts), 
+                                                         meas_level=experiment_result.meas_level, status=getattr(experiment_result, "status", None), header=getattr(experiment_result, "header", None))
+                results[key] = self._result(job_result, experiment_result)
+                continue
+
+            # trim the memory w.r.t. the number of shots of this piece
+            memory = np.concatenate([np.asarray(experiment_result.data.memory) for experiment_result in experiment_results])[:shots]
+
+            if shots < total_shots:
+                pieces = self._pieces.setdefault(key, [])
+                pieces.append((exp["offset"], memory))
+                self._piece_timestamps.setdefault(key, []).append(batch.timestamps)
+                if sum(len(piece_memory) for _, piece_memory in pieces) < total_shots:
+                    # the remaining pieces are executed in other batches
                     continue
-                if self._memory:
-                    result_data = ExperimentResultData(counts=counts, memory=memory).to_dict()
-                else:
-                    result_data = ExperimentResultData(counts=counts).to_dict()
-
-                # overwrite the data and the shots
-                job_exp_result_dict["data"] = result_data
-                job_exp_result_dict["shots"] = total_shots
+                pieces.sort(key=lambda piece:piece[0])
+                memory = np.concatenate([piece_memory for _, piece_memory in pieces])
+                self._pieces.pop(key)
 
-            else:
-                if not self._memory:
-                    counts = job_result.data(exp_number)['counts']
-                    result_data = ExperimentResultData(counts=counts).to_dict()
-                    job_exp_result_dict["data"] = result_data
-
-            # overwrite the results with the computed result
-            result_dict["results"] = [job_exp_result_dict]
-            results[key] = Result.from_dict(result_dict)
-            exp_number += reps
-        self._previous_key[backend_name] = previous_key
-        self._previous_memory[backend_name] = previous_memory
-        self._previous_counts[backend_name] = previous_counts
+            results[key] = self._result(job_result, self._experiment_result(experiment_results[-1], memory, total_shots, provide_memory))
         return results
 
     def run(self) -> None:
@@ -658,13 +1263,17 @@ class ResultProcessor(Thread):
         job: Job
         while True:
             batch, job = self._input.get()
+            enter_stage(batch, "result_processor")
             job_result = job.result()
             self._log.info(f"Got result for batch {batch.batch_number} from {batch.backend_name}")
             result_for_batch = self._process_job_result(job_result, batch)
+            leave_stage(batch, "result_processor")
             for key, result in result_for_batch.items():
                 try:
                     qjob = self._quantum_job_table.pop(key)
                     qjob.result = result
+                    # the job spans all batches with a piece of its circuit
+                    qjob.timestamps = merge_timestamps(qjob.timestamps, self._piece_timestamps.pop(key, [batch.timestamps]))
                     self._output.put(qjob)
                 except KeyError as ke:
                     # TODO Exception Handling
@@ -674,21 +1283,34 @@ class ResultProcessor(Thread):
 
 class ExecutionHandler():
     
-    def __init__(self, provider:AccountProvider, input:Queue, output:Queue, batch_timeout:int = 60, retrieve_interval:int = 30, transpile_timeout=20, max_transpile_batch_size=float('inf'),  submitter_defer_interval=30, provide_memory:bool=False) -> None:
-        transpiler_batcher = Queue()
-        batcher_submitter = Queue()
-        submitter_retrieber = Queue()
-        retriever_processor = Queue()
+    def __init__(self, provider:AccountProvider, input:Queue, output:Queue, batch_timeout:int = 60, retrieve_interval:int = 30, transpile_timeout=20, max_transpile_batch_size=float('inf'),  submitter_defer_interval=30, provide_memory:bool=False, backend_look_up:Optional[BackendLookUp]=None, transpile_cache_size:int=1000, transpile_cache_dir:Optional[str]=None, transpile_cache_max_disk_entries:int=10000, backend_refresh_interval:float=900, job_limit_reconcile_interval:float=30, transpile_pool_size:Optional[int]=None, transpile_warm_up:bool=True, max_transpile_batches_per_backend:int=2, min_retrieve_interval:float=1, max_retrieve_workers:int=10, assembly_workers:int=2, assembly_cache_size:int=1000, queue_factory:Callable[[str], Queue]=lambda name: Queue(), error_queue:Optional[Queue]=None) -> None:
+        transpiler_batcher = queue_factory("transpiler_batcher")
+        batcher_submitter = queue_factory("batcher_submitter")
+        submitter_retrieber = queue_factory("submitter_retriever")
+        retriever_processor = queue_factory("retriever_processor")
         quantum_job_table = {}
-        backend_look_up = BackendLookUp(provider)
-        backend_control = BackendControl()
-        self._transpiler = Transpiler(input=input, output=transpiler_batcher, backend_look_up=backend_look_up, timeout = transpile_timeout, max_transpile_batch_size=max_transpile_batch_size)
+        # a backend look up that is passed in is started by its owner
+        self._backend_look_up = None
+        if backend_look_up is None:
+            backend_look_up = BackendLookUp(provider, backend_refresh_interval)
+            self._backend_look_up = backend_look_up
+        self._backend_control = BackendControl(backend_look_up, job_limit_reconcile_interval)
+        if transpile_pool_size is None:
+            # at least one free logical core
+            transpile_pool_size = max(1, psutil.cpu_count(logical=True) - 1)
+        self.transpile_pool = TranspilePool(transpile_pool_size, transpile_warm_up)
+        self._transpiler = Transpiler(input=input, output=transpiler_batcher, backend_look_up=backend_look_up, timeout = transpile_timeout, max_transpile_batch_size=max_transpile_batch_size, transpile_cache=TranspileCache(transpile_cache_size, transpile_cache_dir, transpile_cache_max_disk_entries), pool=self.transpile_pool, pool_size=transpile_pool_size, max_batches_per_backend=max_transpile_batches_per_backend,
+                                      error_queue=error_queue)
         self._batcher = Batcher(input=transpiler_batcher, output=batcher_submitter, quantum_job_table=quantum_job_table, backend_look_up=backend_look_up, batch_timeout=batch_timeout)
-        self._submitter = Submitter(input=batcher_submitter, output=submitter_retrieber, backend_look_up=backend_look_up, backend_control=backend_control, defer_interval=submitter_defer_interval)
-        self._retriever = Retriever(input=submitter_retrieber, output=retriever_processor, wait_time=retrieve_interval, backend_control=backend_control)
+        self._submitter = Submitter(input=batcher_submitter, output=submitter_retrieber, backend_look_up=backend_look_up, backend_control=self._backend_control, defer_interval=submitter_defer_interval, assembly_workers=assembly_workers, assembly_cache_size=assembly_cache_size,
+                                    quantum_job_table=quantum_job_table, error_queue=error_queue)
+        self._retriever = Retriever(input=submitter_retrieber, output=retriever_processor, wait_time=retrieve_interval, backend_control=self._backend_control, min_wait_time=min_retrieve_interval, max_workers=max_retrieve_workers)
         self._processor = ResultProcessor(input=retriever_processor, output=output, quantum_job_table=quantum_job_table, memory=provide_memory)
     
     def start(self):
+        if self._backend_look_up is not None:
+            self._backend_look_up.start()
+        self._backend_control.start()
         self._transpiler.start()
         self._batcher.start()
         self._submitter.start()
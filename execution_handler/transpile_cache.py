@@ -0,0 +1,184 @@
+import copy
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, List, Optional, Tuple
+
+import logger
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit import Gate, Instruction
+
+
+def _hash_circuit(circuit:QuantumCircuit, digest:Any):
+    qubit_indices = {qubit:index for index, qubit in enumerate(circuit.qubits)}
+    clbit_indices = {clbit:index for index, clbit in enumerate(circuit.clbits)}
+    digest.update(repr(([(reg.name, reg.size) for reg in circuit.qregs], [(reg.name, reg.size) for reg in circuit.cregs], str(circuit.global_phase))).encode())
+    for instruction, qargs, cargs in circuit.data:
+        params = [param.tobytes() if isinstance(param, np.ndarray) else str(param) for param in instruction.params]
+        condition = None
+        if instruction.condition is not None:
+            register, value = instruction.condition
+            condition = (getattr(register, "name", None) or clbit_indices.get(register), value)
+        digest.update(repr((instruction.name, params, [qubit_indices[q] for q in qargs], [clbit_indices[c] for c in cargs], condition)).encode())
+        if type(instruction) in (Gate, Instruction) and instruction.definition is not None:
+            # custom gates share their name, but not their definition
+            _hash_circuit(instruction.definition, digest)
+
+
+def circuit_fingerprint(circuit:QuantumCircuit) -> str:
+    """Structural fingerprint of a circuit, which also covers parameterized circuits. The name of the circuit is not part of the fingerprint.
+
+    Args:
+        circuit (QuantumCircuit)
+
+    Returns:
+        str: hash of the registers and the instructions of the circuit
+    """
+    digest = hashlib.sha256()
+    _hash_circuit(circuit, digest)
+    return digest.hexdigest()
+
+
+class TranspileCache():
+    """Content-addressed cache of transpiled circuits with an in-memory LRU tier and an optional, bounded on-disk tier
+    """
+
+    def __init__(self, cache_size:int=1000, cache_dir:Optional[str]=None, max_disk_entries:int=10000) -> None:
+        """
+        Args:
+            cache_size (int, optional): maximal number of transpiled circuits in memory. Defaults to 1000.
+            cache_dir (Optional[str], optional): directory of the on-disk tier. If None, only the in-memory tier is used. Defaults to None.
+            max_disk_entries (int, optional): maximal number of transpiled circuits on disk. The least recently used circuits are deleted first. Defaults to 10000.
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        self._cache_size = cache_size
+        self._cache_dir = cache_dir
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._max_disk_entries = max_disk_entries
+        self._disk_entries = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            with self._lock:
+                self._disk_entries = len(self._disk_files())
+                self._evict_from_disk()
+
+    def key(self, circuit:QuantumCircuit, backend_name:str, backend_version:Tuple[str, Optional[str]], options:Hashable=None) -> Tuple[Any, ...]:
+        """Cache key of the circuit transpiled for the backend
+
+        Args:
+            circuit (QuantumCircuit)
+            backend_name (str)
+            backend_version (Tuple[str, Optional[str]]): version of the configuration and the calibration of the backend. A transpiled circuit is only valid for the same version.
+            options (Hashable, optional): transpile options, e.g. the initial layout. Defaults to None.
+
+        Returns:
+            Tuple[Any, ...]: the key
+        """
+        return (circuit_fingerprint(circuit), backend_name, backend_version, options)
+
+    def _path(self, key:Tuple[Any, ...]) -> str:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self._cache_dir, digest + ".pickle")
+
+    def _disk_files(self) -> List[str]:
+        return [os.path.join(self._cache_dir, file_name) for file_name in os.listdir(self._cache_dir) if file_name.endswith(".pickle")]
+
+    def _evict_from_disk(self):
+        """Delete the least recently used circuits from disk, if there are more than max_disk_entries.
+        The tier is reduced to 90% of max_disk_entries, so the directory is not listed on every put.
+        """
+        if self._disk_entries <= self._max_disk_entries:
+            return
+        files = []
+        for path in self._disk_files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        files.sort()
+        n_evict = len(files) - int(self._max_disk_entries*0.9)
+        for _, path in files[:max(n_evict, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._disk_entries = len(files) - max(n_evict, 0)
+        self._log.info(f"Evicted {max(n_evict, 0)} transpiled circuits from disk")
+
+    def _store_in_memory(self, key:Tuple[Any, ...], transpiled_circuit:QuantumCircuit):
+        self._cache[key] = transpiled_circuit
+        self._cache.move_to_end(key)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, key:Tuple[Any, ...], name:Optional[str]=None) -> Optional[QuantumCircuit]:
+        """Look up a transpiled circuit
+
+        Args:
+            key (Tuple[Any, ...]): cache key created by key()
+            name (Optional[str], optional): name of the returned circuit. Defaults to None.
+
+        Returns:
+            Optional[QuantumCircuit]: the transpiled circuit or None, if it is not cached
+        """
+        with self._lock:
+            transpiled_circuit = self._cache.get(key)
+            if transpiled_circuit is not None:
+                self._cache.move_to_end(key)
+        if transpiled_circuit is None and self._cache_dir is not None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    transpiled_circuit = pickle.load(f)
+                # the modification time orders the circuits on disk by their last use
+                os.utime(path)
+                with self._lock:
+                    self._store_in_memory(key, transpiled_circuit)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._log.warning(f"Failed to access cached circuit: {e}")
+            except (pickle.UnpicklingError, EOFError, AttributeError) as e:
+                self._log.warning(f"Failed to load cached circuit: {e}")
+        with self._lock:
+            if transpiled_circuit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if transpiled_circuit is None:
+            return None
+        if name is not None and transpiled_circuit.name != name:
+            # the fingerprint does not contain the name of the circuit
+            transpiled_circuit = copy.copy(transpiled_circuit)
+            transpiled_circuit.name = name
+        return transpiled_circuit
+
+    def put(self, key:Tuple[Any, ...], transpiled_circuit:QuantumCircuit):
+        """Store a transpiled circuit
+
+        Args:
+            key (Tuple[Any, ...]): cache key created by key()
+            transpiled_circuit (QuantumCircuit)
+        """
+        with self._lock:
+            self._store_in_memory(key, transpiled_circuit)
+        if self._cache_dir is not None:
+            path = self._path(key)
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(transpiled_circuit, f)
+                new_entry = not os.path.exists(path)
+                os.replace(tmp_path, path)
+                if new_entry:
+                    with self._lock:
+                        self._disk_entries += 1
+                        self._evict_from_disk()
+            except (OSError, pickle.PicklingError) as e:
+                self._log.warning(f"Failed to store transpiled circuit on disk: {e}")
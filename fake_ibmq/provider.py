@@ -0,0 +1,248 @@
+import copy
+import random
+import time
+from threading import Lock
+from typing import Callable, List, NamedTuple, Optional, Union
+from uuid import uuid4
+
+import logger
+from qiskit import Aer, QuantumCircuit, assemble
+from qiskit.exceptions import QiskitError
+from qiskit.providers import BackendV1, JobV1, Options, ProviderV1
+from qiskit.providers.jobstatus import JobStatus
+from qiskit.providers.models import BackendProperties, BackendStatus
+from qiskit.providers.providerutils import filter_backends
+from qiskit.qobj import QasmQobj
+from qiskit.result import Result
+from qiskit.test.mock import FakeProvider
+
+
+class JobLimit(NamedTuple):
+    """Job limit of a backend with the same attributes as the job limit of an IBMQ backend
+    """
+    maximum_jobs: int
+    active_jobs: int
+
+
+class FakeIBMQJob(JobV1):
+    """Job on a FakeIBMQBackend. Its status only depends on the time, the result is simulated on the first request.
+    """
+
+    def __init__(self, backend:'FakeIBMQBackend', job_id:str, qobj:QasmQobj, start_time:float, end_time:float) -> None:
+        """
+        Args:
+            backend (FakeIBMQBackend)
+            job_id (str)
+            qobj (QasmQobj)
+            start_time (float): time when the job leaves the queue
+            end_time (float): time when the execution of the job is finished
+        """
+        super().__init__(backend, job_id)
+        self.qobj = qobj
+        self.start_time = start_time
+        self.end_time = end_time
+        self._result = None
+        self._lock = Lock()
+
+    def submit(self):
+        raise QiskitError("The job is submitted by FakeIBMQBackend.run")
+
+    def status(self) -> JobStatus:
+        current = time.time()
+        if current < self.start_time:
+            return JobStatus.QUEUED
+        if current < self.end_time:
+            return JobStatus.RUNNING
+        return JobStatus.DONE
+
+    def queue_position(self) -> Optional[int]:
+        """Position of the job in the queue of the backend
+
+        Returns:
+            Optional[int]: None, if the job is not queued
+        """
+        if self.status() != JobStatus.QUEUED:
+            return None
+        return self._backend.queue_position(self)
+
+    def result(self, timeout:Optional[float]=None) -> Result:
+        """Wait until the job is finished and simulate its result
+
+        Args:
+            timeout (Optional[float], optional): maximal time in seconds to wait for the job. Defaults to None.
+
+        Returns:
+            Result
+        """
+        wait_time = self.end_time - time.time()
+        if timeout is not None and wait_time > timeout:
+            raise QiskitError(f"Job {self.job_id()} is not finished after {timeout}s")
+        if wait_time > 0:
+            time.sleep(wait_time)
+        with self._lock:
+            if self._result is None:
+                self._result = self._backend.simulate(self.qobj)
+                self._result.backend_name = self._backend.name()
+                self._result.job_id = self.job_id()
+        return self._result
+
+
+class FakeIBMQBackend(BackendV1):
+    """Offline stand-in for an IBMQ backend. It models the limits of the backend, a queue delay, the execution time per shot and the job limit.
+    The queue delays of the jobs are drawn independently, so the jobs can finish out of order.
+    """
+
+    def __init__(self, fake_backend:BackendV1, provider:'FakeIBMQProvider', queue_delay:float=10, time_per_shot:float=1e-4, max_shots:Optional[int]=None,
+                 max_experiments:Optional[int]=None, maximum_jobs:int=5, pending_jobs:int=0, noise:bool=False, seed:Optional[int]=None) -> None:
+        """
+        Args:
+            fake_backend (BackendV1): fake backend providing the configuration and the properties, e.g. FakeAthens
+            provider (FakeIBMQProvider)
+            queue_delay (float, optional): mean time in seconds a job waits in the queue. Defaults to 10.
+            time_per_shot (float, optional): execution time in seconds per shot and experiment. Defaults to 1e-4.
+            max_shots (Optional[int], optional): overwrites the maximal number of shots of the fake backend. Defaults to None.
+            max_experiments (Optional[int], optional): overwrites the maximal number of experiments of the fake backend. Defaults to None.
+            maximum_jobs (int, optional): maximal number of active jobs. Defaults to 5.
+            pending_jobs (int, optional): number of pending jobs of other users. Defaults to 0.
+            noise (bool, optional): If True, the results are sampled with the noise model of the fake backend. Defaults to False.
+            seed (Optional[int], optional): seed of the queue delays. Defaults to None.
+        """
+        configuration = copy.deepcopy(fake_backend.configuration())
+        if max_shots is not None:
+            configuration.max_shots = max_shots
+        if max_experiments is not None:
+            configuration.max_experiments = max_experiments
+        super().__init__(configuration, provider)
+        self._log = logger.get_logger(type(self).__name__)
+        self._fake_backend = fake_backend
+        self._queue_delay = queue_delay
+        self._time_per_shot = time_per_shot
+        self._maximum_jobs = maximum_jobs
+        self._pending_jobs = pending_jobs
+        self._random = random.Random(seed)
+        self._jobs = []
+        self._lock = Lock()
+        self._simulator = Aer.get_backend("qasm_simulator")
+        self._noise_model = None
+        if noise:
+            from qiskit.providers.aer.noise import NoiseModel
+            self._noise_model = NoiseModel.from_backend(fake_backend)
+
+    @classmethod
+    def _default_options(cls) -> Options:
+        return Options(shots=1024, memory=False)
+
+    def properties(self, refresh:bool=False) -> Optional[BackendProperties]:
+        return self._fake_backend.properties()
+
+    def _active_jobs(self) -> List[FakeIBMQJob]:
+        with self._lock:
+            self._jobs = [job for job in self._jobs if job.status() != JobStatus.DONE]
+            return list(self._jobs)
+
+    def job_limit(self) -> JobLimit:
+        return JobLimit(self._maximum_jobs, len(self._active_jobs()))
+
+    def status(self) -> BackendStatus:
+        queued_jobs = [job for job in self._active_jobs() if job.status() == JobStatus.QUEUED]
+        return BackendStatus(backend_name=self.name(), backend_version=self.configuration().backend_version, operational=True,
+                             pending_jobs=self._pending_jobs + len(queued_jobs), status_msg="active")
+
+    def queue_position(self, job:FakeIBMQJob) -> int:
+        """Position of a queued job. The jobs leave the queue in the order of their start times.
+
+        Args:
+            job (FakeIBMQJob)
+
+        Returns:
+            int
+        """
+        return 1 + sum(1 for other in self._active_jobs() if other.start_time < job.start_time and other.status() == JobStatus.QUEUED)
+
+    def simulate(self, qobj:QasmQobj) -> Result:
+        """Sample the result of the Qobj from the local simulator
+
+        Args:
+            qobj (QasmQobj)
+
+        Returns:
+            Result
+        """
+        if self._noise_model is None:
+            return self._simulator.run(qobj).result()
+        return self._simulator.run(qobj, noise_model=self._noise_model).result()
+
+    def run(self, run_input:Union[QasmQobj, QuantumCircuit, List[QuantumCircuit]], **options) -> FakeIBMQJob:
+        """Submit a job. The job stays in the queue for a random time and the execution time is proportional to the number of shots.
+
+        Args:
+            run_input (Union[QasmQobj, QuantumCircuit, List[QuantumCircuit]])
+
+        Returns:
+            FakeIBMQJob
+        """
+        if isinstance(run_input, QasmQobj):
+            qobj = run_input
+        else:
+            run_options = copy.copy(self.options.__dict__)
+            run_options.update(options)
+            qobj = assemble(run_input, self, **run_options)
+        configuration = self.configuration()
+        if len(qobj.experiments) > configuration.max_experiments:
+            raise QiskitError(f"{len(qobj.experiments)} experiments exceed the maximum of {configuration.max_experiments} of backend {self.name()}")
+        if qobj.config.shots > configuration.max_shots:
+            raise QiskitError(f"{qobj.config.shots} shots exceed the maximum of {configuration.max_shots} of backend {self.name()}")
+        active_jobs = len(self._active_jobs())
+        with self._lock:
+            if active_jobs >= self._maximum_jobs:
+                raise QiskitError(f"Backend {self.name()} has reached its job limit of {self._maximum_jobs} active jobs")
+            queue_delay = 0
+            if self._queue_delay > 0:
+                queue_delay = self._random.expovariate(1/self._queue_delay)
+            start_time = time.time() + queue_delay
+            end_time = start_time + len(qobj.experiments)*qobj.config.shots*self._time_per_shot
+            job = FakeIBMQJob(self, uuid4().hex, qobj, start_time, end_time)
+            self._jobs.append(job)
+        self._log.debug(f"Job {job.job_id()} is queued for {queue_delay}s on backend {self.name()}")
+        return job
+
+
+class FakeIBMQProvider(ProviderV1):
+    """Offline stand-in for the IBMQ AccountProvider. It can be passed to the Virtual_Execution_Environment to measure the pipeline without network access.
+    """
+
+    def __init__(self, backend_names:Optional[List[str]]=None, seed:Optional[int]=None, **backend_options) -> None:
+        """
+        Args:
+            backend_names (Optional[List[str]], optional): names of the fake backends, e.g. "fake_athens". If None, the first five 5-qubit backends of the installed qiskit-terra are used. Defaults to None.
+            seed (Optional[int], optional): seed of the queue delays. Defaults to None.
+            backend_options: options of the FakeIBMQBackends, e.g. queue_delay or time_per_shot
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        fake_provider = FakeProvider()
+        if backend_names is None:
+            # the available fake backends depend on the version of qiskit-terra
+            backend_names = sorted(backend.name() for backend in fake_provider.backends() if backend.configuration().n_qubits == 5 and not backend.configuration().simulator)[:5]
+        self._backends = {}
+        for index, backend_name in enumerate(backend_names):
+            backend_seed = None
+            if seed is not None:
+                backend_seed = seed + index
+            self._backends[backend_name] = FakeIBMQBackend(fake_provider.get_backend(backend_name), self, seed=backend_seed, **backend_options)
+        self._log.info(f"Created fake backends {backend_names}")
+
+    def backends(self, name:Optional[str]=None, filters:Optional[Callable[[FakeIBMQBackend], bool]]=None, **kwargs) -> List[FakeIBMQBackend]:
+        """Get the backends, which match the name and the filters
+
+        Args:
+            name (Optional[str], optional): name of the backend. Defaults to None.
+            filters (Optional[Callable[[FakeIBMQBackend], bool]], optional): function that returns True for the selected backends. Defaults to None.
+            kwargs: attributes of the configuration or the status of the selected backends, e.g. operational=True
+
+        Returns:
+            List[FakeIBMQBackend]
+        """
+        backends = list(self._backends.values())
+        if name is not None:
+            backends = [backend for backend in backends if backend.name() == name]
+        return filter_backends(backends, filters=filters, **kwargs)
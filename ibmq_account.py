@@ -1,23 +1,33 @@
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional, Union
 from qiskit import IBMQ
 from qiskit.providers.ibmq.accountprovider import AccountProvider
 import logger
 
+if TYPE_CHECKING:
+    from fake_ibmq.provider import FakeIBMQProvider
+
 log = logger.get_logger(__name__)
 
 
-def get_provider(config:Optional[Dict]=None) -> Optional[AccountProvider]:
+def get_provider(config:Optional[Dict]=None) -> Optional[Union[AccountProvider, 'FakeIBMQProvider']]:
     """Authenticate against IBM Quantum Experience.
     Either use the specified token in the config or stored token.
+    If the IBMQ config contains options for a fake provider, an offline FakeIBMQProvider is returned instead.
 
     Args:
         ibmq_config (Optional[Dict], optional): If the IBMQ config dict is not None and it conatins a token, the method uses this token. Defaults to None.
 
     Returns:
-        Optional[AccountProvider]: a authenticated session via a Provider object
+        Optional[Union[AccountProvider, FakeIBMQProvider]]: a authenticated session via a Provider object
     """ 
     provider = None   
     if not config is None:
+        fake_provider_config = config.get("IBMQ", {}).get("fake_provider")
+        if not fake_provider_config is None:
+            # the fake provider needs Aer and the mock backends, which are only imported if it is used
+            from fake_ibmq.provider import FakeIBMQProvider
+            log.info("Use the offline fake provider")
+            return FakeIBMQProvider(**fake_provider_config)
         try:
             provider = IBMQ.enable_account(config["IBMQ"]["token"])
         except KeyError:
@@ -0,0 +1,90 @@
+import time
+from queue import Queue
+from threading import Thread
+from typing import Any, Dict, List
+
+import logger
+
+from metrics.registry import REGISTRY, MetricsRegistry
+
+STAGE_SECONDS = REGISTRY.histogram("vee_stage_seconds", "Time in seconds the items spend in a stage of the pipeline", ["stage"])
+STAGE_ITEMS = REGISTRY.counter("vee_stage_items_total", "Number of items that left a stage of the pipeline", ["stage"])
+QUEUE_DEPTH = REGISTRY.gauge("vee_queue_depth", "Number of items in a queue between the stages of the pipeline", ["queue"])
+
+
+def enter_stage(item:Any, stage:str):
+    """Record the time when an item, e.g. a QuantumExecutionJob or a Batch, enters a stage
+
+    Args:
+        item (Any): object with a timestamps dict
+        stage (str)
+    """
+    item.timestamps[stage + "_in"] = time.time()
+
+
+def leave_stage(item:Any, stage:str):
+    """Record the time when an item leaves a stage and observe the time spent in the stage
+
+    Args:
+        item (Any): object with a timestamps dict
+        stage (str)
+    """
+    now = time.time()
+    item.timestamps[stage + "_out"] = now
+    entered = item.timestamps.get(stage + "_in")
+    if entered is not None:
+        STAGE_SECONDS.observe(now - entered, stage=stage)
+    STAGE_ITEMS.inc(stage=stage)
+
+
+def merge_timestamps(timestamps:Dict[str, float], sub_timestamps:List[Dict[str, float]]) -> Dict[str, float]:
+    """Merge the timestamps of the sub-items of an item, e.g. the shards of a job, into the timestamps of the item.
+    For every stage, the earliest entry and the latest exit of the sub-items are kept. The own timestamps of the item take precedence.
+
+    Args:
+        timestamps (Dict[str, float]): timestamps of the item
+        sub_timestamps (List[Dict[str, float]]): timestamps of the sub-items
+
+    Returns:
+        Dict[str, float]: the merged timestamps
+    """
+    merged = {}
+    for sub_item_timestamps in sub_timestamps:
+        for key, timestamp in sub_item_timestamps.items():
+            if key not in merged:
+                merged[key] = timestamp
+            elif key.endswith("_in"):
+                merged[key] = min(merged[key], timestamp)
+            else:
+                merged[key] = max(merged[key], timestamp)
+    merged.update(timestamps)
+    return merged
+
+
+class QueueDepthSampler(Thread):
+    """Periodically samples the depths of the queues between the stages into a gauge
+    """
+
+    def __init__(self, queues:Dict[str, Queue], interval:float=5, registry:MetricsRegistry=REGISTRY) -> None:
+        """
+        Args:
+            queues (Dict[str, Queue]): the queues by their names
+            interval (float, optional): time in seconds between two samples. Defaults to 5.
+            registry (MetricsRegistry, optional): Defaults to REGISTRY.
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        self._queues = queues
+        self._interval = interval
+        self._queue_depth = registry.gauge(QUEUE_DEPTH.name, QUEUE_DEPTH.description, QUEUE_DEPTH.label_names)
+        Thread.__init__(self, daemon=True)
+        self._log.info("Init")
+
+    def sample(self):
+        for name, queue in list(self._queues.items()):
+            self._queue_depth.set(queue.qsize(), queue=name)
+
+    def run(self) -> None:
+        self._log.info("Started")
+        while True:
+            self.sample()
+            time.sleep(self._interval)
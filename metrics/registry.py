@@ -0,0 +1,183 @@
+import bisect
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_value(value:float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels:List[Tuple[str, str]]) -> str:
+    if len(labels) == 0:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for name, value in labels]
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped) + "}"
+
+
+class _Metric():
+    """Base class of the metrics. The values are stored per combination of label values.
+    """
+    metric_type = "untyped"
+
+    def __init__(self, name:str, description:str, label_names:Sequence[str]=()) -> None:
+        """
+        Args:
+            name (str)
+            description (str)
+            label_names (Sequence[str], optional): names of the labels. Defaults to ().
+        """
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = Lock()
+
+    def _key(self, labels:Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[label_name]) for label_name in self.label_names)
+
+    def _labels(self, key:Tuple[str, ...]) -> List[Tuple[str, str]]:
+        return list(zip(self.label_names, key))
+
+    def _samples(self) -> List[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format
+
+        Returns:
+            str
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, e.g. the number of processed jobs
+    """
+    metric_type = "counter"
+
+    def inc(self, amount:float=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. the depth of a queue
+    """
+    metric_type = "gauge"
+
+    def set(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount:float=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, e.g. the processing time of a stage
+    """
+    metric_type = "histogram"
+
+    def __init__(self, name:str, description:str, label_names:Sequence[str]=(), buckets:Sequence[float]=DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            name (str)
+            description (str)
+            label_names (Sequence[str], optional): names of the labels. Defaults to ().
+            buckets (Sequence[float], optional): upper bounds of the buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value:float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            try:
+                counts, total = self._values[key]
+            except KeyError:
+                # the last count belongs to the +Inf bucket
+                counts, total = [0]*(len(self.buckets)+1), 0.0
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> List[Tuple[str, List[Tuple[str, str]], float]]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + [("le", _format_value(upper_bound))], cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry():
+    """Collection of metrics, which are rendered together in the Prometheus text format
+    """
+
+    def __init__(self) -> None:
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _register(self, metric_class:type, name:str, *args, **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as {metric.metric_type}")
+            return metric
+
+    def counter(self, name:str, description:str, label_names:Sequence[str]=()) -> Counter:
+        return self._register(Counter, name, description, label_names)
+
+    def gauge(self, name:str, description:str, label_names:Sequence[str]=()) -> Gauge:
+        return self._register(Gauge, name, description, label_names)
+
+    def histogram(self, name:str, description:str, label_names:Sequence[str]=(), buckets:Sequence[float]=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, description, label_names, buckets)
+
+    def get(self, name:str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format
+
+        Returns:
+            str
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+# registry of the pipeline, which is exposed by the API
+REGISTRY = MetricsRegistry()
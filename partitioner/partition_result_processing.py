@@ -11,7 +11,7 @@ import subprocess
 import time
 from queue import Queue
 from threading import Thread
-from typing import Dict
+from typing import Dict, Optional
 
 import logger
 import numpy as np
@@ -19,6 +19,7 @@ from cutqc.distributor import distribute
 from cutqc.evaluator import mutate_measurement_basis
 from cutqc.helper_fun import get_dirname
 from cutqc.post_process import build, get_combinations
+from metrics.pipeline import enter_stage, leave_stage, merge_timestamps
 from qiskit_helper_functions.conversions import dict_to_array
 from qiskit_helper_functions.non_ibmq_functions import find_process_jobs
 from quantum_execution_job import Execution_Type, QuantumExecutionJob
@@ -28,12 +29,13 @@ class ResultWriter(Thread):
     """Stores the results of the sub-circuits of a partitioned execution on the disk and checks if the results are complete
     """
 
-    def __init__(self, input:Queue, completed_jobs:Queue, partition_dict:Dict, force_prob:bool=True) -> None:
+    def __init__(self, input:Queue, completed_jobs:Queue, partition_dict:Dict, force_prob:bool=True, error_queue:Optional[Queue]=None) -> None:
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._completed_jobs = completed_jobs
         self._partition_dict = partition_dict
         self._force_prob = force_prob
+        self._error_queue = error_queue
         self._result_count = {}
         Thread.__init__(self)
 
@@ -42,10 +44,35 @@ class ResultWriter(Thread):
         while True:
             job = self._input.get()
             self._log.debug(f"Got job with id {job.id}")
+            if job.parent not in self._partition_dict:
+                # another sub-job of the partitioned job failed
+                continue
+            if getattr(job, "error", None) is not None:
+                self._fail(job)
+                continue
             self._write(job)
+            # the sub-jobs passed the execution handler on behalf of the job
+            partition_info = self._partition_dict[job.parent]
+            partition_info["sub_job_timestamps"] = merge_timestamps({}, [partition_info.get("sub_job_timestamps", {}), job.timestamps])
             if self._results_complete(job):
                 self._log.info(f"All results are available for job {job.parent}")
-                self._completed_jobs.put(self._partition_dict[job.parent]["job"])
+                parent_job = partition_info["job"]
+                parent_job.timestamps = merge_timestamps(parent_job.timestamps, [partition_info["sub_job_timestamps"]])
+                self._completed_jobs.put(parent_job)
+
+    def _fail(self, job:QuantumExecutionJob):
+        """Fail the partitioned job of a failed sub-job and delete its stored files
+
+        Args:
+            job (QuantumExecutionJob): the sub-job with the error
+        """
+        parent_job = self._partition_dict.pop(job.parent)["job"]
+        self._result_count.pop(job.parent, None)
+        self._log.error(f"Sub-job {job.id} of job {job.parent} failed: {job.error}")
+        shutil.rmtree(f'./cutqc_data/{job.parent}', ignore_errors=True)
+        if self._error_queue is not None:
+            parent_job.error = job.error
+            self._error_queue.put(parent_job)
 
     def _results_complete(self, job:QuantumExecutionJob) -> bool:
         """Counts the number of sub-circuit results and checks if they are complete
@@ -135,6 +162,7 @@ class ResultProcessing(Thread):
         recursion_depth = 1
         while True:
             job = self._input.get()
+            enter_stage(job, "partition_results")
             self._log.info(f"Postprocess job {job.id}")
             self._measure(job, eval_mode, num_threads)
             self._organize(job, eval_mode, num_threads)
@@ -143,6 +171,7 @@ class ResultProcessing(Thread):
             reconstructed_prob = self.post_process(job, eval_mode, num_threads, early_termination, qubit_limit, recursion_depth)
             job.result_prob = self._createResult(reconstructed_prob)
             job.type = Execution_Type.partition
+            leave_stage(job, "partition_results")
             self._output.put(job)
             # self.verify(job, early_termination, num_threads, qubit_limit, eval_mode)
             self._partition_dict.pop(job.id)
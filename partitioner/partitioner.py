@@ -6,6 +6,7 @@ import logger
 from cutqc.cutter import find_cuts
 from cutqc.evaluator import generate_subcircuit_instances
 from cutqc.helper_fun import check_valid
+from metrics.pipeline import enter_stage, leave_stage
 from qiskit.circuit.quantumcircuit import QuantumCircuit
 from qiskit_helper_functions.non_ibmq_functions import apply_measurement
 from quantum_execution_job import Execution_Type, QuantumExecutionJob
@@ -31,9 +32,11 @@ class Partitioner(Thread):
             job = None
             try:
                 job = self._input.get()
+                enter_stage(job, "partitioner")
                 self._log.info(f"Searching for cut for job {job.id}")
                 sub_jobs = self._cut_job(job)
                 self._log.info(f"Found cut for job {job.id}: Generated {len(sub_jobs)} sub-jobs")
+                leave_stage(job, "partitioner")
                 for sub_job in sub_jobs:
                     self._output.put(sub_job)
             except (AssertionError, NoFeasibleCut) as e:
@@ -78,7 +81,7 @@ class Partitioner(Thread):
             List[QuantumExecutionJob]: List of QuantumExecutionJobs containing the sub-circuits that result from the partition
         """
         subcircuit_max_qubits, max_separate_circuits, max_cuts = self._get_cutting_parameters(qJob)
-        cut_solution, circ_dict, all_indexed_combinations = self._cut(qJob.circuit.remove_final_measurements(inplace=False), subcircuit_max_qubits, max_separate_circuits, max_cuts)
+        cut_solution, circ_dict, all_indexed_combinations = self._cut(qJob.bound_circuit().remove_final_measurements(inplace=False), subcircuit_max_qubits, max_separate_circuits, max_cuts)
         self._log.debug(f"Cut contains {len(circ_dict)} different sub-circuits")
         sub_jobs = []
         for key, circ_info in circ_dict.items():
@@ -1,28 +1,85 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Union
 from qiskit import QuantumCircuit
+from qiskit.circuit import Parameter
 from qiskit.result import Result
 from uuid import uuid4
 from enum import Enum
 
 
 
+def check_parameters(circuit:QuantumCircuit, parameters:Optional[Dict[str, float]]):
+    """Check that the parameter values match the parameters of the circuit
+
+    Args:
+        circuit (QuantumCircuit): the circuit or a parameterized template
+        parameters (Optional[Dict[str, float]]): values of the parameters by their names
+
+    Raises:
+        ValueError: a parameter of the circuit has no value or a value belongs to no parameter of the circuit
+    """
+    circuit_parameters = {parameter.name for parameter in circuit.parameters}
+    given_parameters = set(parameters.keys()) if parameters else set()
+    missing = circuit_parameters - given_parameters
+    if missing:
+        raise ValueError(f"Missing values for the parameters {sorted(missing)} of circuit {circuit.name}")
+    unknown = given_parameters - circuit_parameters
+    if unknown:
+        raise ValueError(f"Circuit {circuit.name} has no parameters {sorted(unknown)}")
+
+
 class Execution_Type(Enum):
     raw = 0
     aggregation = 1
     partition = 2
+    shard = 3
 
 class QuantumExecutionJob():
 
-    def __init__(self, circuit:QuantumCircuit, shots:int, type:Execution_Type=Execution_Type.raw, config:Dict={}, **kwargs) -> None:
+    def __init__(self, circuit:QuantumCircuit, shots:int, type:Execution_Type=Execution_Type.raw, config:Dict={}, parameters:Optional[Dict[Union[Parameter, str], float]]=None, **kwargs) -> None:
+        """
+        Args:
+            circuit (QuantumCircuit): the circuit to execute or a parameterized template
+            shots (int)
+            type (Execution_Type, optional): Defaults to Execution_Type.raw.
+            config (Dict, optional): Defaults to {}.
+            parameters (Optional[Dict[Union[Parameter, str], float]], optional): values of the parameters of the template. The template is transpiled once and the values are bound to the transpiled template. Defaults to None.
+
+        Raises:
+            ValueError: the parameter values do not match the parameters of the circuit
+        """
         self.id = uuid4().hex
         self.circuit = circuit
         self.shots = shots
         self.type = type
         self.config = config
+        # the parameters are identified by their names, since transpiled templates can be shared by jobs with different parameter objects
+        self.parameters = {str(parameter):value for parameter, value in parameters.items()} if parameters else None
+        if circuit is not None:
+            # a missing value would fail the binding in the stages of the pipeline
+            check_parameters(circuit, self.parameters)
         self._result:Optional[Result] = None
         self.result_prob:Optional[Dict] = None
+        # times when the job entered and left the stages of the pipeline, e.g. "transpiler_in"
+        self.timestamps:Dict[str, float] = {}
         self.__dict__.update(kwargs)
 
+    def bound_circuit(self, circuit:Optional[QuantumCircuit]=None) -> QuantumCircuit:
+        """Bind the parameter values of the job to the circuit
+
+        Args:
+            circuit (Optional[QuantumCircuit], optional): template with the same parameter names as the circuit of the job, e.g. the transpiled template. Defaults to the circuit of the job.
+
+        Returns:
+            QuantumCircuit: the bound circuit with the name of the circuit of the job. The circuit itself, if the job has no parameters.
+        """
+        if circuit is None:
+            circuit = self.circuit
+        if not self.parameters:
+            return circuit
+        bound_circuit = circuit.bind_parameters({parameter:self.parameters[parameter.name] for parameter in circuit.parameters})
+        bound_circuit.name = self.circuit.name
+        return bound_circuit
+
     @property
     def result(self) -> Optional[Result]:
         return self._result
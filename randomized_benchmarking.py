@@ -168,8 +168,9 @@ if __name__ == "__main__":
 
 
     agg_job_dict = {}
+    agg_job_table = {}
 
-    aggregator = Aggregator(input=input_pipeline, output=input_exec, job_dict=agg_job_dict, timeout=10)
+    aggregator = Aggregator(input=input_pipeline, output=input_exec, job_dict=agg_job_dict, job_table=agg_job_table, timeout=10)
     aggregator.start()
 
     exec_handler = ExecutionHandler(provider, input=input_exec, output=output_exec, batch_timeout=60, max_transpile_batch_size=float('inf'))
@@ -178,7 +179,7 @@ if __name__ == "__main__":
     result_analyzer = ResultAnalyzer(input=output_exec, output=output_pipline, output_agg=agg_results, output_part=None)
     result_analyzer.start()
 
-    aggregator_results = AggregatorResults(input=agg_results, output=output_pipline, job_dict=agg_job_dict)
+    aggregator_results = AggregatorResults(input=agg_results, output=output_pipline, job_dict=agg_job_dict, job_table=agg_job_table)
     aggregator_results.start()
 
     log.info("Started the Aggrgator pipeline")
@@ -13,6 +13,8 @@ class Backend_Data():
     def __init__(self, backend: Backend) -> None:
         self.name = backend.name()
         self.n_qubits = backend.configuration().n_qubits
+        self.coupling_map = backend.configuration().coupling_map
+        self.max_shots = backend.configuration().max_shots
         self.operational = backend.status().operational
         self.simulator = backend.configuration().simulator
         self.pending_jobs = backend.status().pending_jobs
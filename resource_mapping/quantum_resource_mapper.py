@@ -1,9 +1,10 @@
 import copy
 from queue import Queue
 from threading import Thread
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
 import logger
+from metrics.pipeline import enter_stage, leave_stage
 from quantum_execution_job import Execution_Type, QuantumExecutionJob
 
 from resource_mapping.backend_chooser import Backend_Chooser, Backend_Data
@@ -14,19 +15,21 @@ class NoSuitableMapping(Exception):
 
 class QuantumResourceMapper(Thread):
     
-    def __init__(self, input:Queue, output:Queue, output_agg:Queue, output_part:Queue, backend_chooser:Backend_Chooser, config:Dict=None, error_queue:Queue=None) -> None:
+    def __init__(self, input:Queue, output:Queue, output_agg:Queue, output_part:Queue, backend_chooser:Backend_Chooser, config:Dict=None, error_queue:Queue=None, output_shard:Optional[Queue]=None) -> None:
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._output_agg = output_agg
         self._output_part = output_part
+        self._output_shard = output_shard
         self._backend_chooser = backend_chooser
         self._error_queue = error_queue
         self._config_dict = {
             "execution_types":{
                 "raw":True,
                 "aggregation":True,
-                "partition":True
+                "partition":True,
+                "shard":False
             },
             "optimization_goal":"high_throughput"
         }
@@ -57,11 +60,19 @@ class QuantumResourceMapper(Thread):
         mod_none = config["execution_types"]["raw"]
         mod_agg = config["execution_types"]["aggregation"]
         mod_part = config["execution_types"]["partition"]
+        mod_shard = config["execution_types"].get("shard", False) and self._output_shard is not None
         optimization_goal = config["optimization_goal"]
         n_qubits = job.circuit.num_qubits
         config_bc = None
         if "backend_chooser" in job.config["quantum_resource_mapper"].keys():
             config_bc = job.config["quantum_resource_mapper"]["backend_chooser"]
+        if mod_shard:
+            # opt-in: spread the shots of jobs that exceed the maximal shots of the backend over multiple backends or job slots
+            backend_record = self._backend_chooser.get_least_busy(filter_dict=config_bc, filter_func=lambda x: x.n_qubits>=n_qubits)
+            if backend_record:
+                backend_name, backend_data = backend_record
+                if job.shots > backend_data.max_shots:
+                    return Execution_Type.shard, backend_data
         if optimization_goal == "high_throughput":
             # aggregation > none > partition
             if mod_agg:
@@ -107,20 +118,25 @@ class QuantumResourceMapper(Thread):
         self._log.info("Started QuantumResourceMapper")
         while True:
             job:QuantumExecutionJob = self._input.get()
+            enter_stage(job, "mapper")
             self._log.debug(f"Got job {job.id}")
             try:
                 mod_type, backend_data = self.decide_action(job)
                 job.backend_data = backend_data
+                leave_stage(job, "mapper")
                 self._log.info(f"Mod.Type = {mod_type}, Backend = {backend_data.name}")
                 if mod_type == Execution_Type.aggregation:
                     self._output_agg.put(job)
                 elif mod_type == Execution_Type.partition:
                     self._output_part.put(job)
+                elif mod_type == Execution_Type.shard:
+                    self._output_shard.put(job)
                 else:
                     self._output.put(job)
             except NoSuitableMapping:
                 self._log.debug(f"No suitable modification type for job {job.id}")
                 if self._error_queue is not None:
+                    job.error = "No suitable mapping"
                     self._error_queue.put(job)
                 
             
@@ -1,5 +1,6 @@
 from queue import Queue
 from threading import Thread
+from typing import Optional
 
 import logger
 from quantum_execution_job import Execution_Type, QuantumExecutionJob
@@ -9,12 +10,13 @@ class ResultAnalyzer(Thread):
     """Routes the results based on their execution type
     """
     
-    def __init__(self, input:Queue, output:Queue, output_agg:Queue, output_part:Queue) -> None:
+    def __init__(self, input:Queue, output:Queue, output_agg:Queue, output_part:Queue, output_shard:Optional[Queue]=None) -> None:
         self._log = logger.get_logger(type(self).__name__)
         self._input = input
         self._output = output
         self._output_agg = output_agg
         self._output_part = output_part
+        self._output_shard = output_shard
         Thread.__init__(self)
         self._log.info("Init ResultAnalyzer")
 
@@ -32,5 +34,7 @@ class ResultAnalyzer(Thread):
             elif job.type == Execution_Type.partition:
                 #self._log.debug(f"Put job {job.id} in partition queue")
                 self._output_part.put(job)
+            elif job.type == Execution_Type.shard:
+                self._output_shard.put(job)
             else:
                 self._log.error("Unkown Execution_Type")
@@ -0,0 +1,179 @@
+import math
+from collections import Counter
+from queue import Queue
+from threading import Thread
+from typing import Any, Dict, List, Optional
+
+import logger
+import numpy as np
+from metrics.pipeline import enter_stage, leave_stage, merge_timestamps
+from qiskit.result import Result
+from qiskit.result.models import ExperimentResult, ExperimentResultData
+from quantum_execution_job import Execution_Type, QuantumExecutionJob
+from resource_mapping.backend_chooser import Backend_Chooser, Backend_Data
+
+
+class ShotSharder(Thread):
+    """Splits the shots of a job into shards, which are executed in parallel on several compatible backends or in several job slots of one backend
+    """
+
+    def __init__(self, input:Queue, output:Queue, shard_dict:Dict, backend_chooser:Backend_Chooser, max_shards:int=4) -> None:
+        """
+        Args:
+            input (Queue): jobs to shard
+            output (Queue): shard jobs for the execution
+            shard_dict (Dict): shared with the ShardResults to merge the results of the shards
+            backend_chooser (Backend_Chooser)
+            max_shards (int, optional): maximal number of shards per job. Defaults to 4.
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        self._input = input
+        self._output = output
+        self._shard_dict = shard_dict
+        self._backend_chooser = backend_chooser
+        self._max_shards = max_shards
+        Thread.__init__(self)
+        self._log.info("Init")
+
+    def _select_backends(self, job:QuantumExecutionJob) -> List[Backend_Data]:
+        """Select the compatible backends for the shards of the job, ordered by their number of pending jobs.
+        The backend chosen by the QuantumResourceMapper is always the first one.
+
+        Args:
+            job (QuantumExecutionJob)
+
+        Returns:
+            List[Backend_Data]
+        """
+        n_qubits = job.circuit.num_qubits
+        config_bc = None
+        if "quantum_resource_mapper" in job.config.keys():
+            config_bc = job.config["quantum_resource_mapper"].get("backend_chooser")
+        backends = self._backend_chooser.get_backends(filter_dict=config_bc, filter_func=lambda x: x.n_qubits>=n_qubits and x.operational and x.status_msg == "active" and x.active_jobs < x.maximum_jobs)
+        backends = sorted([backend for name, backend in backends.items() if name != job.backend_data.name], key=lambda backend:backend.pending_jobs)
+        return [job.backend_data] + backends
+
+    def _shard(self, job:QuantumExecutionJob) -> List[QuantumExecutionJob]:
+        """Split the job into shards. If there are less compatible backends than shards, the backends get multiple shards, which are submitted as separate jobs.
+
+        Args:
+            job (QuantumExecutionJob)
+
+        Returns:
+            List[QuantumExecutionJob]: the shard jobs
+        """
+        backends = self._select_backends(job)
+        n_shards = max(1, min(self._max_shards, math.ceil(job.shots/job.backend_data.max_shots)))
+        shots, remainder = divmod(job.shots, n_shards)
+        shard_jobs = []
+        for index in range(n_shards):
+            backend_data = backends[index % len(backends)]
+            shard_shots = shots + (1 if index < remainder else 0)
+            shard_jobs.append(QuantumExecutionJob(job.circuit, shots=shard_shots, type=Execution_Type.shard, parameters=job.parameters, parent=job.id, shard_index=index,
+                                                  backend_data=backend_data, memory=getattr(job, "memory", False), dedicated_batch=True))
+        self._shard_dict[job.id] = {"job":job, "n_shards":n_shards, "shards":{}}
+        return shard_jobs
+
+    def run(self) -> None:
+        self._log.info("Started")
+        while True:
+            job = self._input.get()
+            enter_stage(job, "sharder")
+            shard_jobs = self._shard(job)
+            leave_stage(job, "sharder")
+            self._log.info(f"Split job {job.id} with {job.shots} shots into {len(shard_jobs)} shards on the backends {[shard_job.backend_data.name for shard_job in shard_jobs]}")
+            for shard_job in shard_jobs:
+                self._output.put(shard_job)
+
+
+class ShardResults(Thread):
+    """Merges the results of the shards of a job, once all shards are executed
+    """
+
+    def __init__(self, input:Queue, output:Queue, shard_dict:Dict, error_queue:Optional[Queue]=None) -> None:
+        """
+        Args:
+            input (Queue): executed shard jobs and failed shard jobs with an error
+            output (Queue): jobs with the merged results
+            shard_dict (Dict): shared with the ShotSharder
+            error_queue (Optional[Queue], optional): receives the jobs with a failed shard. Defaults to None.
+        """
+        self._log = logger.get_logger(type(self).__name__)
+        self._input = input
+        self._output = output
+        self._shard_dict = shard_dict
+        self._error_queue = error_queue
+        Thread.__init__(self)
+        self._log.info("Init")
+
+    def _merge(self, job:QuantumExecutionJob, shard_jobs:List[QuantumExecutionJob]) -> Result:
+        """Merge the counts and the memory of the shards. The memory is ordered by the shard index.
+
+        Args:
+            job (QuantumExecutionJob): the initial job
+            shard_jobs (List[QuantumExecutionJob]): the executed shards ordered by their index
+
+        Returns:
+            Result: the result of the initial job
+        """
+        experiment_results = [shard_job.result.results[0] for shard_job in shard_jobs]
+        counts = Counter()
+        for experiment_result in experiment_results:
+            counts.update(experiment_result.data.counts)
+        data = ExperimentResultData(counts=dict(counts))
+        if all(getattr(experiment_result.data, "memory", None) is not None for experiment_result in experiment_results):
+            data = ExperimentResultData(counts=dict(counts), memory=np.concatenate([np.asarray(experiment_result.data.memory) for experiment_result in experiment_results]).tolist())
+        template = experiment_results[0]
+        experiment_result = ExperimentResult(shots=job.shots, success=all(experiment_result.success for experiment_result in experiment_results), data=data,
+                                             meas_level=template.meas_level, status=getattr(template, "status", None), header=getattr(template, "header", None))
+        result = shard_jobs[0].result
+        return Result(backend_name=result.backend_name, backend_version=result.backend_version, qobj_id=result.qobj_id, job_id=result.job_id,
+                      success=all(shard_job.result.success for shard_job in shard_jobs), results=[experiment_result], date=getattr(result, "date", None),
+                      status=getattr(result, "status", None), header=getattr(result, "header", None))
+
+    def _shard_info(self, shard_jobs:List[QuantumExecutionJob]) -> List[Dict[str, Any]]:
+        """Provenance of the shards, e.g. to check the results for calibration mismatches between the backends
+
+        Args:
+            shard_jobs (List[QuantumExecutionJob]): the executed shards ordered by their index
+
+        Returns:
+            List[Dict[str, Any]]: backend, shots and counts of each shard
+        """
+        return [{"backend":shard_job.backend_data.name, "shots":shard_job.shots, "job_id":shard_job.result.job_id, "counts":shard_job.result.get_counts()} for shard_job in shard_jobs]
+
+    def _fail(self, shard_job:QuantumExecutionJob):
+        """Fail the job of a failed shard. The other shards of the job are discarded.
+
+        Args:
+            shard_job (QuantumExecutionJob): the shard with the error
+        """
+        job = self._shard_dict.pop(shard_job.parent)["job"]
+        self._log.error(f"Shard {shard_job.shard_index} of job {job.id} failed: {shard_job.error}")
+        if self._error_queue is not None:
+            job.error = shard_job.error
+            self._error_queue.put(job)
+
+    def run(self) -> None:
+        self._log.info("Started")
+        while True:
+            shard_job = self._input.get()
+            record = self._shard_dict.get(shard_job.parent)
+            if record is None:
+                # another shard of the job failed
+                continue
+            if getattr(shard_job, "error", None) is not None:
+                self._fail(shard_job)
+                continue
+            record["shards"][shard_job.shard_index] = shard_job
+            if len(record["shards"]) < record["n_shards"]:
+                continue
+            self._shard_dict.pop(shard_job.parent)
+            job = record["job"]
+            shard_jobs = [record["shards"][index] for index in range(record["n_shards"])]
+            job.result = self._merge(job, shard_jobs)
+            job.shards = self._shard_info(shard_jobs)
+            # the shards passed the execution handler on behalf of the job
+            job.timestamps = merge_timestamps(job.timestamps, [shard_job.timestamps for shard_job in shard_jobs])
+            self._log.info(f"Merged {len(shard_jobs)} shards of job {job.id}")
+            self._output.put(job)
@@ -0,0 +1,97 @@
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("qiskit")
+
+from qiskit.circuit.random import random_circuit
+from quantum_execution_job import QuantumExecutionJob
+
+from aggregator.aggregator import (Aggregator, AggregatorResults, _count_states,
+                                   _decode_counts, _marginal_states,
+                                   _rescale_counts)
+
+
+def test_decode_counts():
+    states, state_counts = _decode_counts({"0x0":3, "0x5":7, "0xf":1}, 4)
+    assert states.dtype == np.uint64
+    assert states.tolist() == [0, 5, 15]
+    assert state_counts.tolist() == [3, 7, 1]
+
+
+def test_decode_counts_empty():
+    states, state_counts = _decode_counts({}, 4)
+    assert len(states) == 0
+    assert len(state_counts) == 0
+
+
+def test_decode_counts_wide_states():
+    wide_state = (1 << 70) + 3
+    states, state_counts = _decode_counts({hex(wide_state):2, "0x1":4}, 71)
+    assert states.dtype == object
+    assert states.tolist() == [wide_state, 1]
+    assert state_counts.tolist() == [2, 4]
+
+
+def test_marginal_counts():
+    # two circuits with the classical bits [0, 2) and [2, 5)
+    states, state_counts = _decode_counts({"0x5":3, "0x6":2, "0x1d":5}, 5)
+    marginal_states = _marginal_states(states, [0, 2], [2, 5])
+    assert _count_states(marginal_states[0], state_counts) == {"0x1":8, "0x2":2}
+    assert _count_states(marginal_states[1], state_counts) == {"0x1":5, "0x7":5}
+
+
+def test_rescale_counts():
+    counts = _rescale_counts({"0x0":500, "0x1":300, "0x2":200, "0x3":24}, 100)
+    assert sum(counts.values()) == 100
+    assert counts == {"0x0":49, "0x1":29, "0x2":20, "0x3":2}
+
+
+def _job(n_qubits, backend_data, shots=1000):
+    return QuantumExecutionJob(random_circuit(n_qubits, 2, measure=True, seed=n_qubits), shots=shots, backend_data=backend_data)
+
+
+def _aggregator(fill_ratio):
+    return Aggregator(Queue(), Queue(), job_dict={}, job_table={}, timeout=60, fill_ratio=fill_ratio)
+
+
+def test_flush_at_fill_ratio():
+    backend_data = SimpleNamespace(name="backend", n_qubits=10, coupling_map=None)
+    aggregator = _aggregator(0.8)
+    aggregator._add_job(_job(4, backend_data))
+    aggregator._add_job(_job(3, backend_data))
+    assert aggregator._output.empty()
+    aggregator._add_job(_job(1, backend_data))
+    agg_job = aggregator._output.get_nowait()
+    assert agg_job.circuit.num_qubits == 8
+    assert aggregator._output.empty()
+    assert "backend" not in aggregator._jobs_to_aggregate
+
+
+def test_flush_keeps_unfilled_bins_waiting():
+    backend_data = SimpleNamespace(name="backend", n_qubits=10, coupling_map=None)
+    aggregator = _aggregator(0.8)
+    for n_qubits in (6, 3, 2):
+        aggregator._add_job(_job(n_qubits, backend_data))
+    # 6+3 qubits fill the backend, the job with 2 qubits waits for further jobs
+    agg_job = aggregator._output.get_nowait()
+    assert agg_job.circuit.num_qubits == 9
+    assert [job.circuit.num_qubits for job in aggregator._jobs_to_aggregate["backend"]] == [2]
+
+
+def test_failed_aggregated_job_fails_initial_jobs():
+    jobs = {job_id:SimpleNamespace(id=job_id) for job_id in ["a", "b"]}
+    agg_job = SimpleNamespace(id="agg", error="backend failed")
+    input, output, error_queue = Queue(), Queue(), Queue()
+    job_dict = {"agg":SimpleNamespace(job_ids=["a", "b"])}
+    aggregator_results = AggregatorResults(input, output, job_dict, dict(jobs), error_queue=error_queue)
+    aggregator_results.daemon = True
+    aggregator_results.start()
+    input.put(agg_job)
+    failed_jobs = [error_queue.get(timeout=10), error_queue.get(timeout=10)]
+    assert [job.id for job in failed_jobs] == ["a", "b"]
+    assert all(job.error == "backend failed" for job in failed_jobs)
+    assert job_dict == {}
+    assert output.empty()
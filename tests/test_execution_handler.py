@@ -0,0 +1,199 @@
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("qiskit")
+
+from execution_handler.execution_handler import (Batch, Batcher,
+                                               ResultProcessor, Retriever,
+                                               Submitter, Transpiler,
+                                               shot_bucket)
+from qiskit.providers.jobstatus import JobStatus
+from qiskit.result import Result
+
+
+@pytest.mark.parametrize("shots, max_shots, bucket", [
+    (1000, 8192, 1000),
+    (5000, 8192, 5000),
+    (8192, 8192, 8192),
+    (0, 8192, 1),
+    # 2 repetitions with 10000 shots
+    (20000, 10000, 10000),
+    # 3 repetitions with 7000 shots
+    (21000, 8192, 7000),
+    # 20011 is prime, the last repetition is trimmed
+    (20011, 8192, 8192),
+])
+def test_shot_bucket(shots, max_shots, bucket):
+    assert shot_bucket(shots, max_shots) == bucket
+
+
+def test_shot_bucket_covers_shots():
+    for shots in range(1, 30000, 97):
+        bucket = shot_bucket(shots, 8192)
+        assert bucket <= 8192
+        assert bucket >= shots or shots % bucket == 0 or bucket == 8192
+
+
+def test_add_circuit_splits_into_pieces():
+    batch = Batch("backend", 8192, 3, 1000)
+    remaining_shots = batch.add_circuit("a", None, 5000)
+    assert remaining_shots == 2000
+    assert batch.experiments[0]["reps"] == 3
+    assert batch.experiments[0]["shots"] == 3000
+    assert batch.remaining_experiments == 0
+
+
+def test_merge_multiples_as_repetitions():
+    batch = Batch("backend", 8192, 10, 1000)
+    batch.add_circuit("a", None, 1000)
+    other = Batch("backend", 8192, 10, 3000)
+    other.add_circuit("b", None, 3000)
+    # 3000 shots are executed as 3 repetitions with 1000 shots
+    assert batch.merge(other)
+    assert batch.experiments[-1]["reps"] == 3
+    assert batch.experiments[-1]["shots"] == 3000
+    assert batch.remaining_experiments == 6
+
+    other = Batch("backend", 8192, 10, 1500)
+    other.add_circuit("c", None, 1500)
+    # 1500 shots would be executed with 2000 shots
+    assert not batch.merge(other)
+    assert len(batch.experiments) == 2
+
+
+def test_batcher_merges_multiples_on_timeout():
+    look_up = SimpleNamespace(max_shots=lambda backend_name: 8192, max_experiments=lambda backend_name: 10)
+    output = Queue()
+    batcher = Batcher(Queue(), output, {}, look_up, batch_timeout=0)
+    for job_id, shots in [("a", 1000), ("b", 2000), ("c", 1500)]:
+        batcher._add_to_batch(None, SimpleNamespace(id=job_id, shots=shots, backend_data=SimpleNamespace(name="backend")))
+    batcher._check_timers()
+    batches = [output.get_nowait() for _ in range(output.qsize())]
+    # the 2000 shots are merged into the batch with 1000 shots, the 1500 shots are not a multiple
+    assert sorted((batch.shots, [exp["key"] for exp in batch.experiments]) for batch in batches) == [(1000, ["a", "b"]), (1500, ["c"])]
+
+
+def test_transpile_chunks_without_layouts():
+    tasks = []
+    def transpile(chunk_tasks):
+        tasks.extend(chunk_tasks)
+        return [chunk_task[0] for chunk_task in chunk_tasks]
+    transpiler = Transpiler(Queue(), Queue(), None, 1, pool=SimpleNamespace(transpile=transpile), pool_size=2)
+    snapshot = SimpleNamespace(basis_gates=["cx"], coupling_map=None, properties=None)
+    circuits = ["a", "b", "c", "d"]
+    assert transpiler._transpile_circuits(snapshot, circuits, [[0, 1], None, None, None]) == circuits
+    # a chunk without layouts must not pass a list of Nones, which is read as a single layout
+    assert [task[-1] for task in tasks] == [[[0, 1], None], None]
+
+
+def _batch(backend_name, batch_number, key):
+    batch = Batch(backend_name, 8192, 10, 100)
+    batch.add_circuit(key, None, 100)
+    batch.batch_number = batch_number
+    return batch
+
+
+def test_submitter_submits_deferred_batches_when_a_slot_is_freed():
+    slots = {"free":1}
+    listeners = []
+    def try_to_enter(backend_name):
+        if slots["free"] == 0:
+            return False
+        slots["free"] -= 1
+        return True
+    control = SimpleNamespace(add_listener=listeners.append, try_to_enter=try_to_enter)
+    look_up = SimpleNamespace(get=lambda backend_name: SimpleNamespace(run=lambda qobj: "job"))
+    input, output = Queue(), Queue()
+    submitter = Submitter(input, output, look_up, control, defer_interval=60)
+    submitter._assembly_cache = SimpleNamespace(assemble=lambda experiments, backend, shots: "qobj", hits=0, misses=0)
+    submitter.daemon = True
+    submitter.start()
+    input.put(_batch("backend", 0, "a"))
+    input.put(_batch("backend", 1, "b"))
+    assert output.get(timeout=10)[0].batch_number == 0
+    assert output.empty()
+    slots["free"] = 1
+    listeners[0]("backend")
+    assert output.get(timeout=10)[0].batch_number == 1
+    # the signals do not pass the queue of the batches
+    assert input.empty()
+
+
+def _submitter(run, error_queue=None, quantum_job_table=None):
+    left = []
+    control = SimpleNamespace(add_listener=lambda listener: None, try_to_enter=lambda backend_name: True, leave=left.append)
+    look_up = SimpleNamespace(get=lambda backend_name: SimpleNamespace(run=run))
+    input, output = Queue(), Queue()
+    submitter = Submitter(input, output, look_up, control, defer_interval=0.01, quantum_job_table=quantum_job_table, error_queue=error_queue)
+    submitter._assembly_cache = SimpleNamespace(assemble=lambda experiments, backend, shots: "qobj", hits=0, misses=0)
+    submitter.daemon = True
+    submitter.start()
+    return submitter, input, output, left
+
+
+def test_submitter_retries_failed_submissions():
+    tries = []
+    def run(qobj):
+        tries.append(qobj)
+        if len(tries) < 3:
+            raise RuntimeError("job limit reached")
+        return "job"
+    _, input, output, left = _submitter(run)
+    input.put(_batch("backend", 0, "a"))
+    assert output.get(timeout=10)[1] == "job"
+    # the slots of the failed submissions are released
+    assert left == ["backend", "backend"]
+
+
+def test_submitter_fails_jobs_of_unsubmittable_batches():
+    def run(qobj):
+        raise RuntimeError("job limit reached")
+    error_queue = Queue()
+    quantum_job_table = {"a":SimpleNamespace(id="a")}
+    _, input, output, left = _submitter(run, error_queue, quantum_job_table)
+    input.put(_batch("backend", 0, "a"))
+    job = error_queue.get(timeout=10)
+    assert job.id == "a" and job.error == "job limit reached"
+    assert quantum_job_table == {}
+    assert len(left) == 3
+    assert output.empty()
+
+
+def test_retriever_backs_off_until_the_status_changes():
+    retriever = Retriever(Queue(), Queue(), wait_time=30, backend_control=None, min_wait_time=1)
+    job_tuple = ("batch", "job")
+    intervals = [retriever._poll_interval(job_tuple, JobStatus.QUEUED, None) for _ in range(7)]
+    assert intervals == [1, 2, 4, 8, 16, 30, 30]
+    assert retriever._poll_interval(job_tuple, JobStatus.RUNNING, None) == 1
+    assert retriever._poll_interval(job_tuple, JobStatus.RUNNING, None) == 2
+    # queued jobs with a known position are checked according to their position
+    assert retriever._poll_interval(("batch", "other"), JobStatus.QUEUED, 4) == 5
+
+
+def _job_result(batch, state):
+    experiments = [SimpleNamespace(success=True, meas_level=2, status=None, header=None, data=SimpleNamespace(memory=[state]*batch.shots))
+                   for exp in batch.experiments for _ in range(exp["reps"])]
+    job_result = Result(backend_name="backend", backend_version="1", qobj_id="qobj", job_id="job", success=True, results=experiments)
+    return SimpleNamespace(result=lambda: job_result)
+
+
+def test_result_processor_merges_timestamps_of_all_pieces():
+    first = Batch("backend", 8192, 3, 1000)
+    remaining_shots = first.add_circuit("a", None, 5000)
+    second = Batch("backend", 8192, 3, 1000)
+    second.add_circuit("a", None, remaining_shots, 5000)
+    first.timestamps = {"submitter_in":1, "submitter_out":2}
+    second.timestamps = {"submitter_in":3, "submitter_out":4}
+    input, output = Queue(), Queue()
+    result_processor = ResultProcessor(input, output, {"a":SimpleNamespace(id="a", timestamps={})})
+    result_processor.daemon = True
+    result_processor.start()
+    input.put((first, _job_result(first, "0")))
+    input.put((second, _job_result(second, "1")))
+    qjob = output.get(timeout=10)
+    assert qjob.result.get_counts() == {"0":3000, "1":2000}
+    # the job spans from the first to the last batch with a piece of its circuit
+    assert qjob.timestamps["submitter_in"] == 1
+    assert qjob.timestamps["submitter_out"] == 4
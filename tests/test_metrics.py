@@ -0,0 +1,70 @@
+import pytest
+
+from metrics.pipeline import merge_timestamps
+from metrics.registry import MetricsRegistry
+
+
+def test_counter_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Number of jobs", ["stage"])
+    counter.inc(stage="transpiler")
+    counter.inc(5, stage="transpiler")
+    assert counter.get(stage="transpiler") == 6
+    assert registry.render() == "# HELP jobs_total Number of jobs\n# TYPE jobs_total counter\njobs_total{stage=\"transpiler\"} 6\n"
+
+
+def test_gauge_render():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("queue_depth", "Depth of the queue")
+    gauge.set(3)
+    gauge.inc(-1)
+    assert registry.render() == "# HELP queue_depth Depth of the queue\n# TYPE queue_depth gauge\nqueue_depth 2\n"
+
+
+def test_float_format():
+    registry = MetricsRegistry()
+    registry.gauge("ratio", "Ratio").set(0.5)
+    assert registry.render().endswith("ratio 0.5\n")
+
+
+def test_histogram_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("seconds", "Seconds", buckets=[1, 0.1])
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(2)
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE seconds histogram"
+    assert lines[2:] == [
+        "seconds_bucket{le=\"0.1\"} 1",
+        "seconds_bucket{le=\"1\"} 2",
+        "seconds_bucket{le=\"+Inf\"} 3",
+        "seconds_sum 2.55",
+        "seconds_count 3",
+    ]
+
+
+def test_label_escaping():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors", ["message"]).inc(message="a \"quoted\"\\path\nline")
+    assert "errors_total{message=\"a \\\"quoted\\\"\\\\path\\nline\"} 1" in registry.render()
+
+
+def test_register_twice():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Number of jobs")
+    assert registry.counter("jobs_total", "Number of jobs") is counter
+    assert registry.get("jobs_total") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("jobs_total", "Number of jobs")
+
+
+def test_merge_timestamps():
+    sub_timestamps = [{"transpiler_in":2, "transpiler_out":3}, {"transpiler_in":1, "transpiler_out":4}]
+    merged = merge_timestamps({"sharder_in":0, "sharder_out":1}, sub_timestamps)
+    assert merged == {"sharder_in":0, "sharder_out":1, "transpiler_in":1, "transpiler_out":4}
+
+
+def test_merge_timestamps_own_precedence():
+    # e.g. a job keeps the batcher timestamps of its own stage
+    assert merge_timestamps({"batcher_in":5}, [{"batcher_in":1, "batcher_out":6}]) == {"batcher_in":5, "batcher_out":6}
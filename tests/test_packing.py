@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("qiskit")
+
+from aggregator.packing import cluster_by_shots, first_fit_decreasing
+
+
+def test_first_fit_decreasing():
+    bins = first_fit_decreasing([2, 5, 3, 1, 4], 5, width=lambda job: job)
+    assert bins == [[5], [4, 1], [3, 2]]
+    assert all(sum(packed) <= 5 for packed in bins)
+
+
+def test_first_fit_decreasing_wide_jobs():
+    # jobs wider than the capacity get a bin on their own
+    assert first_fit_decreasing([7, 2, 1], 5, width=lambda job: job) == [[7], [2, 1]]
+
+
+def test_first_fit_decreasing_empty():
+    assert first_fit_decreasing([], 5, width=lambda job: job) == []
+
+
+def test_cluster_by_shots():
+    jobs = [SimpleNamespace(shots=shots) for shots in [100, 1000, 150, 400, 900, 250]]
+    clusters = cluster_by_shots(jobs, 2)
+    assert [[job.shots for job in cluster] for cluster in clusters] == [[1000, 900], [400, 250], [150, 100]]
+
+
+def test_cluster_by_shots_single_cluster():
+    jobs = [SimpleNamespace(shots=shots) for shots in [100, 300, 200]]
+    assert [[job.shots for job in cluster] for cluster in cluster_by_shots(jobs, 4)] == [[300, 200, 100]]
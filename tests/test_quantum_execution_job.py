@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("qiskit")
+
+from qiskit import QuantumCircuit
+from qiskit.circuit import Parameter
+
+from quantum_execution_job import QuantumExecutionJob
+
+
+def _template():
+    circuit = QuantumCircuit(1, 1, name="template")
+    circuit.rx(Parameter("theta"), 0)
+    circuit.measure(0, 0)
+    return circuit
+
+
+def test_bound_circuit():
+    job = QuantumExecutionJob(_template(), shots=100, parameters={"theta":0.5})
+    bound_circuit = job.bound_circuit()
+    assert len(bound_circuit.parameters) == 0
+    assert bound_circuit.name == "template"
+
+
+@pytest.mark.parametrize("parameters", [None, {}, {"phi":0.5}, {"theta":0.5, "phi":0.5}])
+def test_reject_mismatching_parameters(parameters):
+    with pytest.raises(ValueError):
+        QuantumExecutionJob(_template(), shots=100, parameters=parameters)
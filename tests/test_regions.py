@@ -0,0 +1,50 @@
+from aggregator.regions import allocate_regions
+
+# 0 - 1 - 2
+# |   |   |
+# 3 - 4 - 5
+GRID = [[0, 1], [1, 2], [0, 3], [1, 4], [2, 5], [3, 4], [4, 5]]
+LINE = [[0, 1], [1, 0], [1, 2], [2, 1], [2, 3], [3, 2], [3, 4], [4, 3]]
+
+
+def _is_connected(region, coupling_map):
+    edges = {frozenset(edge) for edge in coupling_map}
+    reached = {region[0]}
+    changed = True
+    while changed:
+        changed = False
+        for qubit in region:
+            if qubit not in reached and any(frozenset((qubit, other)) in edges for other in reached):
+                reached.add(qubit)
+                changed = True
+    return reached == set(region)
+
+
+def test_allocate_regions_disjoint_and_connected():
+    sizes = [2, 3, 1]
+    regions = allocate_regions(GRID, 6, sizes)
+    assert [len(region) for region in regions] == sizes
+    qubits = [qubit for region in regions for qubit in region]
+    assert len(qubits) == len(set(qubits))
+    assert all(_is_connected(region, GRID) for region in regions)
+
+
+def test_allocate_regions_too_many_qubits():
+    assert allocate_regions(GRID, 6, [4, 3]) is None
+
+
+def test_allocate_regions_backtracks():
+    # a region of size 2 in the middle of the line would split the free qubits into two parts of size 1 and 2
+    regions = allocate_regions(LINE, 5, [2, 3])
+    assert regions is not None
+    assert all(_is_connected(region, LINE) for region in regions)
+
+
+def test_allocate_regions_no_connected_region():
+    assert allocate_regions([[0, 1], [2, 3]], 4, [3]) is None
+
+
+def test_allocate_regions_region_cost():
+    # the cheapest region consists of the qubits with the highest indices
+    regions = allocate_regions(LINE, 5, [2], region_cost=lambda region: -sum(region))
+    assert sorted(regions[0]) == [3, 4]
@@ -0,0 +1,61 @@
+import time
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("qiskit")
+
+from qiskit.result import Result
+from quantum_execution_job import QuantumExecutionJob
+
+from sharding.sharder import ShardResults
+
+
+def _result(counts, shots):
+    return Result.from_dict({"backend_name":"backend", "backend_version":"1", "qobj_id":"qobj", "job_id":"job", "success":True,
+                             "results":[{"shots":shots, "success":True, "data":{"counts":counts}}]})
+
+
+def _shard(index, shots, counts=None, error=None):
+    shard_job = SimpleNamespace(parent="job", shard_index=index, shots=shots, backend_data=SimpleNamespace(name="backend"), timestamps={})
+    if counts is not None:
+        shard_job.result = _result(counts, shots)
+    if error is not None:
+        shard_job.error = error
+    return shard_job
+
+
+def _shard_results():
+    job = QuantumExecutionJob(None, shots=300)
+    job.id = "job"
+    shard_dict = {"job":{"job":job, "n_shards":2, "shards":{}}}
+    input, output, error_queue = Queue(), Queue(), Queue()
+    shard_results = ShardResults(input, output, shard_dict, error_queue=error_queue)
+    shard_results.daemon = True
+    shard_results.start()
+    return input, output, error_queue, shard_dict
+
+
+def test_merge_shards():
+    input, output, _, shard_dict = _shard_results()
+    input.put(_shard(1, 100, {"0x0":40, "0x1":60}))
+    input.put(_shard(0, 200, {"0x0":150, "0x1":50}))
+    job = output.get(timeout=10)
+    assert job.result.get_counts() == {"0":190, "1":110}
+    assert [shard["shots"] for shard in job.shards] == [200, 100]
+    assert shard_dict == {}
+
+
+def test_failed_shard_fails_job():
+    input, output, error_queue, shard_dict = _shard_results()
+    input.put(_shard(0, 200, error="backend failed"))
+    input.put(_shard(1, 100, {"0x0":40, "0x1":60}))
+    job = error_queue.get(timeout=10)
+    assert job.id == "job" and job.error == "backend failed"
+    assert shard_dict == {}
+    # the remaining shard of the failed job is discarded
+    while not input.empty():
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert output.empty()
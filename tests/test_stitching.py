@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("qiskit")
+
+from qiskit import QuantumCircuit
+
+from aggregator.stitching import RegionTranspiler
+
+# 0 - 1 - 2 - 3
+LINE = [[0, 1], [1, 0], [1, 2], [2, 1], [2, 3], [3, 2]]
+
+
+def _circuit():
+    circuit = QuantumCircuit(2, 2)
+    circuit.h(0)
+    circuit.cx(0, 1)
+    circuit.measure([0, 1], [0, 1])
+    return circuit
+
+
+def test_region_transpiler_shares_regions_with_the_same_coupling_map():
+    snapshot = SimpleNamespace(version=("1", "a"), coupling_map=LINE, basis_gates=["cx", "rz", "sx", "x"])
+    region_transpiler = RegionTranspiler(SimpleNamespace(snapshot=lambda backend_name: snapshot))
+    transpiled_circuits = region_transpiler.transpile([_circuit(), _circuit()], "backend", [[0, 1], [2, 3]])
+    assert [circuit.num_qubits for circuit in transpiled_circuits] == [2, 2]
+    assert (region_transpiler.hits, region_transpiler.misses) == (1, 1)
+    # a recalibration invalidates the cached circuits
+    snapshot = SimpleNamespace(version=("1", "b"), coupling_map=LINE, basis_gates=["cx", "rz", "sx", "x"])
+    region_transpiler.transpile([_circuit()], "backend", [[1, 2]])
+    assert (region_transpiler.hits, region_transpiler.misses) == (1, 2)
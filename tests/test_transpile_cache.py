@@ -0,0 +1,56 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("qiskit")
+
+from qiskit import QuantumCircuit
+
+from execution_handler.transpile_cache import TranspileCache
+
+
+def _circuit(n_qubits):
+    circuit = QuantumCircuit(n_qubits, n_qubits)
+    circuit.h(0)
+    circuit.measure(range(n_qubits), range(n_qubits))
+    return circuit
+
+
+def test_key_depends_on_backend_version():
+    cache = TranspileCache()
+    circuit = _circuit(2)
+    assert cache.key(circuit, "backend", ("1", "a")) == cache.key(_circuit(2), "backend", ("1", "a"))
+    assert cache.key(circuit, "backend", ("1", "a")) != cache.key(circuit, "backend", ("1", "b"))
+
+
+def test_memory_tier_lru():
+    cache = TranspileCache(cache_size=2)
+    keys = [cache.key(_circuit(n_qubits), "backend", ("1", None)) for n_qubits in (1, 2, 3)]
+    for n_qubits, key in zip((1, 2, 3), keys):
+        cache.put(key, _circuit(n_qubits))
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2], name="renamed").name == "renamed"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = TranspileCache(cache_size=1, cache_dir=str(tmp_path), max_disk_entries=10)
+    keys = []
+    start_time = time.time() - 100
+    for n_qubits in range(1, 13):
+        key = cache.key(_circuit(n_qubits), "backend", ("1", None))
+        cache.put(key, _circuit(n_qubits))
+        keys.append(key)
+        # distinct modification times
+        os.utime(cache._path(key), (start_time + n_qubits, start_time + n_qubits))
+    assert len(os.listdir(tmp_path)) <= 10
+    # the most recently used circuits are kept
+    assert cache.get(keys[-2]) is not None
+    assert cache.get(keys[0]) is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    key = TranspileCache().key(_circuit(2), "backend", ("1", None))
+    TranspileCache(cache_dir=str(tmp_path)).put(key, _circuit(2))
+    assert TranspileCache(cache_dir=str(tmp_path)).get(key) is not None
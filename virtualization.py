@@ -1,68 +1,103 @@
 from queue import Queue
-from typing import Dict
+from typing import Callable, Dict
 
 from qiskit.providers.provider import Provider
 
 import logger
 from aggregator.aggregator import Aggregator, AggregatorResults
-from execution_handler.execution_handler import ExecutionHandler
+from execution_handler.execution_handler import BackendLookUp, ExecutionHandler
+from metrics.pipeline import QueueDepthSampler
 from partitioner.partition_result_processing import (ResultProcessing,
                                                      ResultWriter)
 from partitioner.partitioner import Partitioner
 from resource_mapping.backend_chooser import Backend_Chooser
 from resource_mapping.quantum_resource_mapper import QuantumResourceMapper
 from resource_mapping.result_analyzer import ResultAnalyzer
+from sharding.sharder import ShardResults, ShotSharder
 
 
 class Virtual_Execution_Environment():
 
-    def __init__(self, provider: Provider, config: Dict) -> None:
+    def __init__(self, provider: Provider, config: Dict, queue_factory: Callable[[str], Queue] = lambda name: Queue()) -> None:
         """
         Creates a Virtual_Execution_Environment object
         Args:
             provider (Provider): provider object that handles the communication with IBMQ
             config (Dict): configuration
+            queue_factory (Callable[[str], Queue], optional): creates the queues between the stages from their names, e.g. to measure the waiting times. Defaults to creating plain Queues.
         """
         self._log = logger.get_logger(type(self).__name__)
+        self._queue_factory = queue_factory
+        self.queues = {}
 
-        self.input = Queue()
-        self.output = Queue()
-        self.errors = Queue()
+        self.input = self._create_queue("input")
+        self.output = self._create_queue("output")
+        self.errors = self._create_queue("errors")
 
-        input_execution = Queue()
-        output_execution = Queue()
+        input_execution = self._create_queue("input_execution")
+        output_execution = self._create_queue("output_execution")
+        errors_execution = self._create_queue("errors_execution")
 
-        input_aggregation = Queue()
-        input_partition = Queue()
+        input_aggregation = self._create_queue("input_aggregation")
+        input_partition = self._create_queue("input_partition")
+        input_sharding = self._create_queue("input_sharding")
 
-        input_aggregation_result = Queue()
-        input_partition_result = Queue()
-        all_results_are_available = Queue()
+        input_aggregation_result = self._create_queue("input_aggregation_result")
+        input_partition_result = self._create_queue("input_partition_result")
+        input_sharding_result = self._create_queue("input_sharding_result")
+        all_results_are_available = self._create_queue("all_results_are_available")
 
         aggregation_dict = {}
+        aggregation_job_table = {}
         partition_dict = {}
+        shard_dict = {}
 
         self.backend_chooser = Backend_Chooser(provider, config["quantum_resource_mapper"]["backend_chooser"])
         self.quantum_resource_mapper = QuantumResourceMapper(input=self.input, output=input_execution, output_agg=input_aggregation,
-                                                             output_part=input_partition, backend_chooser=self.backend_chooser, config=config["quantum_resource_mapper"])
+                                                             output_part=input_partition, backend_chooser=self.backend_chooser, config=config["quantum_resource_mapper"], error_queue=self.errors, output_shard=input_sharding)
+        self.backend_look_up = BackendLookUp(provider, config["execution_handler"].get("backend_refresh_interval", 900))
+        self.execution_handler = ExecutionHandler(provider, input=input_execution, output=output_execution, backend_look_up=self.backend_look_up, queue_factory=self._create_queue, error_queue=errors_execution, **config["execution_handler"])
+        # the aggregator transpiles the circuits for their regions in the process pool of the execution handler
         self.aggregator = Aggregator(input=input_aggregation, output=input_execution,
-                                     job_dict=aggregation_dict, timeout=config["aggregator"]["timeout"])
+                                     job_dict=aggregation_dict, job_table=aggregation_job_table, backend_look_up=self.backend_look_up, transpile_pool=self.execution_handler.transpile_pool, **config["aggregator"])
         self.partitioner = Partitioner(input=input_partition, output=input_execution,
                                        partition_dict=partition_dict, error_queue=self.errors, **config["partitioner"])
-        self.execution_handler = ExecutionHandler(provider, input=input_execution, output=output_execution, **config["execution_handler"])
-        self.result_analyzer = ResultAnalyzer(input=output_execution, output=self.output, output_agg=input_aggregation_result, output_part=input_partition_result)
-        self.aggregation_result_processor = AggregatorResults(input=input_aggregation_result, output=self.output, job_dict=aggregation_dict)
-        self.partition_result_writer = ResultWriter(input=input_partition_result, completed_jobs=all_results_are_available, partition_dict=partition_dict)
+        self.sharder = ShotSharder(input=input_sharding, output=input_execution, shard_dict=shard_dict, backend_chooser=self.backend_chooser, **config.get("sharding", {}))
+        self.result_analyzer = ResultAnalyzer(input=output_execution, output=self.output, output_agg=input_aggregation_result, output_part=input_partition_result, output_shard=input_sharding_result)
+        # the failed aggregated jobs and sub-jobs are routed to their result processors, which fail the initial jobs
+        self.error_analyzer = ResultAnalyzer(input=errors_execution, output=self.errors, output_agg=input_aggregation_result, output_part=input_partition_result, output_shard=input_sharding_result)
+        self.aggregation_result_processor = AggregatorResults(input=input_aggregation_result, output=self.output, job_dict=aggregation_dict, job_table=aggregation_job_table, error_queue=self.errors)
+        self.shard_result_processor = ShardResults(input=input_sharding_result, output=self.output, shard_dict=shard_dict, error_queue=self.errors)
+        self.partition_result_writer = ResultWriter(input=input_partition_result, completed_jobs=all_results_are_available, partition_dict=partition_dict, error_queue=self.errors)
         self.partition_result_processor = ResultProcessing(input=all_results_are_available, output=self.output, partition_dict=partition_dict)
+        self.queue_depth_sampler = QueueDepthSampler(self.queues, **config.get("metrics", {}))
+
+    def _create_queue(self, name:str) -> Queue:
+        """Create a queue between two stages and register it for the queue depth sampling
+
+        Args:
+            name (str)
+
+        Returns:
+            Queue
+        """
+        queue = self._queue_factory(name)
+        self.queues[name] = queue
+        return queue
 
     def start(self):
         """Start all threads of the Virtual_Execution_Environment object
         """
+        self.backend_look_up.start()
         self.quantum_resource_mapper.start()
         self.aggregator.start()
         self.partitioner.start()
+        self.sharder.start()
         self.execution_handler.start()
         self.result_analyzer.start()
+        self.error_analyzer.start()
         self.aggregation_result_processor.start()
+        self.shard_result_processor.start()
         self.partition_result_writer.start()
         self.partition_result_processor.start()
+        self.queue_depth_sampler.start()